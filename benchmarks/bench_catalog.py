@@ -0,0 +1,139 @@
+"""
+Benchmark the file catalog at a large number of rows
+
+Fills a scratch catalog with monthly files for a set of cases and data types,
+then times year range readiness lookups through the database with and without
+indexes, with model instances vs tuples, and through the in memory
+coverage index.
+
+    python benchmarks/bench_catalog.py --rows 1000000
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from configobj import ConfigObj
+
+from processflow.lib.filemanager import FileManager, FileStatus
+from processflow.lib.models import DataFile
+
+DATA_TYPES = ['atm', 'lnd', 'ocn', 'sea_ice', 'rof', 'glc']
+
+
+def make_rows(num_rows, num_cases):
+    """
+    Build the catalog rows, monthly files for every case and data type
+    """
+    years = max(1, num_rows // (num_cases * len(DATA_TYPES) * 12))
+    rows = list()
+    for case_idx in range(num_cases):
+        case = f'case_{case_idx}'
+        for data_type in DATA_TYPES:
+            for year in range(1, years + 1):
+                for month in range(1, 13):
+                    name = f'{case}.{data_type}.h0.{year:04d}-{month:02d}.nc'
+                    rows.append({
+                        'case': case,
+                        'name': name,
+                        'local_path': f'/data/{case}/{data_type}/{name}',
+                        'local_status': FileStatus.PRESENT.value,
+                        'year': year,
+                        'month': month,
+                        'datatype': data_type,
+                        'super_type': 'raw_output',
+                        'local_size': 0,
+                    })
+    return rows, years
+
+
+def timeit(func, repeat):
+    """
+    Returns the median runtime of func in milliseconds
+    """
+    times = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def sql_ready(case, data_type, start_year, end_year, tuples):
+    query = (DataFile
+             .select(DataFile.local_status)
+             .where(
+                 (DataFile.case == case) &
+                 (DataFile.datatype == data_type) &
+                 (DataFile.year >= start_year) &
+                 (DataFile.year <= end_year)))
+    if tuples:
+        rows = [x for x, in query.tuples()]
+    else:
+        rows = [x.local_status for x in query]
+    return rows and all(x == FileStatus.PRESENT.value for x in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000, help='Number of catalog rows, default 1M')
+    parser.add_argument('--cases', type=int, default=10, help='Number of cases, default 10')
+    parser.add_argument('--repeat', type=int, default=50, help='Lookups to time for each method')
+    parser.add_argument('--span', type=int, default=50, help='Years in each lookup range')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        config = ConfigObj()
+        config['global'] = {'project_path': workdir}
+        filemanager = FileManager(config=config, database=os.path.join(workdir, 'processflow.db'))
+
+        rows, years = make_rows(args.rows, args.cases)
+        start = time.perf_counter()
+        filemanager._bulk_insert(rows)
+        print(f'inserted {len(rows)} rows in {time.perf_counter() - start:.2f}s')
+
+        random.seed(0)
+        span = min(args.span, years)
+        lookups = [(f'case_{random.randrange(args.cases)}',
+                    random.choice(DATA_TYPES),
+                    random.randint(1, years - span + 1))
+                   for _ in range(args.repeat)]
+
+        def run(func):
+            queue = list(lookups)
+            return lambda: func(*queue.pop())
+
+        results = list()
+        results.append(('sql, indexed, tuples', timeit(run(
+            lambda case, dt, year: sql_ready(case, dt, year, year + span - 1, True)), args.repeat)))
+        results.append(('sql, indexed, models', timeit(run(
+            lambda case, dt, year: sql_ready(case, dt, year, year + span - 1, False)), args.repeat)))
+
+        start = time.perf_counter()
+        coverage = filemanager.coverage
+        print(f'loaded coverage index in {time.perf_counter() - start:.2f}s')
+        results.append(('coverage index', timeit(run(
+            lambda case, dt, year: coverage.get(case, dt).ready(year, year + span - 1)), args.repeat)))
+
+        database = DataFile._meta.database
+        # the table as it was before it had any indexes
+        for index in DataFile._meta.fields_to_index():
+            database.execute_sql(f'DROP INDEX IF EXISTS "{index._name}"')
+        baseline_repeat = max(1, args.repeat // 10)
+        results.append(('sql, no indexes, models', timeit(run(
+            lambda case, dt, year: sql_ready(case, dt, year, year + span - 1, False)), baseline_repeat)))
+
+        print(f'\nmedian latency of a {span} year readiness check over {len(rows)} rows')
+        for name, millis in results:
+            print(f'    {name:<32} {millis:10.3f} ms')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
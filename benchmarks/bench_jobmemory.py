@@ -0,0 +1,144 @@
+"""
+Benchmark how much memory the jobs of a very large plan hold on to
+
+Plans the synthetic config bench_orchestration uses, with every job type
+turned on, creates the first --jobs jobs of the plan and measures how much
+memory they hold with tracemalloc. The same jobs are then copied into
+records laid out the way jobs used to be, every attribute in an instance
+__dict__ along with a copy of the resource manager arguments and output path
+replacements for every job, so the two layouts can be compared.
+
+    python benchmarks/bench_jobmemory.py --jobs 10000,100000
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+import contextlib
+import gc
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+from benchmarks.bench_orchestration import make_config
+from processflow.lib.initialize import setup_directories
+from processflow.lib.runmanager import RunManager, job_map
+from processflow.lib.verify_config import verify_config
+
+
+class LegacyRecord(object):
+    """
+    A job laid out the way they used to be, with an instance __dict__
+    """
+    pass
+# -----------------------------------------------
+
+
+def job_attributes(job):
+    """
+    Returns the names of every attribute set on a job
+    """
+    names = list(getattr(job, '__dict__', {}).keys())
+    for cls in type(job).__mro__:
+        for name in getattr(cls, '__slots__', ()):
+            if name not in names and hasattr(job, name):
+                names.append(name)
+    return names
+# -----------------------------------------------
+
+
+def legacy_record(job, config):
+    """
+    Copy a job into a LegacyRecord, giving it its own manager args and
+    output path replacements the way every job used to have
+    """
+    record = LegacyRecord()
+    for name in job_attributes(job):
+        setattr(record, name, getattr(job, name))
+    record._manager_args = {x: list(y) for x, y in job._manager_args.items()}
+    record._replace_dict = job.replacements(config)
+    record._job_args = list(job._job_args)
+    record._directories = list(job._directories)
+    return record
+# -----------------------------------------------
+
+
+def measure(func):
+    """
+    Returns the bytes still held once func has run, along with its result
+    """
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    result = func()
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0] - before, result
+# -----------------------------------------------
+
+
+def make_jobs(runmanager, plan, count):
+    """
+    Create count jobs from the plan, starting over from its beginning if it is too short
+    """
+    config = runmanager.config
+    jobs = list()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _, spec in itertools.islice(itertools.cycle(plan), count):
+            kwargs = {x: y for x, y in spec.items() if x != 'job_type' and y is not None}
+            jobs.append(job_map[spec['job_type']](
+                dryrun=False, config=config, manager=runmanager.manager, **kwargs))
+    return jobs
+# -----------------------------------------------
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--jobs', default='10000,100000',
+                        help='Comma separated numbers of jobs to measure')
+    parser.add_argument('--cases', type=int, default=10, help='Number of cases')
+    parser.add_argument('--years', type=int, default=2000, help='Length of the simulation in years')
+    parser.add_argument('--frequencies', default='5,10,50,100',
+                        help='Comma separated run frequencies given to every job type')
+    args = parser.parse_args()
+    counts = [int(x) for x in args.jobs.split(',')]
+
+    workdir = tempfile.mkdtemp(prefix='pf_bench_')
+    try:
+        config = make_config(
+            project_path=os.path.join(workdir, 'project'),
+            cases=args.cases,
+            years=args.years,
+            frequencies=[int(x) for x in args.frequencies.split(',')],
+            max_jobs=50)
+        config['global']['serial'] = True
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            messages = verify_config(config)
+            if messages:
+                raise Exception('Invalid benchmark config: ' + '; '.join(messages))
+            setup_directories(config)
+            runmanager = RunManager(config=config, filemanager=None)
+        plan = runmanager.plan_cases()
+
+        tracemalloc.start()
+        print(f'{"jobs":>8} {"current":>12} {"per job":>9} {"legacy":>12} {"per job":>9} {"saved":>6}')
+        for count in counts:
+            gc.collect()
+            base = tracemalloc.get_traced_memory()[0]
+            current, jobs = measure(lambda: make_jobs(runmanager, plan, count))
+            records = [legacy_record(x, runmanager.config) for x in jobs]
+            # the records share everything else with the jobs, so once the
+            # jobs are gone whats left is the old layout on its own
+            del jobs
+            gc.collect()
+            legacy = tracemalloc.get_traced_memory()[0] - base
+            del records
+            print(f'{count:>8} {current / 2**20:>10.1f}MB {current / count:>8.0f}B '
+                  f'{legacy / 2**20:>10.1f}MB {legacy / count:>8.0f}B '
+                  f'{100 * (1 - current / legacy):>5.0f}%')
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,374 @@
+"""
+Benchmark processflow's orchestration at synthetic scale
+
+Generates a config with many cases, a long simulation, several run frequencies
+and every job type in runmanager.job_map, builds a fake input tree of empty
+files for it, then times each phase of setup the way initialize() runs them
+(the file catalog population, the local status check, setup_cases, setup_jobs)
+followed by one pass of each phase of the main loop against the slurm simulator,
+and a restart that loads the plan back from the plan cache and checks its
+jobs for output from the first run with prevalidate_jobs.
+The file manager setup is run a second time against the existing catalog, the
+way a restarted run would see it. The time and peak memory of each phase are
+printed, and written to a JSON report so runs can be compared.
+
+    python benchmarks/bench_orchestration.py --cases 3 --years 1000 --report orchestration.json
+
+Compare the report against one from an earlier run with --baseline, any phase
+that got more than --tolerance times slower is listed and the exit code is 1.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy
+import xarray as xr
+
+from configobj import ConfigObj
+
+from benchmarks.slurmsim import SlurmSimulator
+from processflow.lib.filemanager import FileManager
+from processflow.lib.initialize import setup_directories
+from processflow.lib.runmanager import RunManager, job_map
+from processflow.lib.util import print_line
+from processflow.lib.verify_config import verify_config
+
+SAMPLE_CONFIG = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'sample_configs', 'run.cfg')
+
+
+def make_config(project_path, cases, years, frequencies, max_jobs):
+    """
+    Build a config from the sample run.cfg that has every job type turned on
+
+    Parameters:
+        project_path (str): the project directory, the input tree is put under it
+        cases (int): the number of cases
+        years (int): the length of the simulation
+        frequencies (list): the run_frequency of every post-processing and diag job
+        max_jobs (int): the most jobs to have running at once
+    Returns:
+        the ConfigObj
+    """
+    config = ConfigObj(SAMPLE_CONFIG)
+    config['global']['project_path'] = project_path
+    config['global']['max_jobs'] = max_jobs
+    config['global']['host'] = False
+    config['global']['always_copy'] = False
+    config['global']['dryrun'] = False
+    config['global']['debug'] = False
+    # the simulator is never overloaded, time processflow rather than the slurm rate limit
+    config['global']['slurm_rate'] = 0
+    config['global']['resource_path'] = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        'processflow', 'resources')
+
+    template = dict(config['simulations']['case.id.number.1'])
+    for name in list(config['simulations'].keys()):
+        if name not in ['start_year', 'end_year']:
+            del config['simulations'][name]
+    config['simulations']['start_year'] = '1'
+    config['simulations']['end_year'] = str(years)
+
+    case_names = [f'bench.case.{idx:03d}' for idx in range(cases)]
+    for idx, name in enumerate(case_names):
+        case = dict(template)
+        case['local_path'] = os.path.join(project_path, 'input', name)
+        case['short_name'] = f'case_{idx:03d}'
+        case['data_types'] = 'all'
+        case['job_types'] = list(job_map.keys())
+        # the first case is the reference the others are compared against
+        case['comparisons'] = 'obs' if idx == 0 else [case_names[0], 'obs']
+        config['simulations'][name] = case
+
+    frequencies = [str(x) for x in frequencies]
+    for section in ['post-processing', 'diags']:
+        for job_type in config[section]:
+            if job_type != 'regrid':
+                config[section][job_type]['run_frequency'] = frequencies
+    for data_type in config['data_types']:
+        config['data_types'][data_type]['local_path'] = 'PROJECT_PATH/input/CASEID/' + data_type
+        for case in list(config['data_types'][data_type].sections):
+            del config['data_types'][data_type][case]
+
+    # the paths verify_config checks for have to exist, the jobs never read them
+    support_path = os.path.join(project_path, 'support')
+    os.makedirs(os.path.join(support_path, 'cmor_tables'))
+    cmor = config['post-processing']['cmor']
+    cmor['cmor_tables_path'] = os.path.join(support_path, 'cmor_tables')
+    for extra in ['mpas_mesh_path', 'mpas_map_path', 'regions_path', 'mpaso-namelist']:
+        cmor[extra] = os.path.join(support_path, extra)
+        open(cmor[extra], 'w').close()
+    config['diags']['ilamb']['variables'] = ['tas', 'pr', 'mrso']
+    config['diags']['e3sm_diags']['machine_path_prefix'] = support_path
+    config['diags']['mpas_analysis']['diagnostics_path'] = support_path
+    config['diags']['mpas_analysis']['start_year_offset'] = '0'
+    return config
+# -----------------------------------------------
+
+
+def make_template(path, variables):
+    """
+    Write a tiny netcdf file holding the given variables, the jobs that open
+    their input to check for variables look at this
+    """
+    data = {x: (('time', 'ncol'), numpy.zeros((1, 1), dtype='f4')) for x in variables}
+    xr.Dataset(data, coords={'time': [0.0]}).to_netcdf(path)
+# -----------------------------------------------
+
+
+def make_input_tree(config, database):
+    """
+    Create a file for every input file the config asks for, the paths are
+    rendered by a FileManager on a scratch database so they match exactly.
+    The monthly files of each data type are hard links to one small netcdf
+    template, everything else is an empty file
+
+    Returns:
+        the number of files created
+    """
+    filemanager = FileManager(database=database, config=config)
+    start = int(config['simulations']['start_year'])
+    end = int(config['simulations']['end_year'])
+    template_path = os.path.join(config['global']['project_path'], 'support')
+    count = 0
+    for case in config['simulations'].sections:
+        for data_type in filemanager._case_data_types(case):
+            local_root = filemanager.render_file_string(
+                data_type=data_type, data_type_option='local_path', case=case)
+            if not os.path.exists(local_root):
+                os.makedirs(local_root)
+            if not filemanager._is_monthly(data_type):
+                name = filemanager.render_file_string(
+                    data_type=data_type, data_type_option='file_format', case=case)
+                open(os.path.join(local_root, name), 'w').close()
+                count += 1
+                continue
+
+            template = os.path.join(template_path, f'{data_type}.nc')
+            if not os.path.exists(template):
+                variables = config['post-processing']['timeseries'].get(data_type, [])
+                if not isinstance(variables, list):
+                    variables = [variables]
+                make_template(template, variables)
+            for year in range(start, end + 1):
+                for month in range(1, 13):
+                    name = filemanager.render_file_string(
+                        data_type=data_type, data_type_option='file_format',
+                        case=case, year=year, month=month)
+                    os.link(template, os.path.join(local_root, name))
+                    count += 1
+    os.remove(database)
+    return count
+# -----------------------------------------------
+
+
+class Phases(object):
+    """
+    Times a sequence of named phases, recording the wall time, the peak memory
+    allocated by python during each one (when trace_memory is set) and the peak
+    resident size of the process after each one
+    """
+
+    def __init__(self, trace_memory=False, verbose=False):
+        self.results = list()
+        self._trace_memory = trace_memory
+        self._verbose = verbose
+        if trace_memory:
+            tracemalloc.start()
+    # -----------------------------------------------
+
+    def run(self, name, func, *args, **kwargs):
+        if self._trace_memory:
+            tracemalloc.reset_peak()
+        with open(os.devnull, 'w') as devnull:
+            # processflow's own console output is hidden unless asked for
+            output = sys.stdout if self._verbose else devnull
+            with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+                start = time.perf_counter()
+                value = func(*args, **kwargs)
+                seconds = time.perf_counter() - start
+        result = {
+            'phase': name,
+            'seconds': round(seconds, 4),
+            'max_rss_mb': round(max_rss_mb(), 1),
+        }
+        if self._trace_memory:
+            result['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+        self.results.append(result)
+        print_line(f'{name:<36} {seconds:9.3f}s  {result["max_rss_mb"]:8.1f} MB rss', status='ok')
+        return value
+    # -----------------------------------------------
+
+
+def max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS bytes
+    return rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10
+# -----------------------------------------------
+
+
+def setup_filemanager(phases, config, database, label):
+    filemanager = phases.run(
+        f'{label}: FileManager()', FileManager, database=database, config=config)
+    phases.run(f'{label}: populate_file_list', filemanager.populate_file_list)
+    return filemanager
+# -----------------------------------------------
+
+
+def run_benchmark(args, workdir):
+    project_path = os.path.join(workdir, 'project')
+    config = make_config(
+        project_path=project_path,
+        cases=args.cases,
+        years=args.years,
+        frequencies=args.frequencies,
+        max_jobs=args.max_jobs)
+    messages = verify_config(config)
+    if messages:
+        raise Exception('Invalid benchmark config: ' + '; '.join(messages))
+    setup_directories(config)
+    database = os.path.join(config['global']['output_path'], 'processflow.db')
+    state_path = os.path.join(config['global']['output_path'], 'job_state.txt')
+    phases = Phases(trace_memory=args.trace_memory, verbose=args.verbose)
+    logging.basicConfig(
+        format='%(asctime)s:%(levelname)s: %(message)s',
+        filename=os.path.join(config['global']['output_path'], 'processflow.log'),
+        level=logging.INFO)
+    # the run scripts activate the environment processflow is running in
+    os.environ.setdefault('CONDA_PREFIX', sys.prefix)
+
+    num_files = make_input_tree(config, database + '.scratch')
+    print_line(f'Created {num_files} input files', status='ok')
+
+    filemanager = setup_filemanager(phases, config, database, 'cold')
+    phases.run('cold: file_status_check', filemanager.file_status_check)
+
+    # a restart sees the catalog the first run left behind
+    filemanager = setup_filemanager(phases, config, database, 'warm')
+    phases.run('warm: file_status_check', filemanager.file_status_check)
+    phases.run('all_data_local', filemanager.all_data_local)
+
+    with SlurmSimulator(queue_wait='0', runtime='0', nodes=args.max_jobs) as sim:
+        runmanager = phases.run(
+            'RunManager()', RunManager, config=config, filemanager=filemanager)
+        phases.run('setup_cases', runmanager.setup_cases)
+        phases.run('setup_jobs', runmanager.setup_jobs)
+        # setup_plan would cache the plan for the restart below
+        phases.run('save plan cache', runmanager._plan_cache.save, runmanager.cases)
+        phases.run('write_job_sets (initial)', runmanager.write_job_sets, state_path)
+
+        phases.run('loop: check_data_ready', runmanager.check_data_ready)
+        phases.run('loop: start_ready_jobs', runmanager.start_ready_jobs)
+        phases.run('loop: monitor_running_jobs', runmanager.monitor_running_jobs)
+        phases.run('loop: write_job_sets', runmanager.write_job_sets, state_path)
+        phases.run('loop: is_all_done', runmanager.is_all_done)
+        runmanager.shutdown()
+        # a restart with the same config picks the plan up from the cache
+        restarted = phases.run(
+            'restart: RunManager()', RunManager, config=config, filemanager=filemanager)
+        if not phases.run('restart: setup_plan', restarted.setup_plan):
+            raise Exception('The restart didnt use the plan cache')
+        phases.run('restart: prevalidate_jobs', restarted.prevalidate_jobs)
+        restarted.shutdown()
+        slurm_stats = sim.stats()
+
+    return {
+        'settings': {
+            'cases': args.cases,
+            'years': args.years,
+            'frequencies': args.frequencies,
+            'max_jobs': args.max_jobs,
+            'job_types': sorted(job_map.keys()),
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'counts': {
+            'input_files': num_files,
+            'jobs': runmanager._job_total,
+            'submitted': len(runmanager.running_jobs),
+            'slurm_calls': slurm_stats.get('calls'),
+        },
+        'phases': phases.results,
+        'max_rss_mb': round(max_rss_mb(), 1),
+    }
+# -----------------------------------------------
+
+
+def compare(report, baseline, tolerance):
+    """
+    Returns a list of the phases that are more than tolerance times slower than in the baseline
+    """
+    previous = {x['phase']: x['seconds'] for x in baseline.get('phases', [])}
+    slower = list()
+    for result in report['phases']:
+        before = previous.get(result['phase'])
+        # phases that take no real time are too noisy to compare
+        if before is None or max(before, result['seconds']) < 0.05:
+            continue
+        if result['seconds'] > before * tolerance:
+            slower.append(
+                f"{result['phase']}: {before:.3f}s -> {result['seconds']:.3f}s")
+    return slower
+# -----------------------------------------------
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cases', type=int, default=3, help='Number of cases')
+    parser.add_argument('--years', type=int, default=1000, help='Length of the simulation in years')
+    parser.add_argument('--frequencies', default='10,50,100',
+                        help='Comma separated run frequencies given to every job type')
+    parser.add_argument('--max-jobs', type=int, default=50, help='The most jobs running at once')
+    parser.add_argument('--report', help='Path to write the JSON report to')
+    parser.add_argument('--baseline', help='A previous JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help='How many times slower than the baseline a phase can get')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Record the python memory peak of each phase, this slows everything down')
+    parser.add_argument('--verbose', action='store_true', help="Show processflow's own console output")
+    parser.add_argument('--workdir', help='Where to build the project, a temp dir by default')
+    parser.add_argument('--keep', action='store_true', help='Dont remove the workdir when done')
+    args = parser.parse_args()
+    args.frequencies = [int(x) for x in args.frequencies.split(',')]
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='pf_bench_')
+    try:
+        report = run_benchmark(args, workdir)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n{report['counts']['jobs']} jobs over {report['counts']['input_files']} files, "
+          f"peak rss {report['max_rss_mb']} MB")
+    if args.report:
+        with open(args.report, 'w') as fp:
+            json.dump(report, fp, indent=4)
+        print(f'Report written to {args.report}')
+
+    if args.baseline:
+        with open(args.baseline, 'r') as fp:
+            baseline = json.load(fp)
+        slower = compare(report, baseline, args.tolerance)
+        for item in slower:
+            print_line(f'Slower than the baseline: {item}', status='err')
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark job planning for long, many case configs
+
+Builds the synthetic config bench_orchestration uses, with every job type
+turned on, then times RunManager.plan_cases, which works out the windows of
+every job and leaves out duplicates without creating any jobs. With --legacy
+the same plan is also made the way setup_cases used to, stepping through
+every year for every frequency and checking each new job against all the
+jobs of its case, so the two can be compared.
+
+    python benchmarks/bench_planning.py --cases 10 --years 5000 --frequencies 1,5,10,50,100
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+import contextlib
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_orchestration import make_config
+from processflow.lib.initialize import setup_directories
+from processflow.lib.runmanager import RunManager
+from processflow.lib.verify_config import verify_config
+
+
+def legacy_windows(freqs, start, end):
+    """
+    The old way of finding job windows, every year is checked against every frequency
+    """
+    windows = list()
+    for year in range(start, end + 1):
+        for freq in freqs:
+            freq = int(freq)
+            if (year - start) % freq == 0:
+                windows.append((year, min(year + freq - 1, end)))
+    return windows
+# -----------------------------------------------
+
+
+def legacy_plan(runmanager):
+    """
+    Plan the way setup_cases used to, with the per year window scan and each
+    new job checked against all the jobs already in its case
+    """
+    runmanager.job_windows = legacy_windows
+    try:
+        plan = runmanager.plan_cases()
+    finally:
+        del runmanager.job_windows
+    jobs = dict()
+    for case, spec in plan:
+        case_jobs = jobs.setdefault(case['case'], list())
+        key = runmanager._job_key(spec)
+        if not any(runmanager._job_key(x) == key for x in case_jobs):
+            case_jobs.append(spec)
+    return sum(len(x) for x in jobs.values())
+# -----------------------------------------------
+
+
+def timeit(func, repeat):
+    """
+    Returns the median runtime of func in milliseconds, and its last result
+    """
+    times = list()
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), result
+# -----------------------------------------------
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cases', type=int, default=10, help='Number of cases')
+    parser.add_argument('--years', type=int, default=5000, help='Length of the simulation in years')
+    parser.add_argument('--frequencies', default='5,10,50,100',
+                        help='Comma separated run frequencies given to every job type')
+    parser.add_argument('--repeat', type=int, default=5, help='How many times to time each method')
+    parser.add_argument('--legacy', action='store_true',
+                        help='Also time the old per year planning loop, this is slow at scale')
+    parser.add_argument('--max-ms', type=float,
+                        help='Exit with 1 if planning takes longer than this many milliseconds')
+    args = parser.parse_args()
+    frequencies = [int(x) for x in args.frequencies.split(',')]
+
+    workdir = tempfile.mkdtemp(prefix='pf_bench_')
+    try:
+        config = make_config(
+            project_path=os.path.join(workdir, 'project'),
+            cases=args.cases,
+            years=args.years,
+            frequencies=frequencies,
+            max_jobs=50)
+        # local mode, no resource manager is needed to plan
+        config['global']['serial'] = True
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            messages = verify_config(config)
+            if messages:
+                raise Exception('Invalid benchmark config: ' + '; '.join(messages))
+            setup_directories(config)
+            runmanager = RunManager(config=config, filemanager=None)
+
+        elapsed, plan = timeit(runmanager.plan_cases, args.repeat)
+        print(f'{len(plan)} jobs for {args.cases} cases over {args.years} years '
+              f'at frequencies {args.frequencies}')
+        print(f'plan_cases: {elapsed:.1f} ms')
+        if args.legacy:
+            legacy, _ = timeit(lambda: legacy_plan(runmanager), 1)
+            print(f'legacy planning loop: {legacy:.1f} ms ({legacy / max(elapsed, 1e-6):.0f}x)')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.max_ms is not None and elapsed > args.max_ms:
+        print(f'Planning took longer than {args.max_ms} ms')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark how fast processflow can talk to slurm, using the slurm simulator
+
+Submits a batch of job scripts through the blocking Slurm interface and through
+AsyncSlurm, then polls all of them with showjobs, and reports the submission
+rate and polling latency. Use --rpc-latency to see how a slow slurmctld hurts.
+
+    python benchmarks/bench_slurm_throughput.py --jobs 2000 --rpc-latency 0.05
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.slurmsim import SlurmSimulator
+from processflow.lib.aioslurm import AsyncSlurm
+from processflow.lib.slurm import Slurm
+
+
+def write_scripts(path, count):
+    scripts = list()
+    for idx in range(count):
+        script = os.path.join(path, f'job_{idx:06d}')
+        with open(script, 'w') as fp:
+            fp.write('#!/bin/bash\n#SBATCH -t 0-01:00\n#SBATCH -N 1\ntrue\n')
+        scripts.append(script)
+    return scripts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=1000, help='Number of jobs to submit')
+    parser.add_argument('--rpc-latency', default='0', help='Simulated slurmctld delay per command')
+    parser.add_argument('--concurrency', type=int, default=16, help='AsyncSlurm concurrency limit')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        scripts = write_scripts(workdir, args.jobs)
+        results = list()
+        with SlurmSimulator(queue_wait='exp:30', runtime='exp:60', rpc_latency=args.rpc_latency):
+            slurm = Slurm()
+            start = time.perf_counter()
+            job_ids = [slurm.batch(x) for x in scripts]
+            results.append(('Slurm.batch, one at a time', time.perf_counter() - start))
+            start = time.perf_counter()
+            slurm.showjobs(job_ids)
+            results.append(('Slurm.showjobs', time.perf_counter() - start))
+
+        with SlurmSimulator(queue_wait='exp:30', runtime='exp:60', rpc_latency=args.rpc_latency):
+            slurm = AsyncSlurm(max_concurrency=args.concurrency)
+            start = time.perf_counter()
+            job_ids, _ = slurm.submit_and_poll(scripts, [])
+            results.append((f'AsyncSlurm, {args.concurrency} at a time', time.perf_counter() - start))
+            start = time.perf_counter()
+            slurm.showjobs(job_ids)
+            results.append(('AsyncSlurm.showjobs', time.perf_counter() - start))
+
+        print(f'\n{args.jobs} jobs, rpc latency {args.rpc_latency}')
+        for name, seconds in results:
+            print(f'    {name:<32} {seconds:8.2f}s  {args.jobs / seconds:10.1f} jobs/s')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+A local stand in for slurm, so processflow's scheduling can be tested and
+benchmarked without a cluster
+
+    with SlurmSimulator(queue_wait='uniform:0:2', runtime='exp:5', failure_rate=0.01) as sim:
+        slurm = Slurm()    # sbatch, squeue, etc now talk to the simulator
+        ...
+        print(sim.stats())
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+COMMANDS = ['sbatch', 'squeue', 'sacct', 'scontrol', 'scancel', 'sinfo', 'sacctmgr', 'simstats']
+
+
+class SlurmSimulator(object):
+    """
+    Starts the simulator daemon and puts the fake slurm commands on the PATH
+
+    Parameters:
+        home (str): directory for the socket and the bin directory, a temp dir by default
+        kwargs: the cluster settings passed on to the daemon, see daemon.SlurmState,
+            e.g. queue_wait, runtime, failure_rate, rpc_latency, nodes, execute
+    """
+
+    def __init__(self, home=None, **kwargs):
+        self._owns_home = home is None
+        self.home = home or tempfile.mkdtemp(prefix='slurmsim_')
+        self.bin_path = os.path.join(self.home, 'bin')
+        self.socket_path = os.path.join(self.home, 'slurmsim.sock')
+        self._settings = kwargs
+        self._proc = None
+        self._old_path = None
+    # -----------------------------------------------
+
+    def install(self):
+        """
+        Write one shim per slurm command into the bin directory
+        """
+        if not os.path.exists(self.bin_path):
+            os.makedirs(self.bin_path)
+        with open(os.path.join(os.path.dirname(__file__), 'shim.py'), 'r') as fp:
+            source = fp.read()
+        source = source.replace(
+            "SOCKET_PATH = os.environ.get('SLURMSIM_SOCKET', '')",
+            f'SOCKET_PATH = {self.socket_path!r}')
+        for command in COMMANDS:
+            path = os.path.join(self.bin_path, command)
+            with open(path, 'w') as fp:
+                # -S skips site imports, the shims get run a lot
+                fp.write(f'#!{sys.executable} -S\n')
+                fp.write(source)
+            os.chmod(path, 0o755)
+    # -----------------------------------------------
+
+    def start(self):
+        self.install()
+        cmd = [sys.executable, os.path.join(os.path.dirname(__file__), 'daemon.py'),
+               '--home', self.home]
+        for key, value in self._settings.items():
+            flag = '--' + key.replace('_', '-')
+            if value is True:
+                cmd.append(flag)
+            elif value not in [False, None]:
+                cmd.extend([flag, str(value)])
+        self._proc = subprocess.Popen(cmd)
+        start = time.time()
+        while not os.path.exists(self.socket_path):
+            if self._proc.poll() is not None or time.time() - start > 10:
+                raise Exception('The slurm simulator daemon failed to start')
+            time.sleep(0.02)
+
+        self._old_path = os.environ['PATH']
+        os.environ['PATH'] = self.bin_path + os.pathsep + self._old_path
+        return self
+    # -----------------------------------------------
+
+    def stats(self):
+        """
+        Returns the number of calls to each command and the number of jobs in each state
+        """
+        out = subprocess.check_output([os.path.join(self.bin_path, 'simstats')])
+        return json.loads(out.decode('utf-8'))
+    # -----------------------------------------------
+
+    def stop(self):
+        if self._old_path is not None:
+            os.environ['PATH'] = self._old_path
+            self._old_path = None
+        if self._proc is not None:
+            self._proc.terminate()
+            self._proc.wait()
+            self._proc = None
+        if self._owns_home:
+            shutil.rmtree(self.home, ignore_errors=True)
+    # -----------------------------------------------
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,583 @@
+"""
+The state daemon behind the fake slurm commands
+
+Holds every submitted job in memory and works out its state from the clock:
+a job waits in the queue for a sampled queue wait (and until there is a free
+node if the cluster size is limited), runs for a sampled runtime, then
+completes or fails with the configured failure rate. With execute turned on
+the job script is actually run when the job starts, and its exit code decides
+the outcome instead.
+
+The shims send their argv over a unix socket as one JSON line and get back
+{"stdout", "stderr", "returncode"}, every reply is delayed by the configured
+rpc latency to stand in for a busy slurmctld.
+
+    python -m benchmarks.slurmsim.daemon --home /tmp/slurmsim --queue-wait 5 --runtime exp:60
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+import getpass
+import json
+import os
+import random
+import re
+import shlex
+import signal
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+
+
+def parse_distribution(spec):
+    """
+    Turn a distribution spec into a function returning samples in seconds
+
+    Specs are a number for a fixed value, uniform:LOW:HIGH, exp:MEAN or
+    lognormal:MEDIAN:SIGMA
+    """
+    spec = str(spec)
+    parts = spec.split(':')
+    if len(parts) == 1:
+        value = float(parts[0])
+        return lambda rng: value
+    kind, args = parts[0], [float(x) for x in parts[1:]]
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(args[0], args[1])
+    if kind == 'exp':
+        return lambda rng: rng.expovariate(1.0 / args[0]) if args[0] > 0 else 0.0
+    if kind == 'lognormal':
+        import math
+        return lambda rng: rng.lognormvariate(math.log(args[0]), args[1])
+    raise ValueError(f'unknown distribution {spec}')
+# -----------------------------------------------
+
+
+def format_elapsed(seconds):
+    seconds = int(max(0, seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f'{hours}:{minutes:02d}:{seconds:02d}'
+    return f'{minutes}:{seconds:02d}'
+# -----------------------------------------------
+
+
+STATE_CODES = {
+    'PENDING': 'PD',
+    'RUNNING': 'R',
+    'COMPLETED': 'CD',
+    'FAILED': 'F',
+    'CANCELLED': 'CA',
+    'TIMEOUT': 'TO',
+}
+
+
+class SimJob(object):
+    """
+    One job, or one task of a job array
+    """
+
+    def __init__(self, job_id, name, script, partition, user, output, ready_at, runtime, fails, nodes):
+        self.job_id = job_id
+        self.name = name
+        self.script = script
+        self.partition = partition
+        self.user = user
+        self.output = output
+        self.ready_at = ready_at
+        self.runtime = runtime
+        self.fails = fails
+        self.nodes = nodes
+        self.start = None
+        self.end = None
+        self.state = 'PENDING'
+        self.exit_code = '0:0'
+        self.proc = None
+        self.env = dict()
+# -----------------------------------------------
+
+
+class SlurmState(object):
+    """
+    The simulated cluster
+
+    Parameters:
+        queue_wait (str): distribution spec for the time a job waits before starting
+        runtime (str): distribution spec for how long a job runs
+        failure_rate (float): the fraction of jobs that fail
+        rpc_latency (str): distribution spec for the delay before every command replies
+        nodes (int): the number of nodes in the cluster, 0 for unlimited
+        execute (bool): actually run the job scripts
+        accounting_ttl (float): seconds a finished job stays in squeue before only sacct knows it
+        seed (int): random seed
+        cores_per_node (int): the cores sinfo reports for each node
+        memory_per_node (int): the megabytes of memory sinfo reports for each node
+        user_max_jobs (int): the MaxJobs sacctmgr reports for the user, 0 for none
+        user_tres (str): the GrpTRES sacctmgr reports for the user, e.g. cpu=128,node=4
+        sbatch_warning (str): a warning sbatch writes to stderr along with every
+            successful submission, like sites that print a notice on each sbatch
+    """
+
+    def __init__(self, queue_wait='0', runtime='1', failure_rate=0.0, rpc_latency='0',
+                 nodes=0, execute=False, accounting_ttl=5, seed=0, cores_per_node=64,
+                 memory_per_node=256000, user_max_jobs=0, user_tres='', sbatch_warning=''):
+        self.queue_wait = parse_distribution(queue_wait)
+        self.runtime = parse_distribution(runtime)
+        self.rpc_latency = parse_distribution(rpc_latency)
+        self.failure_rate = float(failure_rate)
+        self.nodes = int(nodes)
+        self.execute = execute
+        self.accounting_ttl = float(accounting_ttl)
+        self.rng = random.Random(seed)
+        self.cores_per_node = int(cores_per_node)
+        self.memory_per_node = int(memory_per_node)
+        self.user_max_jobs = int(user_max_jobs)
+        self.user_tres = user_tres or ''
+        self.sbatch_warning = sbatch_warning or ''
+        self.lock = threading.RLock()
+        self.jobs = dict()
+        self.order = list()
+        # ids of the jobs that are pending or running, in submission order
+        self.active = list()
+        self.next_id = 1000
+        self.busy_nodes = 0
+        self.counts = dict()
+    # -----------------------------------------------
+
+    def advance(self):
+        """
+        Move jobs along to the states they should be in by now
+        """
+        now = time.time()
+        for job_id in self.active:
+            job = self.jobs[job_id]
+            if job.state != 'RUNNING':
+                continue
+            if job.proc is not None:
+                returncode = job.proc.poll()
+                if returncode is None:
+                    continue
+                job.state = 'COMPLETED' if returncode == 0 else 'FAILED'
+                job.exit_code = f'0:{-returncode}' if returncode < 0 else f'{returncode}:0'
+                job.end = now
+                self.busy_nodes -= job.nodes
+            elif now >= job.start + job.runtime:
+                job.state = 'FAILED' if job.fails else 'COMPLETED'
+                job.exit_code = '1:0' if job.fails else '0:0'
+                job.end = job.start + job.runtime
+                self.busy_nodes -= job.nodes
+        for job_id in self.active:
+            job = self.jobs[job_id]
+            if job.state != 'PENDING' or now < job.ready_at:
+                continue
+            if self.nodes and self.busy_nodes + job.nodes > self.nodes:
+                continue
+            self._start(job, now)
+        self.active = [x for x in self.active if self.jobs[x].state in ['PENDING', 'RUNNING']]
+    # -----------------------------------------------
+
+    def _start(self, job, now):
+        job.state = 'RUNNING'
+        job.start = now
+        self.busy_nodes += job.nodes
+        if not self.execute:
+            return
+        env = dict(os.environ)
+        env.update(job.env)
+        env['SLURM_JOB_ID'] = job.job_id.split('_')[0]
+        try:
+            with open(job.output or os.devnull, 'w') as output:
+                job.proc = subprocess.Popen(
+                    ['bash', job.script], stdout=output, stderr=subprocess.STDOUT, env=env)
+        except OSError:
+            job.state = 'FAILED'
+            job.exit_code = '127:0'
+            job.end = now
+            self.busy_nodes -= job.nodes
+    # -----------------------------------------------
+
+    def handle(self, argv):
+        """
+        Run one command, returns (stdout, stderr, returncode)
+        """
+        command = os.path.basename(argv[0])
+        self.counts[command] = self.counts.get(command, 0) + 1
+        handler = getattr(self, 'cmd_' + command, None)
+        if handler is None:
+            return '', f'{command}: not supported by the simulator\n', 1
+        with self.lock:
+            self.advance()
+            try:
+                return handler(argv[1:])
+            except Exception as e:
+                return '', f'{command}: error: {e}\n', 1
+    # -----------------------------------------------
+
+    def cmd_sbatch(self, args):
+        options = dict()
+        script = None
+        idx = 0
+        while idx < len(args):
+            arg = args[idx]
+            if arg.startswith('-') and script is None:
+                key, value, idx = self._option(args, idx)
+                options[key] = value
+                continue
+            if script is None:
+                script = arg
+            idx += 1
+        if not script or not os.path.exists(script):
+            return '', f'sbatch: error: Unable to open file {script}\n', 1
+
+        with open(script, 'r') as fp:
+            for line in fp:
+                if not line.startswith('#SBATCH'):
+                    continue
+                directive = shlex.split(line[len('#SBATCH'):].strip().replace('=', ' ', 1))
+                if directive:
+                    key, value, _ = self._option(directive, 0)
+                    options.setdefault(key, value)
+
+        base_id = str(self.next_id)
+        self.next_id += 1
+        name = options.get('J') or os.path.basename(script)
+        partition = options.get('p') or 'debug'
+        nodes = int(str(options.get('N') or 1).split('-')[0])
+        output = options.get('o')
+        now = time.time()
+
+        tasks = [None]
+        if options.get('array'):
+            tasks = self._array_indices(options['array'])
+        for task in tasks:
+            job_id = base_id if task is None else f'{base_id}_{task}'
+            job = SimJob(
+                job_id=job_id,
+                name=name,
+                script=script,
+                partition=partition,
+                user=getpass.getuser(),
+                output=None if output == '/dev/null' else output,
+                ready_at=now + self.queue_wait(self.rng),
+                runtime=self.runtime(self.rng),
+                fails=self.rng.random() < self.failure_rate,
+                nodes=nodes)
+            if task is not None:
+                job.env['SLURM_ARRAY_TASK_ID'] = str(task)
+                job.env['SLURM_ARRAY_JOB_ID'] = base_id
+            self.jobs[job_id] = job
+            self.order.append(job_id)
+            self.active.append(job_id)
+        self.advance()
+        warning = f'sbatch: {self.sbatch_warning}\n' if self.sbatch_warning else ''
+        return f'Submitted batch job {base_id}\n', warning, 0
+    # -----------------------------------------------
+
+    @staticmethod
+    def _option(args, idx):
+        """
+        Parse one option starting at args[idx], returns the key, value and next index
+        """
+        arg = args[idx]
+        if arg.startswith('--'):
+            if '=' in arg:
+                key, value = arg[2:].split('=', 1)
+                return key, value, idx + 1
+            key = arg[2:]
+        else:
+            key = arg[1:2]
+            if len(arg) > 2:
+                return key, arg[2:].strip(), idx + 1
+        if idx + 1 < len(args) and not args[idx + 1].startswith('-'):
+            return key, args[idx + 1], idx + 2
+        return key, True, idx + 1
+    # -----------------------------------------------
+
+    @staticmethod
+    def _array_indices(spec):
+        indices = list()
+        for part in str(spec).split('%')[0].split(','):
+            if '-' in part:
+                low, high = part.split('-')
+                indices.extend(range(int(low), int(high) + 1))
+            else:
+                indices.append(int(part))
+        return indices
+    # -----------------------------------------------
+
+    def _select(self, ids):
+        """
+        The jobs matching a list of ids, array job ids match all their tasks
+        """
+        if ids is None:
+            return [self.jobs[x] for x in self.order]
+        selected = dict()
+        for job_id in ids:
+            if job_id in self.jobs:
+                selected[job_id] = self.jobs[job_id]
+            else:
+                selected.update((x, self.jobs[x]) for x in self.order if x.startswith(job_id + '_'))
+        return list(selected.values())
+    # -----------------------------------------------
+
+    def _in_queue(self, job, now):
+        if job.state in ['PENDING', 'RUNNING']:
+            return True
+        return job.end is not None and now - job.end < self.accounting_ttl
+    # -----------------------------------------------
+
+    def _field(self, job, code, now):
+        elapsed = 0
+        if job.start is not None:
+            elapsed = (job.end or now) - job.start
+        values = {
+            'i': job.job_id,
+            'j': job.name,
+            'P': job.partition,
+            'T': job.state,
+            't': STATE_CODES.get(job.state, job.state),
+            'M': format_elapsed(elapsed),
+            'u': job.user,
+            'o': job.script,
+            'D': str(job.nodes),
+            'X': job.exit_code,
+        }
+        return values.get(code, '')
+    # -----------------------------------------------
+
+    def cmd_squeue(self, args):
+        ids = None
+        fmt = '%i %P %j %u %t %M %D'
+        header = True
+        user = None
+        idx = 0
+        while idx < len(args):
+            arg = args[idx]
+            if arg == '-h':
+                header = False
+            elif arg.startswith('--jobs='):
+                ids = arg.split('=', 1)[1].split(',')
+            elif arg in ['-j', '--jobs']:
+                ids = args[idx + 1].split(',')
+                idx += 1
+            elif arg in ['-o', '--format']:
+                fmt = args[idx + 1]
+                idx += 1
+            elif arg in ['-u', '--user']:
+                user = args[idx + 1]
+                idx += 1
+            idx += 1
+
+        now = time.time()
+        jobs = [x for x in self._select(ids) if self._in_queue(x, now)]
+        if user:
+            jobs = [x for x in jobs if x.user == user]
+        if ids and not jobs and not any(x in self.jobs for x in ids):
+            return '', 'slurm_load_jobs error: Invalid job id specified\n', 1
+
+        lines = list()
+        if header:
+            lines.append(re.sub(r'%(\w)', lambda m: {
+                'i': 'JOBID', 'j': 'NAME', 'P': 'PARTITION', 'T': 'STATE', 't': 'ST',
+                'M': 'TIME', 'u': 'USER', 'o': 'COMMAND', 'D': 'NODES'}.get(m.group(1), ''), fmt))
+        for job in jobs:
+            lines.append(re.sub(r'%(\w)', lambda m: self._field(job, m.group(1), now), fmt))
+        return '\n'.join(lines) + '\n' if lines else '', '', 0
+    # -----------------------------------------------
+
+    def cmd_sacct(self, args):
+        ids = None
+        fields = ['JobID', 'JobName', 'Partition', 'State', 'Elapsed', 'User']
+        idx = 0
+        while idx < len(args):
+            arg = args[idx]
+            if arg in ['-j', '--jobs']:
+                ids = args[idx + 1].split(',')
+                idx += 1
+            elif arg in ['-o', '--format']:
+                fields = args[idx + 1].split(',')
+                idx += 1
+            idx += 1
+
+        now = time.time()
+        # MaxRSS is left empty, like on a real allocation line, as there are no job steps
+        codes = {'JobID': 'i', 'JobName': 'j', 'Partition': 'P', 'State': 'T',
+                 'ExitCode': 'X', 'Elapsed': 'M', 'User': 'u', 'NNodes': 'D'}
+        lines = list()
+        for job in self._select(ids):
+            values = [self._field(job, codes.get(x, ''), now) for x in fields]
+            lines.append('|'.join(values))
+        return '\n'.join(lines) + '\n' if lines else '', '', 0
+    # -----------------------------------------------
+
+    def cmd_scontrol(self, args):
+        if len(args) >= 3 and args[0] == 'show' and args[1] == 'job':
+            jobs = self._select([args[2]])
+            if not jobs:
+                return '', 'slurm_load_jobs error: Invalid job id specified\n', 1
+            job = jobs[0]
+            now = time.time()
+            return (f'JobId={job.job_id} JobName={job.name}\n'
+                    f'   UserId={job.user} Partition={job.partition}\n'
+                    f'   JobState={job.state} RunTime={self._field(job, "M", now)}\n'
+                    f'   Command={job.script}\n'), '', 0
+        return '', 'scontrol: only "show job" is supported by the simulator\n', 1
+    # -----------------------------------------------
+
+    def cmd_scancel(self, args):
+        ids = [x for x in args if not x.startswith('-')]
+        jobs = self._select(ids)
+        if not jobs:
+            return '', f'scancel: error: Invalid job id {" ".join(ids)}\n', 1
+        now = time.time()
+        for job in jobs:
+            if job.state not in ['PENDING', 'RUNNING']:
+                continue
+            if job.state == 'RUNNING':
+                self.busy_nodes -= job.nodes
+                if job.proc is not None and job.proc.poll() is None:
+                    job.proc.terminate()
+            job.state = 'CANCELLED'
+            job.exit_code = '0:15' if job.start is not None else '0:0'
+            job.end = now
+        return '', '', 0
+    # -----------------------------------------------
+
+    def cmd_sinfo(self, args):
+        nodes = self.nodes or 1
+        if '-o' in args:
+            busy = min(self.busy_nodes, nodes)
+            cores = self.cores_per_node
+            fields = {
+                'P': 'debug*',
+                'R': 'debug',
+                'D': str(nodes),
+                'c': str(cores),
+                'm': str(self.memory_per_node),
+                'a': 'up',
+                # allocated/idle/other/total
+                'F': f'{busy}/{nodes - busy}/0/{nodes}',
+                'C': f'{busy * cores}/{(nodes - busy) * cores}/0/{nodes * cores}',
+            }
+            fmt = args[args.index('-o') + 1]
+            return re.sub(r'%(\w)', lambda x: fields.get(x.group(1), ''), fmt) + '\n', '', 0
+        return ''.join(f'debug* up infinite 1 idle node{x:04d}\n' for x in range(nodes)), '', 0
+    # -----------------------------------------------
+
+    def cmd_sacctmgr(self, args):
+        """
+        Only the users association and qos limits are supported, in the
+        MaxJobs|GrpTRES|QOS and MaxJobsPU|MaxTRESPU formats processflow asks for
+        """
+        if 'assoc' in args:
+            max_jobs = str(self.user_max_jobs) if self.user_max_jobs else ''
+            return f'{max_jobs}|{self.user_tres}|normal\n', '', 0
+        if 'qos' in args:
+            return '|\n', '', 0
+        return '', 'sacctmgr: only "show assoc" and "show qos" are supported by the simulator\n', 1
+    # -----------------------------------------------
+
+    def cmd_simstats(self, args):
+        """
+        Not a slurm command, reports the simulators own counters
+        """
+        states = dict()
+        for job in self.jobs.values():
+            states[job.state] = states.get(job.state, 0) + 1
+        return json.dumps({'calls': self.counts, 'states': states}) + '\n', '', 0
+    # -----------------------------------------------
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        request = json.loads(self.rfile.readline().decode('utf-8'))
+        state = self.server.state
+        delay = state.rpc_latency(state.rng)
+        if delay > 0:
+            time.sleep(delay)
+        out, err, returncode = state.handle(request['argv'])
+        reply = {'stdout': out, 'stderr': err, 'returncode': returncode}
+        self.wfile.write((json.dumps(reply) + '\n').encode('utf-8'))
+# -----------------------------------------------
+
+
+class SimServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+# -----------------------------------------------
+
+
+def serve(home, **kwargs):
+    """
+    Run the daemon until its killed
+
+    Parameters:
+        home (str): the simulator directory, the socket is created in it
+        kwargs: passed on to SlurmState
+    """
+    socket_path = os.path.join(home, 'slurmsim.sock')
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = SimServer(socket_path, RequestHandler)
+    server.state = SlurmState(**kwargs)
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, stop)
+
+    # keep finishing executed jobs even when nobody is asking
+    def tick():
+        while True:
+            time.sleep(0.5)
+            with server.state.lock:
+                server.state.advance()
+    threading.Thread(target=tick, daemon=True).start()
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+# -----------------------------------------------
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fake slurm state daemon')
+    parser.add_argument('--home', required=True, help='Directory for the socket')
+    parser.add_argument('--queue-wait', default='0', help='Queue wait distribution, e.g. 5, uniform:1:10, exp:30')
+    parser.add_argument('--runtime', default='1', help='Job runtime distribution')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of jobs that fail')
+    parser.add_argument('--rpc-latency', default='0', help='Delay before every command replies')
+    parser.add_argument('--nodes', type=int, default=0, help='Cluster size in nodes, 0 for unlimited')
+    parser.add_argument('--execute', action='store_true', help='Run the job scripts')
+    parser.add_argument('--accounting-ttl', type=float, default=5, help='Seconds finished jobs stay in squeue')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sbatch-warning', default='', help='A warning sbatch writes to stderr on every submission')
+    parser.add_argument('--cores-per-node', type=int, default=64, help='Cores reported for each node')
+    parser.add_argument('--memory-per-node', type=int, default=256000, help='Megabytes of memory reported for each node')
+    parser.add_argument('--user-max-jobs', type=int, default=0, help='The users MaxJobs limit, 0 for none')
+    parser.add_argument('--user-tres', default='', help='The users GrpTRES limit, e.g. cpu=128,node=4')
+    args = parser.parse_args(argv)
+    serve(args.home,
+          queue_wait=args.queue_wait,
+          runtime=args.runtime,
+          failure_rate=args.failure_rate,
+          rpc_latency=args.rpc_latency,
+          nodes=args.nodes,
+          execute=args.execute,
+          accounting_ttl=args.accounting_ttl,
+          seed=args.seed,
+          cores_per_node=args.cores_per_node,
+          memory_per_node=args.memory_per_node,
+          user_max_jobs=args.user_max_jobs,
+          user_tres=args.user_tres,
+          sbatch_warning=args.sbatch_warning)
+    return 0
+# -----------------------------------------------
+
+
+if __name__ == '__main__':
+    sys.exit(main())
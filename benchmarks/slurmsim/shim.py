@@ -0,0 +1,34 @@
+"""
+A fake slurm command, installed under the name of each command it stands in for
+
+Sends its name and arguments to the simulator daemon and prints whatever the
+daemon replies with. SlurmSimulator.install copies this file into a bin
+directory once per command, with the daemons socket path filled in.
+"""
+import json
+import os
+import socket
+import sys
+
+SOCKET_PATH = os.environ.get('SLURMSIM_SOCKET', '')
+
+
+def main():
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(SOCKET_PATH)
+    except OSError as e:
+        sys.stderr.write(f'{os.path.basename(sys.argv[0])}: error: Unable to contact slurm controller ({e})\n')
+        return 1
+    request = {'argv': [os.path.basename(sys.argv[0])] + sys.argv[1:]}
+    conn.sendall((json.dumps(request) + '\n').encode('utf-8'))
+    with conn.makefile('rb') as reply_file:
+        reply = json.loads(reply_file.readline().decode('utf-8'))
+    conn.close()
+    sys.stdout.write(reply['stdout'])
+    sys.stderr.write(reply['stderr'])
+    return reply['returncode']
+
+
+if __name__ == '__main__':
+    sys.exit(main())
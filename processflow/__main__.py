@@ -6,8 +6,6 @@ import os
 import sys
 import threading
 
-from time import sleep
-
 from processflow.lib.finalize import finalize
 from processflow.lib.initialize import initialize
 from processflow.lib.util import print_debug, print_line
@@ -49,7 +47,7 @@ def main(cl_args=None):
     debug = True if config['global'].get('debug') else False
 
     # Main loop
-    loop_delay = 10
+    loop_control = runmanager.loop_control
     state_path = os.path.join(
         config['global']['project_path'],
         'output',
@@ -61,17 +59,19 @@ def main(cl_args=None):
         print("--------------------------")
         while True:
 
+            if debug and runmanager.submission_paused:
+                print_line(' -- slurm is unavailable, skipping submission and status checks --')
             if debug:
                 print_line(' -- checking data --')
-            runmanager.check_data_ready()
+            activity = runmanager.check_data_ready()
 
             if debug:
                 print_line(' -- starting ready jobs --')
-            runmanager.start_ready_jobs()
+            activity += runmanager.start_ready_jobs()
 
             if debug:
                 print_line(' -- monitoring running jobs --')
-            runmanager.monitor_running_jobs(debug=debug)
+            activity += runmanager.monitor_running_jobs(debug=debug)
 
             if debug:
                 print_line(' -- writing out state --')
@@ -88,9 +88,11 @@ def main(cl_args=None):
                 # SUCCESS EXIT
                 return 0
 
+            loop_control.record_pass(activity)
             if debug:
-                print_line(' -- sleeping')
-            sleep(loop_delay)
+                print_line(' -- sleeping for up to {:.1f} seconds'.format(
+                    loop_control.delay))
+            loop_control.wait()
     except KeyboardInterrupt as e:
         print_line('----- KEYBOARD INTERRUPT -----', status='err')
         if debug:
@@ -100,6 +102,7 @@ def main(cl_args=None):
         print_debug(e)
     finally:
         runmanager.write_job_sets(state_path)
+        runmanager.shutdown()
 # -----------------------------------------------
 
 
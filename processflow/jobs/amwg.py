@@ -15,6 +15,9 @@ from processflow.lib.util import render, print_line
 
 
 class AMWG(Diag):
+
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         """
         Parameters
@@ -53,18 +56,12 @@ class AMWG(Diag):
                     start=self.start_year,
                     end=self.end_year,
                     comp=self._short_comp_name)
-            custom_args = config['diags'][self.job_type].get(
-                'custom_args')
-            if custom_args:
-                self.set_custom_args(custom_args)
 
             # setup the output directory, creating it if it doesnt already exist
             custom_output_path = config['diags'][self.job_type].get(
                 'custom_output_path')
             if custom_output_path:
-                self._replace_dict['COMPARISON'] = self._short_comp_name
-                self._output_path = self.setup_output_directory(
-                    custom_output_path)
+                self._output_path = self.setup_output_directory(custom_output_path, config)
             else:
                 self._output_path = os.path.join(
                     config['global']['project_path'],
@@ -76,13 +73,10 @@ class AMWG(Diag):
                         start=self.start_year,
                         end=self.end_year,
                         comp=self._short_comp_name))
-            if not os.path.exists(self._output_path):
-                os.makedirs(self._output_path)
+            self._make_directory(self._output_path)
         else:
             self._host_path = ''
             self._output_path = ''
-
-        self.setup_job_args(config)
     # -----------------------------------------------
 
     def setup_data(self, config, filemanager, case):
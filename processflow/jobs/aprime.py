@@ -11,6 +11,9 @@ from processflow.lib.util import render, print_line
 
 
 class Aprime(Diag):
+
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         """
         Parameters
@@ -40,17 +43,14 @@ class Aprime(Diag):
                         start=self.start_year,
                         end=self.end_year,
                         comp=self._short_comp_name))
-            custom_args = config['diags'][self.job_type].get(
-                'custom_args')
-            if custom_args:
-                self.set_custom_args(custom_args)
+            else:
+                self._host_path = ''
 
             # setup the output directory, creating it if it doesnt already exist
             custom_output_path = config['diags'][self.job_type].get(
                 'custom_output_path')
             if custom_output_path:
-                self._replace_dict['COMPARISON'] = self._short_comp_name
-                self._output_path = self.setup_output_directory(custom_output_path)
+                self._output_path = self.setup_output_directory(custom_output_path, config)
             else:
                 self._output_path = os.path.join(
                     kwargs['config']['global']['project_path'],
@@ -62,12 +62,10 @@ class Aprime(Diag):
                         start=self.start_year,
                         end=self.end_year,
                         comp=self._short_comp_name))
-            if not os.path.exists(self._output_path):
-                os.makedirs(self._output_path)
+            self._make_directory(self._output_path)
         else:
             self._host_path = ''
             self._output_path = ''
-        self.setup_job_args(config)
     # -----------------------------------------------
 
     def setup_dependencies(self, *args, **kwargs):
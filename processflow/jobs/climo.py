@@ -12,6 +12,9 @@ from processflow.lib.filemanager import FileStatus
 
 
 class Climo(Job):
+
+    __slots__ = ('_regrid_path',)
+
     def __init__(self, *args, **kwargs):
         super(Climo, self).__init__(*args, **kwargs)
         self._job_type = 'climo'
@@ -20,16 +23,12 @@ class Climo(Job):
         self._regrid_path = ""
 
         config = kwargs['config']
-        custom_args = config['post-processing'][self.job_type].get(
-            'custom_args')
-        if custom_args:
-            self.set_custom_args(custom_args)
 
         # setup the output directory, creating it if it doesnt already exist
         custom_output_path = config['post-processing'][self.job_type].get(
             'custom_output_path')
         if custom_output_path:
-            self._output_path = self.setup_output_directory(custom_output_path)
+            self._output_path = self.setup_output_directory(custom_output_path, config)
             self._regrid_path = self._output_path
         else:
             self._output_path = os.path.join(
@@ -49,9 +48,7 @@ class Climo(Job):
                 self._short_name,
                 '{length}yr'.format(length=self.end_year - self.start_year + 1))
         for path in [self._output_path, self._regrid_path]:
-            if not os.path.exists(path):
-                os.makedirs(path)
-        self.setup_job_args(config)
+            self._make_directory(path)
     # -----------------------------------------------
 
     def setup_dependencies(self, *args, **kwargs):
@@ -14,6 +14,8 @@ class Cmor(Job):
     CMORize e3sm model output
     """
 
+    __slots__ = ('_completed_vars', '_numproc', '_simple', '_table', '_variables')
+
     def __init__(self, *args, **kwargs):
         """
         Parameters
@@ -29,12 +31,7 @@ class Cmor(Job):
         self._table = ''
         self._completed_vars = []
         self._simple = False if config['simulations'][self.case].get('user_input_json_path') else True
-
-        custom_args = config['post-processing'][self.job_type].get(
-            'custom_args')
-        if custom_args:
-            self.set_custom_args(custom_args)
-
+        self._numproc = int(config['post-processing']['cmor'].get('numproc', 24))
 
         if not kwargs.get('run_type'):
             raise ValueError(f'CMOR job must be given a list of tables to run on')
@@ -72,7 +69,7 @@ class Cmor(Job):
         custom_output_path = config['post-processing'][self.job_type].get(
             'custom_output_path')
         if custom_output_path:
-            self._output_path = self.setup_output_directory(custom_output_path)
+            self._output_path = self.setup_output_directory(custom_output_path, config)
         else:
             self._output_path = os.path.join(
                 config['global']['project_path'],
@@ -80,9 +77,7 @@ class Cmor(Job):
                 'pp',
                 'cmor',
                 self.short_name)
-        if not os.path.exists(self._output_path):
-            os.makedirs(self._output_path)
-        self.setup_job_args(config)
+        self._make_directory(self._output_path)
     # -----------------------------------------------
 
     def _dep_filter(self, job):
@@ -224,7 +219,7 @@ class Cmor(Job):
             if not os.path.lexists(dest):
                 os.symlink(path, dest)
         
-        numproc = config['post-processing']['cmor'].get('numproc', 24)
+        numproc = self._numproc
 
         cmd = [
             'e3sm_to_cmip',
@@ -260,6 +255,15 @@ class Cmor(Job):
         return self._submit_cmd_to_manager(config, cmd)
     # -----------------------------------------------
 
+    def get_resources(self):
+        """
+        e3sm_to_cmip runs numproc worker processes, so the job needs at least that many cores
+        """
+        resources = super(Cmor, self).get_resources()
+        resources.cores = max(resources.cores, self._numproc)
+        return resources
+    # -----------------------------------------------
+
     def handle_completion(self, filemanager, config, *args, **kwargs):
         """
         Adds the output from cmor into the filemanager database as type 'cmorized'
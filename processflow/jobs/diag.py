@@ -19,6 +19,11 @@ from processflow.lib.util import create_symlink_dir, render
 
 
 class Diag(Job):
+
+    __slots__ = ('_host_url', '_host_path', '_short_comp_name', '_comparison', '_job_params')
+
+    _config_section = 'diags'
+
     def __init__(self, *args, **kwargs):
         super(Diag, self).__init__(*args, **kwargs)
         self._host_url = ''
@@ -37,6 +42,12 @@ class Diag(Job):
         return self._comparison
     # -----------------------------------------------
 
+    def replacements(self, config):
+        replace = super(Diag, self).replacements(config)
+        replace['COMPARISON'] = self._short_comp_name
+        return replace
+    # -----------------------------------------------
+
     def __str__(self):
         return json.dumps({
             'type': self._job_type,
@@ -254,7 +265,7 @@ class Diag(Job):
         script_prefix = ''
 
         if isinstance(self._manager, Slurm):
-            margs = self._manager_args['slurm']
+            margs = self._own_manager_args()['slurm']
             margs.append(
                 '-o {}'.format(self._console_output_path))
             manager_prefix = '#SBATCH'
@@ -280,27 +291,12 @@ class Diag(Job):
             input_path=template_input_path,
             output_path=run_script)
 
-        # if this is a dry run, set the status and exit
-        if self._dryrun:
-            msg = '{}: dryrun is set, completing without running'.format(
-                self.msg_prefix())
-            logging.info(msg)
-            print_line(msg)
-            self.status = JobStatus.COMPLETED
-            return False
-
-        msg = '{}: Job ready, submitting to queue'.format(
-            self.msg_prefix())
-        print_line(msg)
-
-        # submit the run script to the resource controller
-        self._job_id = self._manager.batch(run_script)
-        self._has_been_executed = True
-        return self._job_id
+        return self._dispatch_script(run_script)
     # -----------------------------------------------
 
     def setup_job_args(self, config):
         if config['diags'][self._job_type].get('job_args'):
+            self._job_args = list(self._job_args)
             for _, val in config['diags'][self._job_type]['job_args'].items():
                 self._job_args.append(val)
     # -----------------------------------------------
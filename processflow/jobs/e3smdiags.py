@@ -12,6 +12,9 @@ from processflow.lib.jobstatus import JobStatus
 from processflow.lib.util import render, print_line
 
 class E3SMDiags(Diag):
+
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         super(E3SMDiags, self).__init__(*args, **kwargs)
         self._job_type = 'e3sm_diags'
@@ -19,11 +22,7 @@ class E3SMDiags(Diag):
         self._data_required = []
 
         config = kwargs['config']
-        custom_args = config['diags']['e3sm_diags'].get(
-            'custom_args')
-        if custom_args:
-            self.set_custom_args(custom_args)
-        
+
         if 'area_mean_time_series' in config['diags']['e3sm_diags']['sets_to_run']:
             self._requires.append('timeseries')
             self._data_required.append('ts_regrid_atm')
@@ -48,8 +47,7 @@ class E3SMDiags(Diag):
         custom_output_path = config['diags'][self.job_type].get(
             'custom_output_path')
         if custom_output_path:
-            self._replace_dict['COMPARISON'] = self._short_comp_name
-            self._output_path = self.setup_output_directory(custom_output_path)
+            self._output_path = self.setup_output_directory(custom_output_path, config)
         else:
             self._output_path = os.path.join(
                 config['global']['project_path'],
@@ -61,9 +59,11 @@ class E3SMDiags(Diag):
                     start=self.start_year,
                     end=self.end_year,
                     comp=self._short_comp_name))
-        if not os.path.exists(self._output_path):
-            os.makedirs(self._output_path)
-        self.setup_job_args(config)
+        self._make_directory(self._output_path)
+    # -----------------------------------------------
+
+    def setup_job_args(self, config):
+        super(E3SMDiags, self).setup_job_args(config)
         self.setup_job_params(config)
     # -----------------------------------------------
 
@@ -14,6 +14,9 @@ from processflow.lib.jobstatus import JobStatus
 
 
 class ILAMB(Diag):
+
+    __slots__ = ('_run_name', '_variables')
+
     def __init__(self, *args, **kwargs):
         """
         Parameters
@@ -51,18 +54,12 @@ class ILAMB(Diag):
                 'ilamb', 
                 self.short_name,
                 self._run_name)
-        if not os.path.exists(self._host_path):
-            os.makedirs(self._host_path)
-
-        custom_args = config['diags'][self.job_type].get(
-            'custom_args')
-        if custom_args:
-            self.set_custom_args(custom_args)
+        self._make_directory(self._host_path)
 
-        custom_output_path = config['post-processing'][self.job_type].get(
+        custom_output_path = config['diags'][self.job_type].get(
             'custom_output_path')
         if custom_output_path:
-            self._output_path = self.setup_output_directory(custom_output_path)
+            self._output_path = self.setup_output_directory(custom_output_path, config)
         else:
             self._output_path = os.path.join(
                 config['global']['project_path'],
@@ -71,13 +68,13 @@ class ILAMB(Diag):
                 self.short_name,
                 'ilamb',
                 self._run_name)
-        os.makedirs(self._output_path, exist_ok=True)
+        self._make_directory(self._output_path)
         
         self._input_base_path = os.path.join(
             self._output_path,
             'MODELS',
             self.short_name)
-        os.makedirs(self._input_base_path, exist_ok=True)
+        self._make_directory(self._input_base_path)
     
 
     def _dep_filter(self, job):
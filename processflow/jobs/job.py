@@ -9,7 +9,10 @@ import sys
 
 from uuid import uuid4
 
+from processflow.lib.history import format_walltime, parse_elapsed
 from processflow.lib.jobstatus import JobStatus
+from processflow.lib.localmanager import LocalManager
+from processflow.lib.resources import ResourceRequest
 from processflow.lib.serial import Serial
 from processflow.lib.slurm import Slurm
 from processflow.lib.util import render, create_symlink_dir, print_line
@@ -18,8 +21,35 @@ from processflow.lib.util import render, create_symlink_dir, print_line
 class Job(object):
     """
     A base job class for all post-processing and diagnostic jobs
+
+    Jobs are cheap to create, the output directories they need and the
+    custom arguments from the config are only worked out once the job is
+    about to run, by materialize
+
+    A plan can hold hundreds of thousands of jobs, so they keep their
+    attributes in __slots__ instead of an instance __dict__, and every
+    subclass lists the attributes it adds in its own __slots__
     """
 
+    __slots__ = (
+        '_start_year', '_end_year', '_data_required', '_data_ready',
+        '_depends_on', '_id', '_job_id', '_has_been_executed', '_status',
+        '_case', '_short_name', '_run_type', '_job_type', '_input_file_paths',
+        '_input_base_path', '_console_output_path', '_output_path', '_dryrun',
+        '_job_args', '_requires', '_defer_submit', '_pending_script',
+        '_directories', '_materialized', '_manager', '_manager_args',
+        '_custom_walltime',
+    )
+
+    # the section of the config the settings for this job type are under
+    _config_section = 'post-processing'
+
+    # the resource manager arguments every job starts with, all jobs share
+    # them until one changes its own, see _own_manager_args
+    _default_manager_args = {
+        'slurm': ('-t 0-01:00', '-N 1'),
+    }
+
     def __init__(self, start, end, case, short_name, data_required=None, dryrun=False, manager=None, **kwargs):
         self._start_year = start
         self._end_year = end
@@ -30,48 +60,120 @@ class Job(object):
         self._job_id = 0
         self._has_been_executed = False
         self._status = JobStatus.VALID
-        self._case = case
-        self._short_name = short_name
-        self._run_type = kwargs.get('run_type')
+        # every job of a case has the same names, keep one copy of them
+        self._case = sys.intern(case)
+        self._short_name = sys.intern(short_name)
+        run_type = kwargs.get('run_type')
+        self._run_type = sys.intern(run_type) if isinstance(run_type, str) else run_type
         self._job_type = None
         self._input_file_paths = list()
         self._input_base_path = ''
         self._console_output_path = None
         self._output_path = ''
         self._dryrun = dryrun
-        self._job_args = list()
+        self._job_args = ()
         self._requires = []
+        # set by the runmanager when this jobs script should be collected and
+        # submitted together with others instead of on its own
+        self._defer_submit = False
+        self._pending_script = None
+        # directories to create once the job is materialized
+        self._directories = ()
+        self._materialized = False
         if manager:
             self._manager = manager
         else:
             self._manager = Serial()
 
-        self._manager_args = {
-            'slurm': ['-t 0-01:00', '-N 1'],
-        }
-        config = kwargs['config']
-        # setup the default replacement dict
-        self._replace_dict = {
+        self._manager_args = Job._default_manager_args
+        # set when the user picked the time limit, so it isnt replaced by a predicted one
+        self._custom_walltime = False
+    # -----------------------------------------------
+
+    def __getstate__(self):
+        """
+        The jobs attributes for the plan cache, the resource manager is left
+        out and set again by the runmanager that loads the job
+        """
+        state = dict()
+        for cls in type(self).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if name != '_manager' and hasattr(self, name):
+                    state[name] = getattr(self, name)
+        return state
+    # -----------------------------------------------
+
+    def __setstate__(self, state):
+        if not hasattr(self, '_manager'):
+            self._manager = None
+        for name, value in state.items():
+            setattr(self, name, value)
+        # go back to sharing the defaults if they hadnt been changed
+        if self._manager_args == Job._default_manager_args:
+            self._manager_args = Job._default_manager_args
+    # -----------------------------------------------
+
+    def replacements(self, config):
+        """
+        Returns the mapping of the names that can be used in a custom_output_path to their values for this job
+        """
+        return {
             'PROJECT_PATH': config['global']['project_path'],
-            'CASEID': case,
+            'CASEID': self._case,
             'REST_YR': '{:04d}'.format(self.start_year + 1),
             'START_YR': '{:04d}'.format(self.start_year),
             'END_YR': '{:04d}'.format(self.end_year),
-            'LOCAL_PATH': config['simulations'][case].get('local_path', ''),
+            'LOCAL_PATH': config['simulations'][self._case].get('local_path', ''),
         }
-
     # -----------------------------------------------
 
-    def setup_output_directory(self, custom_output_string):
-        for string, val in list(self._replace_dict.items()):
+    def setup_output_directory(self, custom_output_string, config):
+        for string, val in list(self.replacements(config).items()):
             if string in custom_output_string:
                 custom_output_string = custom_output_string.replace(
                     string, val)
         return custom_output_string
     # -----------------------------------------------
 
+    def _make_directory(self, path):
+        """
+        Record a directory this job needs, it isnt created until the job is materialized
+        """
+        if path and path not in self._directories:
+            self._directories += (path,)
+    # -----------------------------------------------
+
+    def materialize(self, config):
+        """
+        Get the job ready to run, creating its directories and applying the
+        custom and job arguments from the config. Only the first call does
+        anything, so this is safe to call every time the job is looked at.
+
+        Parameters
+        ----------
+            config (dict): the global configuration object
+        """
+        if self._materialized:
+            return
+        for path in self._directories:
+            if not os.path.exists(path):
+                os.makedirs(path)
+        custom_args = config[self._config_section].get(
+            self._job_type, {}).get('custom_args')
+        if custom_args:
+            self.set_custom_args(custom_args)
+        self.setup_job_args(config)
+        self._materialized = True
+    # -----------------------------------------------
+
+    @property
+    def materialized(self):
+        return self._materialized
+    # -----------------------------------------------
+
     def setup_job_args(self, config):
         if config['post-processing'][self._job_type].get('job_args'):
+            self._job_args = list(self._job_args)
             for _, val in config['post-processing'][self._job_type]['job_args'].items():
                 self._job_args.append(val)
     # -----------------------------------------------
@@ -118,7 +220,9 @@ class Job(object):
         """
         for arg, val in list(custom_args.items()):
             new_arg = val
-            for _, manager_args in list(self._manager_args.items()):
+            if arg.strip() in ['-t', '--time']:
+                self._custom_walltime = True
+            for _, manager_args in list(self._own_manager_args().items()):
                 found = False
                 for idx, marg in enumerate(manager_args):
                     if arg in marg:
@@ -327,7 +431,7 @@ class Job(object):
         command = ' '.join([str(x) for x in cmd])
         script_prefix = ''
         if isinstance(self._manager, Slurm):
-            margs = self._manager_args['slurm']
+            margs = self._own_manager_args()['slurm']
             margs.append(f'-o {self._console_output_path}')
             manager_prefix = '#SBATCH'
             for item in margs:
@@ -350,6 +454,21 @@ class Job(object):
             input_path=template_input_path,
             output_path=run_script)
 
+        return self._dispatch_script(run_script)
+    # -----------------------------------------------
+
+    def _dispatch_script(self, run_script):
+        """
+        Submits a generated run script to the resource manager, or holds onto it
+        if submission has been deferred so it can be submitted as part of a group
+
+        Parameters:
+            run_script (str): the path to the run script
+        Returns:
+            job_id (int): the job_id from the resource manager,
+            False if this is a dry run,
+            None if the submission was deferred
+        """
         # if this is a dry run, set the status and exit
         if self._dryrun:
             msg = f'{self.msg_prefix()}: dryrun is set, completing without running'
@@ -358,15 +477,80 @@ class Job(object):
             self.status = JobStatus.COMPLETED
             return False
 
+        if self._defer_submit:
+            self._pending_script = run_script
+            return None
+
         msg = f'{self.msg_prefix()}: Job ready, submitting to queue'
         print_line(msg)
 
         # submit the run script to the resource controller
-        self._job_id = self._manager.batch(run_script)
+        if isinstance(self._manager, LocalManager):
+            # the local manager sizes each job from its cpu and memory requests
+            resources = self.get_resources()
+            self._job_id = self._manager.batch(
+                run_script,
+                cores=resources.cores,
+                memory=resources.memory)
+        else:
+            self._job_id = self._manager.batch(run_script)
         self._has_been_executed = True
         return self._job_id
     # -----------------------------------------------
 
+    def _own_manager_args(self):
+        """
+        Returns the resource manager arguments of this job for changing, the
+        first time this is called the shared defaults are copied for the job
+        """
+        if self._manager_args is Job._default_manager_args:
+            self._manager_args = {x: list(y) for x, y in self._manager_args.items()}
+        return self._manager_args
+    # -----------------------------------------------
+
+    def get_resource_args(self):
+        """
+        Returns the slurm arguments that describe the resources this job needs,
+        leaving out the per-job output path
+        """
+        return [x for x in self._manager_args['slurm'] if not x.startswith('-o ')]
+    # -----------------------------------------------
+
+    def get_walltime(self):
+        """
+        Returns the time limit this job asks for in seconds, or None if it doesnt ask for one
+        """
+        for item in self._manager_args['slurm']:
+            if item.startswith('-t ') or item.startswith('--time'):
+                return parse_elapsed(item.replace('=', ' ').split()[-1])
+        return None
+    # -----------------------------------------------
+
+    def set_walltime(self, minutes):
+        """
+        Replace the jobs default time limit, unless the user gave one in the config
+
+        Parameters:
+            minutes (float): the new time limit
+        Returns:
+            True if the time limit was changed
+        """
+        if self._custom_walltime:
+            return False
+        margs = [x for x in self._manager_args['slurm']
+                 if not x.startswith('-t ') and not x.startswith('--time')]
+        margs.insert(0, f'-t {format_walltime(minutes)}')
+        self._own_manager_args()['slurm'] = margs
+        return True
+    # -----------------------------------------------
+
+    def get_resources(self):
+        """
+        Returns the ResourceRequest for the nodes, cores and memory this job needs
+        """
+        return ResourceRequest.from_args(self.get_resource_args())
+    # -----------------------------------------------
+
     def prevalidate(self, *args, **kwargs):
         if not self.data_ready:
             msg = '{prefix}: data not ready'.format(prefix=self.msg_prefix())
@@ -9,6 +9,9 @@ from processflow.lib.util import render
 
 
 class MPASAnalysis(Diag):
+
+    __slots__ = ('case_start_year',)
+
     def __init__(self, *args, **kwargs):
         """
         Parameters
@@ -41,17 +44,11 @@ class MPASAnalysis(Diag):
         else:
             self._host_path = 'html'
 
-        custom_args = kwargs['config']['diags'][self.job_type].get(
-            'custom_args')
-        if custom_args:
-            self.set_custom_args(custom_args)
-
         # setup the output directory, creating it if it doesnt already exist
         custom_output_path = kwargs['config']['diags'][self.job_type].get(
             'custom_output_path')
         if custom_output_path:
-            self._replace_dict['COMPARISON'] = self._short_comp_name
-            self._output_path = self.setup_output_directory(custom_output_path)
+            self._output_path = self.setup_output_directory(custom_output_path, config)
         else:
             self._output_path = os.path.join(
                 kwargs['config']['global']['project_path'],
@@ -63,9 +60,7 @@ class MPASAnalysis(Diag):
                     start=self.start_year,
                     end=self.end_year,
                     comp=self._short_comp_name))
-        if not os.path.exists(self._output_path):
-            os.makedirs(self._output_path)
-        self.setup_job_args(config)
+        self._make_directory(self._output_path)
     # -----------------------------------------------
 
     def setup_dependencies(self, *args, **kwargs):
@@ -14,6 +14,8 @@ class Regrid(Job):
     Perform regridding with no climatology or timeseries generation on atm, lnd, and orn data
     """
 
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         """
         Initialize a regrid job
@@ -25,16 +27,12 @@ class Regrid(Job):
         self._data_required = [self._run_type]
 
         config = kwargs.get('config')
-        custom_args = config['post-processing'][self.job_type].get(
-            'custom_args')
-        if custom_args:
-            self.set_custom_args(custom_args)
 
         # setup the output directory, creating it if it doesnt already exist
         custom_output_path = kwargs['config']['post-processing'][self.job_type].get(
             'custom_output_path')
         if custom_output_path:
-            self._output_path = self.setup_output_directory(custom_output_path)
+            self._output_path = self.setup_output_directory(custom_output_path, config)
         else:
             self._output_path = os.path.join(
                 config['global']['project_path'],
@@ -43,9 +41,7 @@ class Regrid(Job):
                 'regrid_' + config['post-processing']['regrid'][self.run_type]['destination_grid_name'],
                 self._short_name,
                 self.run_type)
-        if not os.path.exists(self._output_path):
-            os.makedirs(self._output_path)
-        self.setup_job_args(config)
+        self._make_directory(self._output_path)
     # -----------------------------------------------
 
     def setup_dependencies(self, *args, **kwargs):
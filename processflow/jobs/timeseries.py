@@ -17,6 +17,8 @@ class Timeseries(Job):
     A Job subclass for managing time series variable extraction
     """
 
+    __slots__ = ('_original_var_list', '_regrid', '_regrid_path', '_var_list')
+
     def __init__(self, *args, **kwargs):
         super(Timeseries, self).__init__(*args, **kwargs)
         self._job_type = 'timeseries'
@@ -25,10 +27,6 @@ class Timeseries(Job):
         self._regrid_path = ''
 
         config = kwargs['config']
-        custom_args = config['post-processing']['timeseries'].get(
-            'custom_args')
-        if custom_args:
-            self.set_custom_args(custom_args)
 
         self._original_var_list = config['post-processing']['timeseries'][self._run_type]
         if isinstance(self._original_var_list, list) and ' ' in self._original_var_list[0]:
@@ -42,7 +40,7 @@ class Timeseries(Job):
         custom_output_path = config['post-processing'][self.job_type].get(
             'custom_output_path')
         if custom_output_path:
-            self._output_path = self.setup_output_directory(custom_output_path)
+            self._output_path = self.setup_output_directory(custom_output_path, config)
         else:
             self._output_path = os.path.join(
                 config['global']['project_path'],
@@ -53,8 +51,7 @@ class Timeseries(Job):
                 config['simulations'][self.case]['native_grid_name'],
                 '{length}yr'.format(length=self.end_year - self.start_year + 1),
                 self._run_type)
-        if not os.path.exists(self._output_path):
-            os.makedirs(self._output_path)
+        self._make_directory(self._output_path)
 
         regrid_map_path = config['post-processing']['timeseries'].get(
             'regrid_map_path')
@@ -69,11 +66,9 @@ class Timeseries(Job):
                 config['post-processing']['timeseries']['destination_grid_name'],
                 '{length}yr'.format(length=self.end_year - self.start_year + 1),
                 self._run_type)
-            if not os.path.exists(self._regrid_path):
-                os.makedirs(self._regrid_path)
+            self._make_directory(self._regrid_path)
         else:
             self._regrid = False
-        self.setup_job_args(config)
 
     @property
     def output_path(self):
@@ -90,13 +85,15 @@ class Timeseries(Job):
         return True
     # -----------------------------------------------
 
-    def postvalidate(self, config, *args, **kwargs):
+    def postvalidate(self, config, *args, workers=8, **kwargs):
         """
         validate that all the timeseries variable files were producted as expected
 
         Parameters
         ----------
             config (dict): the global config object
+            workers (int): the number of processes to open the output files with,
+                1 checks them one at a time in this process
         Returns
         -------
             True if all the files exist
@@ -110,7 +107,7 @@ class Timeseries(Job):
             return True
         
         # filter out variables that exist
-        self.filter_var_list()
+        self.filter_var_list(workers=workers)
         if not self._var_list:
             self.status = JobStatus.COMPLETED
             return True
@@ -159,7 +156,7 @@ class Timeseries(Job):
         else:
             return None
         
-    def filter_var_list(self):
+    def filter_var_list(self, workers=8):
         to_remove = list()
 
         # if regridding is turned on check that all regrid ts files were created
@@ -171,26 +168,33 @@ class Timeseries(Job):
         if not os.path.exists(file_source) or not len(os.listdir(file_source)):
             return
         
+        file_paths = list()
+        for var in self._var_list:
+            if os.path.exists(os.path.join(file_source, f"{var}.nc")):
+                file_name = f"{var}.nc"
+            else:
+                file_name = "{var}_{start:04d}01_{end:04d}12.nc".format(
+                    var=var,
+                    start=self.start_year,
+                    end=self.end_year)
+            file_paths.append((os.path.join(file_source, file_name), var))
+
         pbar = tqdm(total=len(self._var_list), desc=f"{colors.OKGREEN}[+]{colors.ENDC} {self.msg_prefix()}: Checking time-series output")
-        futures = []
-        with ProcessPoolExecutor(max_workers=8) as pool:
-            for var in self._var_list:
-                if os.path.exists(os.path.join(file_source, f"{var}.nc")):
-                    file_name = f"{var}.nc"
-                else:
-                    file_name = "{var}_{start:04d}01_{end:04d}12.nc".format(
-                        var=var,
-                        start=self.start_year,
-                        end=self.end_year)
-                file_path = os.path.join(file_source, file_name)
-                futures.append(
-                    pool.submit(self.check_file_integrity, file_path, var))
-            
-            for future in as_completed(futures):
+        if workers <= 1:
+            # already running inside a worker process, like under the BulkValidator
+            for file_path, var in file_paths:
                 pbar.update(1)
-                res = future.result()
-                if res:
-                    to_remove.append(res)
+                if self.check_file_integrity(file_path, var):
+                    to_remove.append(var)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(self.check_file_integrity, file_path, var)
+                           for file_path, var in file_paths]
+                for future in as_completed(futures):
+                    pbar.update(1)
+                    res = future.result()
+                    if res:
+                        to_remove.append(res)
         pbar.close()
         self._var_list = list(
             filter(lambda x: x not in to_remove, self._var_list)
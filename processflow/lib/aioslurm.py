@@ -0,0 +1,239 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+import asyncio
+import getpass
+import logging
+import random
+
+from processflow.lib.ratelimit import SlurmUnavailable, is_unhealthy_error
+from processflow.lib.slurm import Slurm
+from processflow.lib.util import print_line
+
+
+class AsyncSlurm(Slurm):
+    """
+    A Slurm interface whose commands run as asyncio subprocesses
+
+    Every command runs under a semaphore so no more than max_concurrency slurm
+    commands are in flight at once, is killed if it takes longer than timeout
+    seconds, and is retried with jittered exponential backoff. This lets many
+    jobs be submitted at once, and lets status polling run alongside submission,
+    without one slow slurmctld response holding up the rest. The blocking Slurm
+    methods are all still available, and share the same rate limiter and
+    circuit breaker. A time out counts as a failure towards the breaker, and
+    once it opens commands stop being retried.
+
+    Parameters:
+        max_concurrency (int): the most slurm commands to run at once
+        timeout (float): seconds to wait for a slurm command before giving up on it
+        retries (int): how many times to retry a failed command
+        backoff (float): the base delay in seconds between retries
+        kwargs: the rate limit and circuit breaker settings passed on to Slurm
+    """
+
+    def __init__(self, max_concurrency=8, timeout=60, retries=3, backoff=1.0, **kwargs):
+        super(AsyncSlurm, self).__init__(**kwargs)
+        self._max_concurrency = max(1, int(max_concurrency))
+        self._timeout = float(timeout)
+        self._retries = int(retries)
+        self._backoff = float(backoff)
+        self._semaphore = None
+        self._semaphore_loop = None
+    # -----------------------------------------------
+
+    def _limit(self):
+        # a semaphore can only be used from the event loop it was first used on
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+    # -----------------------------------------------
+
+    async def _exec(self, cmd):
+        """
+        Run a command, killing it if it runs past the timeout
+
+        Returns:
+            the return code, stdout and stderr of the command
+        Raises:
+            SlurmUnavailable if the circuit breaker is open
+        """
+        self.breaker.check(cmd[0])
+        await self.limiter.aacquire()
+        async with self._limit():
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE)
+            except OSError:
+                self.breaker.record_failure()
+                raise
+            try:
+                out, err = await asyncio.wait_for(proc.communicate(), self._timeout)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                self.breaker.record_failure()
+                raise
+        out, err = out.decode('utf-8'), err.decode('utf-8')
+        if is_unhealthy_error(err):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return proc.returncode, out, err
+    # -----------------------------------------------
+
+    async def _exec_with_retry(self, cmd, retry_on_error=True, already_done=None):
+        """
+        Run a command, retrying with a jittered backoff when it times out or
+        (if retry_on_error) exits with an error
+
+        Parameters:
+            cmd (list): the command to run
+            retry_on_error (bool): retry when the command exits non-zero, otherwise
+                only time outs and failures to start are retried
+            already_done (coroutine function): called before each retry, if it returns
+                something other than None thats returned instead of retrying
+        Returns:
+            the return code, stdout and stderr of the last attempt, or whatever already_done returned
+        Raises:
+            SlurmUnavailable as soon as the circuit breaker opens, instead of retrying
+        """
+        reason = None
+        for attempt in range(self._retries + 1):
+            if attempt:
+                delay = self._backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                logging.info(f'{cmd[0]} failed ({reason}), retrying in {delay:.1f} seconds')
+                await asyncio.sleep(delay)
+                if already_done is not None:
+                    result = await already_done()
+                    if result is not None:
+                        return result
+            try:
+                returncode, out, err = await self._exec(cmd)
+            except asyncio.TimeoutError:
+                reason = f'timed out after {self._timeout} seconds'
+                continue
+            except OSError as e:
+                reason = str(e)
+                continue
+            if returncode == 0 or not retry_on_error:
+                return returncode, out, err
+            reason = err.strip() or f'exit code {returncode}'
+        raise Exception(f'SLURM ERROR: {cmd[0]} {reason}')
+    # -----------------------------------------------
+
+    async def abatch(self, cmd, sargs=None):
+        """
+        Submit a run script
+
+        Returns:
+            the job id (int), or 0 if the submission failed
+        """
+        sbatch = ['sbatch', sargs, cmd] if sargs is not None else ['sbatch', cmd]
+
+        async def already_submitted():
+            # a timed out sbatch may still have gone through
+            job_id = await self._find_submitted(cmd)
+            return (0, f'Submitted batch job {job_id}', '') if job_id else None
+
+        try:
+            _, out, _ = await self._exec_with_retry(sbatch, already_done=already_submitted)
+        except Exception as e:
+            msg = f'Unable to submit {cmd}: {e}'
+            print_line(msg, status='err')
+            logging.error(msg)
+            return 0
+        try:
+            return int(out.split()[-1])
+        except (IndexError, ValueError):
+            logging.error(f'error submitting job to slurm {out}')
+            return 0
+    # -----------------------------------------------
+
+    async def _find_submitted(self, cmd):
+        """
+        Returns the id of a queued job running the given script, or None
+        """
+        try:
+            _, out, _ = await self._exec(
+                ['squeue', '-h', '-u', getpass.getuser(), '-o', '%i|%o'])
+        except (asyncio.TimeoutError, OSError, SlurmUnavailable):
+            return None
+        for line in out.split('\n'):
+            items = line.strip().split('|')
+            if len(items) == 2 and items[1] == cmd:
+                return items[0]
+        return None
+    # -----------------------------------------------
+
+    async def ashowjobs(self, jobids):
+        """
+        The asyncio version of showjobs, the squeue chunks are run concurrently,
+        then the sacct chunks for jobs that have left the queue
+        """
+        jobids = [str(x) for x in jobids if x]
+        job_infos = dict()
+        if not jobids:
+            return job_infos
+
+        chunks = [jobids[idx: idx + self.QUERY_CHUNK_SIZE]
+                  for idx in range(0, len(jobids), self.QUERY_CHUNK_SIZE)]
+        results = await asyncio.gather(*[
+            self._exec_with_retry(self._squeue_cmd(x), retry_on_error=False) for x in chunks])
+        for _, out, err in results:
+            job_infos.update(self._parse_squeue(out, err))
+
+        missing = [x for x in jobids if x not in job_infos]
+        chunks = [missing[idx: idx + self.QUERY_CHUNK_SIZE]
+                  for idx in range(0, len(missing), self.QUERY_CHUNK_SIZE)]
+        results = await asyncio.gather(*[
+            self._exec_with_retry(self._sacct_cmd(x), retry_on_error=False) for x in chunks],
+            return_exceptions=True)
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                # not every site has accounting turned on
+                logging.error(f'Unable to run sacct: {result}')
+                continue
+            _, out, err = result
+            job_infos.update(self._parse_sacct(out, err, chunk))
+        return job_infos
+    # -----------------------------------------------
+
+    async def acancel(self, job_id):
+        try:
+            returncode, _, err = await self._exec_with_retry(['scancel', str(job_id)])
+        except Exception as e:
+            logging.error(str(e))
+            return False
+        return returncode == 0
+    # -----------------------------------------------
+
+    def showjobs(self, jobids):
+        return asyncio.run(self.ashowjobs(jobids))
+    # -----------------------------------------------
+
+    def submit_and_poll(self, scripts, jobids):
+        """
+        Submit a list of run scripts concurrently, while looking up the state
+        of the given running jobs at the same time
+
+        Parameters:
+            scripts (list): the paths to the run scripts to submit
+            jobids (list): the ids of jobs to look up
+        Returns:
+            a list of the new job ids in the same order as the scripts (0 for
+            failed submissions), and the dict of job id to JobInfo for the jobids,
+            or None if the lookup failed
+        """
+        async def run():
+            submissions = asyncio.gather(*[self.abatch(x) for x in scripts])
+            return await asyncio.gather(
+                submissions, self.ashowjobs(jobids), return_exceptions=True)
+        new_ids, job_infos = asyncio.run(run())
+        if isinstance(job_infos, Exception):
+            logging.error(f'Unable to get job status: {job_infos}')
+            job_infos = None
+        return list(new_ids), job_infos
+    # -----------------------------------------------
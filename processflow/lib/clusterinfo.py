@@ -0,0 +1,163 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+import logging
+import time
+
+from processflow.lib.resources import Partition
+
+# partition, availability, node count, allocated/idle/other/total nodes,
+# allocated/idle/other/total cpus, cpus per node and memory per node
+SINFO_CMD = ['sinfo', '-h', '-o', '%P|%a|%D|%F|%C|%c|%m']
+
+
+class PartitionInfo(Partition):
+    """
+    A Partition along with how much of it is free right now, ResourcePool
+    admits jobs against the idle cores and nodes
+
+    Parameters:
+        idle_nodes (int): nodes with nothing running on them
+        idle_cores (int): cores with nothing running on them
+    """
+
+    def __init__(self, name, nodes, cores_per_node, memory_per_node,
+                 idle_nodes=0, idle_cores=0):
+        super(PartitionInfo, self).__init__(name, nodes, cores_per_node, memory_per_node)
+        self.idle_nodes = idle_nodes
+        self.idle_cores = idle_cores
+    # -----------------------------------------------
+
+
+def parse_sinfo(out):
+    """
+    Turn the output of SINFO_CMD into PartitionInfos
+
+    Partitions that arent up are left out, and so are nodes that are down or
+    drained. Heterogeneous node groups show up as their own lines, they are
+    added together and the smallest node in the partition is used for its size
+
+    Returns:
+        a dict of partition name to PartitionInfo, and the name of the default
+        partition (None if sinfo doesnt mark one)
+    """
+    partitions = dict()
+    default = None
+    for line in out.split('\n'):
+        items = line.strip().split('|')
+        if len(items) != 7 or items[1] != 'up':
+            continue
+        name = items[0]
+        if name.endswith('*'):
+            name = name[:-1]
+            default = name
+        try:
+            allocated_nodes, idle_nodes, _, _ = [int(x) for x in items[3].split('/')]
+            _, idle_cores, _, _ = [int(x) for x in items[4].split('/')]
+            cores = int(items[5].rstrip('+'))
+            memory = int(items[6].rstrip('+'))
+        except ValueError:
+            continue
+        partition = partitions.get(name)
+        if partition is None:
+            partitions[name] = PartitionInfo(
+                name=name,
+                nodes=allocated_nodes + idle_nodes,
+                cores_per_node=cores,
+                memory_per_node=memory,
+                idle_nodes=idle_nodes,
+                idle_cores=idle_cores)
+        else:
+            partition.nodes += allocated_nodes + idle_nodes
+            partition.idle_nodes += idle_nodes
+            partition.idle_cores += idle_cores
+            partition.cores_per_node = min(partition.cores_per_node, cores)
+            partition.memory_per_node = min(partition.memory_per_node, memory)
+    return partitions, default
+# -----------------------------------------------
+
+
+class ClusterInfo(object):
+    """
+    A cached view of the partitions of the cluster and how busy they are
+
+    The cluster is looked up with a single sinfo call, and the answer is
+    reused until it is ttl seconds old. If sinfo fails the last good answer
+    is kept and it is tried again once the ttl is up.
+
+    Parameters:
+        run (function): runs a command and returns its stdout, or None if it failed
+        ttl (float): how many seconds an answer from sinfo is good for
+        clock (function): returns the current time in seconds, for tests
+    """
+
+    def __init__(self, run, ttl=60, clock=time.monotonic):
+        self._run = run
+        self.ttl = float(ttl)
+        self._clock = clock
+        self._partitions = dict()
+        self._default = None
+        self._checked = None
+    # -----------------------------------------------
+
+    def refresh(self, force=False):
+        """
+        Look the cluster up again if the cached answer is too old
+
+        Returns:
+            True if there is a new answer from sinfo
+        """
+        now = self._clock()
+        if not force and self._checked is not None and now - self._checked < self.ttl:
+            return False
+        self._checked = now
+        out = self._run(SINFO_CMD)
+        if not out:
+            logging.error('Unable to look up the cluster partitions, using the last known sizes')
+            return False
+        partitions, default = parse_sinfo(out)
+        if not partitions:
+            return False
+        self._partitions, self._default = partitions, default
+        return True
+    # -----------------------------------------------
+
+    @property
+    def partitions(self):
+        self.refresh()
+        return list(self._partitions.values())
+    # -----------------------------------------------
+
+    @property
+    def default_partition(self):
+        self.refresh()
+        return self._default
+    # -----------------------------------------------
+
+    def partition(self, name=None):
+        """
+        Returns the PartitionInfo with the given name, or the default partition, None if its not known
+        """
+        self.refresh()
+        return self._partitions.get(name or self._default)
+    # -----------------------------------------------
+
+    @property
+    def nodes(self):
+        """
+        The usable nodes of the default partition, or of the largest partition
+        if there isnt a default, 0 if the cluster hasnt been looked up yet
+        """
+        partition = self.partition()
+        if partition is None:
+            return max([x.nodes for x in self._partitions.values()] or [0])
+        return partition.nodes
+    # -----------------------------------------------
+
+    @property
+    def idle_nodes(self):
+        """
+        The idle nodes of the default partition, what RunManager sizes the
+        number of jobs by when it isnt given a limit
+        """
+        partition = self.partition()
+        return partition.idle_nodes if partition is not None else 0
+    # -----------------------------------------------
@@ -0,0 +1,133 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+from bisect import bisect_left, bisect_right, insort
+
+
+class Coverage(object):
+    """
+    The files known for one case and data type, indexed by year
+
+    Keeps a sorted array of the years that have files and a sorted array of the
+    years that have files that arent present, so checking if a year range is
+    covered is a pair of binary searches instead of a walk over the files.
+    """
+
+    def __init__(self):
+        # path -> [year, month, present]
+        self._files = dict()
+        # year -> {path: month}, in the order the files were added
+        self._by_year = dict()
+        self._years = list()
+        # year -> number of files in that year that arent present
+        self._missing = dict()
+        self._missing_years = list()
+    # -----------------------------------------------
+
+    def __len__(self):
+        return len(self._files)
+    # -----------------------------------------------
+
+    def add(self, path, year, month, present):
+        """
+        Add a file, if the path is already known only its status is updated
+        """
+        if path in self._files:
+            self.set_present(path, present)
+            return
+        self._files[path] = [year, month, present]
+        if year not in self._by_year:
+            self._by_year[year] = dict()
+            insort(self._years, year)
+        self._by_year[year][path] = month
+        if not present:
+            self._add_missing(year, 1)
+    # -----------------------------------------------
+
+    def set_present(self, path, present):
+        """
+        Update the status of a known file
+        """
+        info = self._files.get(path)
+        if info is None or info[2] == present:
+            return
+        info[2] = present
+        self._add_missing(info[0], -1 if present else 1)
+    # -----------------------------------------------
+
+    def _add_missing(self, year, count):
+        before = self._missing.get(year, 0)
+        after = before + count
+        if after:
+            self._missing[year] = after
+        else:
+            del self._missing[year]
+        if not before and after:
+            insort(self._missing_years, year)
+        elif before and not after:
+            del self._missing_years[bisect_left(self._missing_years, year)]
+    # -----------------------------------------------
+
+    def ready(self, start_year=None, end_year=None):
+        """
+        Returns True if there are files in the range and all of them are present,
+        without a range every file is checked
+        """
+        if start_year is None or end_year is None:
+            return bool(self._files) and not self._missing_years
+        if bisect_left(self._years, start_year) == bisect_right(self._years, end_year):
+            return False
+        return (bisect_left(self._missing_years, start_year) ==
+                bisect_right(self._missing_years, end_year))
+    # -----------------------------------------------
+
+    def paths(self, start_year=None, end_year=None, match_month=False):
+        """
+        Return the paths of the present files
+
+        Parameters:
+            start_year (int): the first year to return files for
+            end_year (int): the last year to return files for
+            match_month (bool): derived products store their start year as the year
+                and their end year as the month, match on those instead of a range
+        """
+        if start_year is None or end_year is None:
+            return [path for path, info in self._files.items() if info[2]]
+        if match_month:
+            return [path for path, month in self._by_year.get(start_year, {}).items()
+                    if month == end_year and self._files[path][2]]
+        paths = list()
+        lo = bisect_left(self._years, start_year)
+        hi = bisect_right(self._years, end_year)
+        for year in self._years[lo:hi]:
+            paths.extend(path for path in self._by_year[year] if self._files[path][2])
+        return paths
+    # -----------------------------------------------
+
+
+class CoverageIndex(object):
+    """
+    A Coverage for every (case, data type) in the file catalog
+    """
+
+    def __init__(self):
+        self._coverage = dict()
+    # -----------------------------------------------
+
+    def get(self, case, datatype):
+        """
+        Returns the Coverage for the case and data type, or None if there are no files for it
+        """
+        return self._coverage.get((case, datatype))
+    # -----------------------------------------------
+
+    def add(self, case, datatype, path, year, month, present):
+        key = (case, datatype)
+        if key not in self._coverage:
+            self._coverage[key] = Coverage()
+        self._coverage[key].add(path, year, month, present)
+    # -----------------------------------------------
+
+    def set_present(self, case, datatype, path, present):
+        coverage = self._coverage.get((case, datatype))
+        if coverage is not None:
+            coverage.set_present(path, present)
+    # -----------------------------------------------
@@ -1,16 +1,66 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
+import hashlib
+import json
 import logging
 import os
 import threading
 from tqdm import tqdm
 
+from concurrent.futures import ThreadPoolExecutor
 from threading import Thread
 from enum import IntEnum
 
-from .models import DataFile
+from .coverage import CoverageIndex
+from .models import DataFile, CatalogState
 from processflow.lib.util import print_debug, print_line
 
 
+# bump this when the catalog tables or the way rows are generated changes,
+# catalogs written with a different version are thrown out and rebuilt
+CATALOG_VERSION = '1'
+
+# the DataFile columns, in the order _bulk_insert writes them
+BULK_INSERT_COLUMNS = ('case', 'name', 'local_path', 'local_status', 'year',
+                       'month', 'datatype', 'super_type', 'local_size')
+
+# how many directories file_status_check lists at once
+SCAN_WORKERS = 8
+# how many missing files to print to the console, the rest go to the log
+MAX_MISSING_PRINTED = 20
+
+
+def _scan_directory(directory, expected):
+    """
+    List a directory with a single scandir call
+
+    Only the expected files are looked at, and only the ones the catalog
+    doesnt already have a size for are stat-ed, the rest of a large
+    archive directory costs nothing past the listing itself
+
+    Parameters:
+        directory (str): the directory to list
+        expected (dict): filename to the size the catalog has for it, or None to stat it
+    Returns:
+        a dict of filename to size for the expected files in the directory,
+        empty if the directory doesnt exist
+    """
+    listing = dict()
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name not in expected:
+                    continue
+                try:
+                    if entry.is_file():
+                        size = expected[entry.name]
+                        listing[entry.name] = size if size is not None else entry.stat().st_size
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return listing
+
+
 class FileStatus(IntEnum):
     PRESENT = 0
     NOT_PRESENT = 1
@@ -31,15 +81,63 @@ class FileManager(object):
         """
         self._db_path = database
         self._config = config
-
-        if os.path.exists(database):
-            os.remove(database)
+        # derived data types registered through add_files during this run
+        self._derived_types = set()
+        # in memory year coverage of the catalog, loaded on first use
+        self._coverage = None
 
         DataFile._meta.database.init(database)
-        if DataFile.table_exists():
-            DataFile.drop_table()
+        self._open_catalog()
+    # -----------------------------------------------
 
-        DataFile.create_table()
+    def _open_catalog(self):
+        """
+        Open the file catalog left behind by a previous run, or create a new one
+        if there isnt one or it was written by an incompatible version
+        """
+        db = DataFile._meta.database
+        db.create_tables([DataFile, CatalogState], safe=True)
+        version = self._get_state('catalog_version')
+        if version == CATALOG_VERSION:
+            return
+        if version is not None:
+            msg = 'File catalog was written by a different version of processflow, rebuilding'
+            print_line(msg)
+        db.drop_tables([DataFile, CatalogState])
+        db.create_tables([DataFile, CatalogState])
+        self._set_state('catalog_version', CATALOG_VERSION)
+    # -----------------------------------------------
+
+    def _get_state(self, key):
+        try:
+            return CatalogState.get(CatalogState.key == key).value
+        except CatalogState.DoesNotExist:
+            return None
+    # -----------------------------------------------
+
+    def _set_state(self, key, value):
+        CatalogState.insert(key=key, value=value).on_conflict_replace().execute()
+    # -----------------------------------------------
+
+    def _bulk_insert(self, new_files):
+        """
+        Insert DataFile rows with a single prepared statement, skipping any
+        that are already in the table
+
+        Parameters:
+            new_files (list): a list of dicts with a value for every DataFile column
+        """
+        if not new_files:
+            return
+        columns = BULK_INSERT_COLUMNS
+        sql = 'INSERT OR IGNORE INTO "{table}" ({columns}) VALUES ({values})'.format(
+            table=DataFile._meta.table_name,
+            columns=', '.join(f'"{x}"' for x in columns),
+            values=', '.join('?' for _ in columns))
+        database = DataFile._meta.database
+        with database.atomic():
+            database.cursor().executemany(
+                sql, [tuple(item[x] for x in columns) for item in new_files])
     # -----------------------------------------------
 
     def __str__(self):
@@ -53,6 +151,8 @@ class FileManager(object):
         """
         Write out a human readable version of the database for debug purposes
         """
+        # jobs register the config definitions of their output types after adding the files
+        self._save_derived_types()
         file_list_path = os.path.join(
             self._config['global']['project_path'],
             'output',
@@ -68,61 +168,78 @@ class FileManager(object):
                     q = (DataFile
                          .select(DataFile.datatype)
                          .where(DataFile.case == case)
-                         .distinct())
-                    for df_type in q.execute():
-                        _type = df_type.datatype
+                         .distinct()
+                         .tuples())
+                    for _type, in q.execute():
                         fp.write('===================================\n')
                         fp.write('\t' + _type + ':\n')
                         datafiles = (DataFile
-                                     .select()
+                                     .select(DataFile.name, DataFile.local_status, DataFile.local_size,
+                                             DataFile.local_path, DataFile.year, DataFile.month)
                                      .where(
                                             (DataFile.datatype == _type) &
-                                            (DataFile.case == case)))
-                        for datafile in datafiles.execute():
+                                            (DataFile.case == case))
+                                     .tuples())
+                        for name, local_status, local_size, local_path, year, month in datafiles.iterator():
                             filestr = '-------------------------------------'
-                            filestr += '\n\t     name: ' + datafile.name + '\n\t     local_status: '
-                            if datafile.local_status == 0:
+                            filestr += '\n\t     name: ' + name + '\n\t     local_status: '
+                            if local_status == 0:
                                 filestr += ' present, '
                             else:
                                 filestr += ' missing, '
 
                             filestr += '\n\t     local_size: ' + \
-                                str(datafile.local_size)
-                            filestr += '\n\t     local_path: ' + datafile.local_path
-                            filestr += '\n\t     year: ' + str(datafile.year)
+                                str(local_size)
+                            filestr += '\n\t     local_path: ' + local_path
+                            filestr += '\n\t     year: ' + str(year)
                             filestr += '\n\t     month: ' + \
-                                str(datafile.month) + '\n'
+                                str(month) + '\n'
                             fp.write(filestr)
             except Exception as e:
                 print_debug(e)
     # -----------------------------------------------
 
+    @property
+    def derived_types(self):
+        """
+        The data types jobs have added to the config, in this run or an earlier one
+        """
+        return sorted(self._derived_types)
+    # -----------------------------------------------
+
+    @property
+    def coverage(self):
+        """
+        The in memory CoverageIndex of the catalog, the database is only read
+        the first time its needed and after the catalog is rebuilt
+        """
+        if self._coverage is None:
+            self._coverage = CoverageIndex()
+            query = (DataFile
+                     .select(DataFile.case, DataFile.datatype, DataFile.local_path,
+                             DataFile.year, DataFile.month, DataFile.local_status)
+                     .tuples())
+            for case, datatype, local_path, year, month, local_status in query.iterator():
+                self._coverage.add(
+                    case, datatype, local_path, year, month,
+                    local_status == FileStatus.PRESENT.value)
+        return self._coverage
+    # -----------------------------------------------
+
     def check_data_ready(self, data_required, case, start_year=None, end_year=None):
         try:
             for datatype in data_required:
                 if not self._config['data_types'].get(datatype):
                     return False
+                coverage = self.coverage.get(case, datatype)
+                if coverage is None:
+                    return False
                 monthly = self._config['data_types'][datatype].get('monthly')
                 if start_year and end_year and monthly:
-                    q = (DataFile
-                         .select()
-                         .where(
-                                (DataFile.year >= start_year) &
-                                (DataFile.year <= end_year) &
-                                (DataFile.case == case) &
-                                (DataFile.datatype == datatype)))
-                else:
-                    q = (DataFile
-                         .select()
-                         .where(
-                                (DataFile.case == case) &
-                                (DataFile.datatype == datatype)))
-                datafiles = q.execute()
-                if not datafiles:
-                    return False
-                for df in datafiles:
-                    if df.local_status != FileStatus.PRESENT.value:
+                    if not coverage.ready(start_year, end_year):
                         return False
+                elif not coverage.ready():
+                    return False
             return True
         except Exception as e:
             print_debug(e)
@@ -169,93 +286,231 @@ class FileManager(object):
         return instring
     # -----------------------------------------------
 
+    def _case_data_types(self, case):
+        """
+        Returns the list of raw data types for a case, expanding 'all' into
+        every data type defined in the config
+        """
+        data_types = self._config['simulations'][case]['data_types']
+        if not isinstance(data_types, list):
+            data_types = [data_types]
+        if 'all' in data_types:
+            return [x for x in self._config['data_types'] if x not in self._derived_types_in_config()]
+        for _type in data_types:
+            # if the type isnt defined in the config, throw an exception
+            if _type not in self._config['data_types']:
+                raise ValueError(f'{_type} from case {case} is not defined as a valid data type')
+        return data_types
+    # -----------------------------------------------
+
+    def _derived_types_in_config(self):
+        """
+        Returns the names of data types that were added to the config by jobs
+        rather than defined by the user
+        """
+        return [x for x in self._config['data_types'] if self._get_state(f'derived:{x}') is not None or x in self._derived_types]
+    # -----------------------------------------------
+
+    def _is_monthly(self, data_type):
+        return self._config['data_types'][data_type].get('monthly') in [True, 'True', 'true', '1', 1]
+    # -----------------------------------------------
+
+    def _type_signature(self, case, data_type):
+        """
+        Returns a hash of everything that goes into the paths of the files
+        for the given case and data type, other than the years
+        """
+        type_info = self._config['data_types'][data_type]
+        case_info = self._config['simulations'][case]
+        signature = {
+            'project_path': self._config['global']['project_path'],
+            'case': case,
+            'local_path': case_info.get('local_path', ''),
+            'type_info': type_info,
+        }
+        if type_info.get(case):
+            # case specific overrides can pull in any of the case options
+            signature['case_info'] = case_info
+        return hashlib.sha256(
+            json.dumps(signature, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    # -----------------------------------------------
+
+    def _expected_files(self, case, data_type, years=None):
+        """
+        Returns the DataFile rows the given case and data type should have
+
+        Parameters:
+            case (str): the case name
+            data_type (str): the data type
+            years (iterable): the years to generate rows for, only used for monthly data
+        """
+        local_root = self.render_file_string(
+            data_type=data_type,
+            data_type_option='local_path',
+            case=case)
+
+        new_files = list()
+        if self._is_monthly(data_type):
+            # handle monthly data
+            for year in years:
+                for month in range(1, 13):
+                    filename = self.render_file_string(
+                        data_type=data_type,
+                        data_type_option='file_format',
+                        case=case,
+                        year=year,
+                        month=month)
+                    new_files.append({
+                        'name': filename,
+                        'local_path': os.path.join(local_root, filename),
+                        'local_status': FileStatus.PRESENT.value,
+                        'case': case,
+                        'year': year,
+                        'month': month,
+                        'datatype': data_type,
+                        'super_type': 'raw_output',
+                        'local_size': 0
+                    })
+        else:
+            # handle one-off data
+            filename = self.render_file_string(
+                data_type=data_type,
+                data_type_option='file_format',
+                case=case)
+            local_path = os.path.join(local_root, filename)
+            if not os.path.exists(local_path):
+                raise ValueError(f'File {local_path} not found for case {case}')
+            new_files.append({
+                'name': filename,
+                'local_path': local_path,
+                'local_status': FileStatus.PRESENT.value,
+                'case': case,
+                'year': 0,
+                'month': 0,
+                'datatype': data_type,
+                'super_type': 'raw_output',
+                'local_size': 0
+            })
+        return new_files
+    # -----------------------------------------------
+
     def populate_file_list(self):
         """
         Populate the database with the required DataFile entries
+
+        The catalog is kept between runs. If nothing about the cases, data types
+        or years has changed since the last run its reused as is, otherwise only
+        the differences are applied: data types whose paths changed are rebuilt,
+        new cases and years are added, and anything no longer in the config is removed.
+        Derived data types registered by jobs in earlier runs are restored into the config.
         """
-        msg = 'Creating file table'
+        msg = 'Updating file table'
         print_line(msg)
 
         start_year = int(self._config['simulations']['start_year'])
         end_year = int(self._config['simulations']['end_year'])
-        with DataFile._meta.database.atomic():
-            # for each case
-            new_files = list()
-            for case in self._config['simulations']:
-                if case in ['start_year', 'end_year']:
-                    continue
 
-                # for each data type included in this case
-                for _type in self._config['simulations'][case]['data_types']:
+        signatures = dict()
+        for case in self._config['simulations']:
+            if case in ['start_year', 'end_year']:
+                continue
+            for _type in self._case_data_types(case):
+                signatures[(case, _type)] = self._type_signature(case, _type)
+
+        config_hash = hashlib.sha256(json.dumps({
+            'start_year': start_year,
+            'end_year': end_year,
+            'signatures': sorted('{}:{}:{}'.format(case, _type, sig) for (case, _type), sig in signatures.items())
+        }).encode('utf-8')).hexdigest()
+
+        if self._get_state('config_hash') == config_hash:
+            msg = 'File table is up to date with the config, reusing it'
+            print_line(msg)
+            self._restore_derived_types()
+            return
 
-                    # if the type isnt defined in the config, throw an exception
-                    if _type not in self._config['data_types'] and _type != 'all':
-                        raise ValueError(f'{_type} from case {case} is not defined as a valid data type')                    
-                    elif _type == 'all':
-                        pass
-                    else:
-                        msg = f'Checking files for data type: {_type} for case: {case}'
+        new_files = list()
+        with DataFile._meta.database.atomic():
+            for (case, _type), signature in signatures.items():
+                monthly = self._is_monthly(_type)
+                state_key = f'signature:{case}:{_type}'
+                type_rows = ((DataFile.case == case) &
+                             (DataFile.datatype == _type) &
+                             (DataFile.super_type == 'raw_output'))
+
+                if self._get_state(state_key) != signature:
+                    # new case or data type, or its paths changed, so start over
+                    msg = f'Adding files for data type: {_type} for case: {case}'
+                    print_line(msg, 'ok')
+                    DataFile.delete().where(type_rows).execute()
+                    new_files.extend(self._expected_files(
+                        case, _type, range(start_year, end_year + 1)))
+                elif monthly:
+                    # only add or remove the years that changed
+                    wanted = set(range(start_year, end_year + 1))
+                    have = set(x for x, in DataFile.select(DataFile.year).where(type_rows).distinct().tuples())
+                    stale = have - wanted
+                    if stale:
+                        DataFile.delete().where(type_rows & DataFile.year.in_(list(stale))).execute()
+                    missing = sorted(wanted - have)
+                    if missing:
+                        msg = f'Adding {len(missing)} years for data type: {_type} for case: {case}'
                         print_line(msg, 'ok')
+                        new_files.extend(self._expected_files(case, _type, missing))
+                self._set_state(state_key, signature)
 
-                    # setup the base local_path
-                    local_root = self.render_file_string(
-                        data_type=_type,
-                        data_type_option='local_path',
-                        case=case)
-
-                    
-                    if self._config['data_types'][_type].get('monthly') and self._config['data_types'][_type]['monthly'] in ['True', 'true', '1', 1]:
-                        # handle monthly data
-                        for year in range(start_year, end_year + 1):
-                            for month in range(1, 13):
-                                filename = self.render_file_string(
-                                    data_type=_type,
-                                    data_type_option='file_format',
-                                    case=case,
-                                    year=year,
-                                    month=month)
-                                
-                                local_path = os.path.join(local_root, filename)
-                                new_files.append({
-                                    'name': filename,
-                                    'local_path': local_path,
-                                    'local_status': FileStatus.PRESENT.value,
-                                    'case': case,
-                                    'year': year,
-                                    'month': month,
-                                    'datatype': _type,
-                                    'super_type': 'raw_output',
-                                    'local_size': 0
-                                })
-                    else:
-                        # handle one-off data
-                        filename = self.render_file_string(
-                            data_type=_type,
-                            data_type_option='file_format',
-                            case=case)
-                        local_path = os.path.join(local_root, filename)
-                        if not os.path.exists(local_path):
-                            raise ValueError(f'File {local_path} not found for case {case}')
-                        new_files.append({
-                            'name': filename,
-                            'local_path': os.path.join(local_path, filename),
-                            'local_status': FileStatus.PRESENT.value,
-                            'case': case,
-                            'year': 0,
-                            'month': 0,
-                            'datatype': _type,
-                            'super_type': 'raw_output',
-                            'local_size': 0
-                        })
-
-            step = 500
-            for idx in range(0, len(new_files), step):
-                with DataFile._meta.database.atomic():
-                    DataFile.insert_many(
-                        new_files[idx: idx + step]).execute()
-
-            msg = 'Database initialization complete'
-            print_line(msg)
+            # remove anything thats no longer in the config
+            cases = set(x for x, _ in signatures)
+            query = (DataFile
+                     .select(DataFile.case, DataFile.datatype)
+                     .where(DataFile.super_type == 'raw_output')
+                     .distinct()
+                     .tuples())
+            for case, _type in list(query):
+                if (case, _type) not in signatures:
+                    msg = f'Removing data type: {_type} for case: {case} from the file table'
+                    print_line(msg, 'ok')
+                    DataFile.delete().where(
+                        (DataFile.case == case) & (DataFile.datatype == _type)).execute()
+                    CatalogState.delete().where(
+                        CatalogState.key == f'signature:{case}:{_type}').execute()
+            DataFile.delete().where(DataFile.case.not_in(list(cases))).execute()
+
+            self._bulk_insert(new_files)
+
+            self._set_state('config_hash', config_hash)
+        self._coverage = None
+
+        self._restore_derived_types()
+        msg = 'Database initialization complete'
+        print_line(msg)
+    # -----------------------------------------------
+
+    def _restore_derived_types(self):
+        """
+        Put the definitions of data types produced by jobs in previous runs back
+        into the config, so jobs that depend on them dont have to wait for
+        the producing job to be re-validated
+        """
+        query = CatalogState.select().where(CatalogState.key.startswith('derived:'))
+        for state in query:
+            data_type = state.key[len('derived:'):]
+            if data_type not in self._config['data_types']:
+                self._config['data_types'][data_type] = json.loads(state.value)
+            self._derived_types.add(data_type)
+    # -----------------------------------------------
+
+    def _save_derived_types(self):
+        """
+        Remember the config definitions of the derived data types registered so far
+        """
+        for data_type in self._derived_types:
+            definition = self._config['data_types'].get(data_type)
+            if definition is None:
+                continue
+            self._set_state(
+                f'derived:{data_type}',
+                json.dumps(dict(definition), sort_keys=True, default=str))
     # -----------------------------------------------
 
     def print_db(self):
@@ -295,43 +550,129 @@ class FileManager(object):
                     'month': file.get('month', 0),
                     'local_size': 0,
                 })
-            step = 500
-            for idx in range(0, len(new_files), step):
-                with DataFile._meta.database.atomic():
-                    DataFile.insert_many(
-                        new_files[idx: idx + step]).execute()
+            # files registered by an earlier run are already in the table
+            self._bulk_insert(new_files)
+            if self._coverage is not None:
+                for item in new_files:
+                    self._coverage.add(
+                        item['case'], data_type, item['local_path'], item['year'], item['month'],
+                        item['local_status'] == FileStatus.PRESENT.value)
+            if super_type == 'derived':
+                self._derived_types.add(data_type)
+                self._save_derived_types()
         except Exception as e:
             print_debug(e)
     # -----------------------------------------------
 
-    def file_status_check(self):
+    def file_status_check(self, max_workers=SCAN_WORKERS):
         """
-        Update the database with the local status of the expected files
+        Update the database with the local status and size of the expected files
 
+        Instead of stat-ing every file, the expected files are grouped by directory
+        and each directory is listed once with scandir, the listings run on a thread pool.
+        Files the catalog already has as present with a size are only looked for
+        in the listing, the rest are stat-ed for their size.
+        Files that are missing are marked NOT_PRESENT and listed. Outputs of jobs
+        from earlier runs that have gone missing are dropped from the table instead,
+        so they dont hold up startup and the job that made them runs again.
+
+        Parameters:
+            max_workers (int): the number of directories to scan at once
         Return True if there was new local data found, False othewise
         """
-        # try:
+        table = DataFile._meta.table_name
+        by_directory = dict()
         query = (DataFile
-                    .select()
-                    .where(DataFile.local_status == FileStatus.PRESENT.value))
-        to_update = list()
-
-        for datafile in tqdm(query.execute(), desc="Checking local files"):
-            if not os.path.exists(datafile.local_path):
-                raise ValueError(f'File {datafile.local_path} not found')
-            
+                 .select(DataFile.id, DataFile.local_path, DataFile.local_status,
+                         DataFile.local_size, DataFile.case, DataFile.datatype,
+                         DataFile.super_type)
+                 .tuples())
+        keys = dict()
+        for row_id, local_path, local_status, local_size, case, datatype, super_type in query.iterator():
+            directory, name = os.path.split(local_path)
+            by_directory.setdefault(directory, list()).append(
+                (row_id, name, local_status, local_size, super_type))
+            keys[row_id] = (case, datatype, local_path)
+
+        sizes = list()
+        for expected in by_directory.values():
+            sizes.append({
+                name: local_size if local_status == FileStatus.PRESENT.value and local_size else None
+                for _, name, local_status, local_size, _ in expected
+            })
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            listings = dict(zip(
+                by_directory.keys(),
+                tqdm(pool.map(_scan_directory, by_directory.keys(), sizes),
+                     total=len(by_directory),
+                     desc="Checking local files")))
+
+        updates = list()
+        missing = list()
+        dropped = list()
+        new_data = False
+        for directory, expected in by_directory.items():
+            listing = listings[directory]
+            for row_id, name, local_status, local_size, super_type in expected:
+                size = listing.get(name)
+                if size is None and super_type == 'derived':
+                    dropped.append((row_id,))
+                    continue
+                if size is None:
+                    missing.append(os.path.join(directory, name))
+                    if local_status != FileStatus.NOT_PRESENT.value:
+                        updates.append((FileStatus.NOT_PRESENT.value, local_size, row_id))
+                    continue
+                if local_status != FileStatus.PRESENT.value:
+                    new_data = True
+                if local_status != FileStatus.PRESENT.value or local_size != size:
+                    updates.append((FileStatus.PRESENT.value, size, row_id))
+
+        if updates:
+            database = DataFile._meta.database
+            with database.atomic():
+                database.cursor().executemany(
+                    f'UPDATE "{table}" SET "local_status" = ?, "local_size" = ? WHERE "id" = ?',
+                    updates)
+            if self._coverage is not None:
+                for local_status, _, row_id in updates:
+                    self._coverage.set_present(
+                        *keys[row_id], local_status == FileStatus.PRESENT.value)
+
+        if dropped:
+            database = DataFile._meta.database
+            with database.atomic():
+                database.cursor().executemany(
+                    f'DELETE FROM "{table}" WHERE "id" = ?', dropped)
+            # the index has no way to forget files, its rebuilt the next time its used
+            self._coverage = None
+            msg = f'{len(dropped)} job outputs from an earlier run are gone, the jobs that made them will run again'
+            print_line(msg)
+            logging.info(msg)
+
+        if missing:
+            msg = f'{len(missing)} expected files were not found'
+            print_line(msg, status='err')
+            missing.sort()
+            for path in missing[:MAX_MISSING_PRINTED]:
+                print_line(f'    {path}', status='err')
+            if len(missing) > MAX_MISSING_PRINTED:
+                print_line(f'    ... see the log for the full list', status='err')
+                logging.info('Missing files:\n' + '\n'.join(missing[MAX_MISSING_PRINTED:]))
+        return new_data
     # -----------------------------------------------
 
     def all_data_local(self):
         """
-        Returns True if all data is local, False otherwise
+        Returns True if all the model output is local, False otherwise. Job
+        outputs arent checked, the jobs that make them can run again
         """
         try:
             query = (DataFile
-                     .select()
-                     .where(DataFile.local_status == FileStatus.NOT_PRESENT.value))
-            missing_data = query.execute()
-            if missing_data:
+                     .select(DataFile.id)
+                     .where((DataFile.local_status == FileStatus.NOT_PRESENT.value) &
+                            (DataFile.super_type == 'raw_output')))
+            if query.exists():
                 return False
         except Exception as e:
             print_debug(e)
@@ -351,36 +692,18 @@ class FileManager(object):
             end_year (int): the last year to return data for
         """
         try:
+            coverage = self.coverage.get(case, datatype)
+            if coverage is None:
+                return None
             if start_year and end_year:
-                if datatype in ['climo_regrid', 'climo_native', 'ts_regrid', 'ts_native']:
-                    query = (DataFile
-                             .select()
-                             .where(
-                                 (DataFile.month == end_year) &
-                                 (DataFile.year == start_year) &
-                                 (DataFile.case == case) &
-                                 (DataFile.datatype == datatype) &
-                                 (DataFile.local_status == FileStatus.PRESENT.value)))
-                else:
-                    query = (DataFile
-                             .select()
-                             .where(
-                                 (DataFile.year <= end_year) &
-                                 (DataFile.year >= start_year) &
-                                 (DataFile.case == case) &
-                                 (DataFile.datatype == datatype) &
-                                 (DataFile.local_status == FileStatus.PRESENT.value)))
+                paths = coverage.paths(
+                    start_year, end_year,
+                    match_month=datatype in ['climo_regrid', 'climo_native', 'ts_regrid', 'ts_native'])
             else:
-                query = (DataFile
-                         .select()
-                         .where(
-                                (DataFile.case == case) &
-                                (DataFile.datatype == datatype) &
-                                (DataFile.local_status == FileStatus.PRESENT.value)))
-            datafiles = query.execute()
-            if datafiles is None or len(datafiles) == 0:
+                paths = coverage.paths()
+            if not paths:
                 return None
-            return [x.local_path for x in datafiles]
+            return paths
         except Exception as e:
             print_debug(e)
     # -----------------------------------------------
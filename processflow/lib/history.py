@@ -0,0 +1,191 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+import logging
+import math
+import os
+import time
+
+from processflow.lib.models import JobRuntime
+
+# the fewest finished jobs of a kind needed before their walltime is predicted
+MIN_SAMPLES = 3
+# how many of the most recent finished jobs of a kind the prediction looks at
+MAX_SAMPLES = 50
+
+
+def parse_elapsed(value):
+    """
+    Parse a slurm elapsed time or time limit into seconds, returns None if it
+    cant be parsed. Without days its MM, MM:SS or HH:MM:SS, with days its
+    D-HH, D-HH:MM or D-HH:MM:SS, like the time limits format_walltime writes
+    """
+    if not value:
+        return None
+    value = str(value).strip()
+    days = None
+    if '-' in value:
+        days, value = value.split('-', 1)
+    try:
+        parts = [int(float(x)) for x in value.split(':')]
+        days = int(days) if days is not None else None
+    except ValueError:
+        return None
+    if len(parts) > 3:
+        return None
+    if days is not None:
+        # after the days the first part is always hours
+        parts += [0] * (3 - len(parts))
+    elif len(parts) == 1:
+        # a bare number is minutes
+        parts.append(0)
+    seconds = 0
+    for part in parts:
+        seconds = seconds * 60 + part
+    return (days or 0) * 86400 + seconds
+# -----------------------------------------------
+
+
+def format_walltime(minutes):
+    """
+    Format a number of minutes as a slurm D-HH:MM time limit
+    """
+    minutes = int(math.ceil(minutes))
+    return f'{minutes // 1440}-{(minutes % 1440) // 60:02d}:{minutes % 60:02d}'
+# -----------------------------------------------
+
+
+class RuntimeHistory(object):
+    """
+    A persistent record of how long each finished job took, and walltime
+    predictions made from it
+
+    Jobs are grouped by job type, run type and the native grid of their case.
+    The prediction takes the per simulated year runtime of recent jobs of the
+    same kind, uses a high percentile of it so most jobs finish in time, scales
+    it to the number of years of the new job, then adds a safety margin and a
+    fixed amount of padding. A job that timed out counts as having needed twice
+    its walltime, so the next prediction grows.
+
+    Parameters:
+        database (str): path to the sqlite file to keep the history in
+        config (dict): the global config, used to look up the grid of each case
+        margin (float): what to multiply the predicted runtime by
+        padding (float): minutes to add to every prediction
+        percentile (float): which percentile of the per year runtime to use, 0 to 1
+        min_walltime (float): the shortest walltime to ask for, in minutes
+        max_walltime (float): the longest walltime to ask for, in minutes
+    """
+
+    def __init__(self, database, config, margin=1.5, padding=5, percentile=0.9,
+                 min_walltime=10, max_walltime=24 * 60):
+        self._config = config
+        self.margin = float(margin)
+        self.padding = float(padding)
+        self.percentile = float(percentile)
+        self.min_walltime = float(min_walltime)
+        self.max_walltime = float(max_walltime)
+        # kind -> per year runtimes in seconds, newest first
+        self._rates = dict()
+
+        JobRuntime._meta.database.init(database)
+        JobRuntime._meta.database.create_tables([JobRuntime], safe=True)
+    # -----------------------------------------------
+
+    def kind(self, job):
+        """
+        The job type, run type and grid that jobs are grouped by
+        """
+        grid = self._config['simulations'].get(job.case, {}).get('native_grid_name', '')
+        return job.job_type, job.run_type or '', grid
+    # -----------------------------------------------
+
+    @staticmethod
+    def years(job):
+        return max(1, int(job.end_year) - int(job.start_year) + 1)
+    # -----------------------------------------------
+
+    @staticmethod
+    def input_bytes(job):
+        """
+        The total size of the jobs input files
+        """
+        total = 0
+        for path in job._input_file_paths:
+            try:
+                total += os.stat(path).st_size
+            except OSError:
+                continue
+        return total
+    # -----------------------------------------------
+
+    def record(self, job, runtime, state, queue_wait=None, walltime=None):
+        """
+        Add a finished job to the history
+
+        Parameters:
+            job (Job): the finished job
+            runtime (float): how many seconds the job ran for
+            state (str): the final state of the job, e.g. COMPLETED or TIMEOUT
+            queue_wait (float): how many seconds the job waited in the queue
+            walltime (float): the walltime the job asked for, in seconds
+        """
+        job_type, run_type, grid = self.kind(job)
+        try:
+            JobRuntime.create(
+                job_type=job_type,
+                run_type=run_type,
+                grid=grid,
+                case=job.case,
+                years=self.years(job),
+                input_bytes=self.input_bytes(job),
+                runtime=float(runtime),
+                queue_wait=queue_wait,
+                walltime=walltime,
+                state=state,
+                finished=time.time())
+        except Exception as e:
+            # losing a history record only makes the next prediction less accurate
+            logging.error(f'Unable to record the runtime of {job.msg_prefix()}: {e}')
+            return
+        self._rates.pop((job_type, run_type, grid), None)
+    # -----------------------------------------------
+
+    def _load_rates(self, kind):
+        if kind in self._rates:
+            return self._rates[kind]
+        job_type, run_type, grid = kind
+        query = (JobRuntime
+                 .select(JobRuntime.runtime, JobRuntime.years, JobRuntime.walltime, JobRuntime.state)
+                 .where((JobRuntime.job_type == job_type)
+                        & (JobRuntime.run_type == run_type)
+                        & (JobRuntime.grid == grid)
+                        & (JobRuntime.state << ['COMPLETED', 'TIMEOUT']))
+                 .order_by(JobRuntime.finished.desc())
+                 .limit(MAX_SAMPLES)
+                 .tuples())
+        rates = list()
+        for runtime, years, walltime, state in query:
+            if state == 'TIMEOUT':
+                # it needed more than it was given, how much more isnt known
+                runtime = 2 * max(runtime, walltime or 0)
+            rates.append(runtime / max(1, years))
+        self._rates[kind] = rates
+        return rates
+    # -----------------------------------------------
+
+    def predict_walltime(self, job):
+        """
+        Predict the walltime of a job from the history of jobs like it
+
+        Returns:
+            the predicted walltime in minutes, or None if there isnt enough history
+        """
+        rates = self._load_rates(self.kind(job))
+        if len(rates) < MIN_SAMPLES:
+            return None
+        rates = sorted(rates)
+        rate = rates[min(len(rates) - 1, int(math.ceil(self.percentile * len(rates))) - 1)]
+        minutes = rate * self.years(job) * self.margin / 60 + self.padding
+        # whole five minute steps, so jobs of a kind still share job arrays
+        minutes = math.ceil(minutes / 5) * 5
+        return min(max(minutes, self.min_walltime), self.max_walltime)
+    # -----------------------------------------------
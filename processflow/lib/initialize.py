@@ -14,6 +14,7 @@ import yaml
 
 from processflow import resources
 from processflow.lib.filemanager import FileManager
+from processflow.lib.priority import POLICIES
 from processflow.lib.runmanager import RunManager
 from processflow.lib.util import print_debug
 from processflow.lib.util import print_line
@@ -55,8 +56,71 @@ def parse_args(argv=None, print_help=None):
         action='store_true')
     parser.add_argument(
         '-s', '--serial',
-        help="Run in serial on systems without a resource manager",
+        help="Run jobs as local processes on systems without a resource manager, as many at once as the cores allow",
         action='store_true')
+    parser.add_argument(
+        '--loop-delay',
+        dest='loop_delay',
+        help="Maximum number of seconds to wait between main loop passes, defaults to 10",
+        type=float)
+    parser.add_argument(
+        '--fixed-loop-delay',
+        dest='fixed_loop_delay',
+        help="Always wait the full loop delay between passes instead of waking up as soon as jobs change state",
+        action='store_true')
+    parser.add_argument(
+        '--job-arrays',
+        dest='job_arrays',
+        help="Submit timeseries, regrid and climo jobs with the same resource requirements together as slurm job arrays",
+        action='store_true')
+    parser.add_argument(
+        '--pack-jobs',
+        dest='pack_jobs',
+        help="Run timeseries, regrid and climo jobs together inside a shared slurm allocation instead of queuing each one",
+        action='store_true')
+    parser.add_argument(
+        '--concurrent-submit',
+        dest='concurrent_submit',
+        help="Submit all the ready jobs to slurm at once, and check on running jobs at the same time",
+        action='store_true')
+    parser.add_argument(
+        '--priority',
+        help="How to order jobs that are ready to run, critical_path (the default) starts the jobs that hold up the most work first, fifo starts them in the order they appear in the config",
+        choices=POLICIES)
+    parser.add_argument(
+        '--no-fair-share',
+        dest='no_fair_share',
+        help="Dont spread job submissions evenly across cases",
+        action='store_true')
+    parser.add_argument(
+        '--no-resource-limits',
+        dest='no_resource_limits',
+        help="Only limit the number of running jobs, instead of fitting jobs into the cores and memory of each partition and the users slurm limits",
+        action='store_true')
+    parser.add_argument(
+        '--no-walltime-prediction',
+        dest='no_walltime_prediction',
+        help="Always submit jobs with their configured time limit, instead of one predicted from how long similar jobs took",
+        action='store_true')
+    parser.add_argument(
+        '--slurm-rate',
+        dest='slurm_rate',
+        help="The most slurm commands to run per second, 0 for no limit. Defaults to 10",
+        type=float)
+    parser.add_argument(
+        '--history-path',
+        dest='history_path',
+        help="Path to the sqlite file job runtimes are recorded in, share one between projects to get walltime predictions sooner. Defaults to output/history.db in the project")
+    parser.add_argument(
+        '--no-plan-cache',
+        dest='no_plan_cache',
+        help="Plan the jobs from scratch and check every one of them with postvalidate, instead of reusing the plan and finished jobs from the last run with this config",
+        action='store_true')
+    parser.add_argument(
+        '--prevalidate-workers',
+        dest='prevalidate_workers',
+        help="How many processes check for output left by an earlier run at startup, 0 to check each job as it comes up to run instead. Defaults to the number of cores",
+        type=int)
     parser.add_argument(
         '--skip-db',
         dest='skip_db',
@@ -159,6 +223,21 @@ Please add a space and run again.'''.format(num=line_index))
     config['global']['debug'] = True if pargs.debug else False
     config['global']['max_jobs'] = pargs.max_jobs if pargs.max_jobs else False
     config['global']['serial'] = True if pargs.serial else False
+    config['global']['loop_delay'] = pargs.loop_delay if pargs.loop_delay else 10
+    config['global']['fixed_loop_delay'] = True if pargs.fixed_loop_delay else False
+    config['global']['job_arrays'] = True if pargs.job_arrays else False
+    config['global']['pack_jobs'] = True if pargs.pack_jobs else False
+    config['global']['concurrent_submit'] = True if pargs.concurrent_submit else False
+    config['global']['priority'] = pargs.priority if pargs.priority else 'critical_path'
+    config['global']['fair_share'] = False if pargs.no_fair_share else True
+    config['global']['resource_limits'] = False if pargs.no_resource_limits else True
+    config['global']['predict_walltime'] = False if pargs.no_walltime_prediction else True
+    config['global']['slurm_rate'] = pargs.slurm_rate if pargs.slurm_rate is not None else 10
+    config['global']['plan_cache'] = False if pargs.no_plan_cache else True
+    if pargs.prevalidate_workers is not None:
+        config['global']['prevalidate_workers'] = pargs.prevalidate_workers
+    if pargs.history_path:
+        config['global']['history_path'] = os.path.abspath(pargs.history_path)
 
     # setup logging
     if pargs.log:
@@ -263,14 +342,14 @@ Please add a space and run again.'''.format(num=line_index))
         filemanager=filemanager)
 
     if pargs.debug:
-        msg = '-- setting up cases -- '
+        msg = '-- setting up cases and jobs -- '
         print_line(msg)
-    runmanager.setup_cases()
+    runmanager.setup_plan()
 
     if pargs.debug:
-        msg = '-- setting up jobs --'
+        msg = '-- checking for jobs finished by an earlier run --'
         print_line(msg)
-    runmanager.setup_jobs()
+    runmanager.prevalidate_jobs()
 
     if pargs.debug:
         msg = '-- writing job state out to file --'
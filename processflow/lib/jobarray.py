@@ -0,0 +1,130 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+import logging
+import os
+
+from datetime import datetime
+
+from processflow.lib.util import print_line
+
+# the job types that are submitted as arrays when --job-arrays is turned on
+DEFAULT_ARRAY_TYPES = ['timeseries', 'regrid', 'climo']
+
+
+class JobArrayBatcher(object):
+    """
+    Collects the run scripts of jobs that share a job type and resource shape
+    and submits each group as a single slurm job array
+
+    Each array task looks up its run script by SLURM_ARRAY_TASK_ID and runs it,
+    writing to the same console output path the job would have used if it was
+    submitted on its own. Groups with a single job are submitted as is. The task ids (<array id>_<index>) are handed back so
+    each Job can still be tracked individually.
+
+    Parameters:
+        manager (Slurm): the resource manager to submit the arrays to
+        scripts_path (str): the directory to write the array scripts into
+        max_array_size (int): the most tasks to put into one array, slurm's default
+            MaxArraySize is 1001
+    """
+
+    def __init__(self, manager, scripts_path, max_array_size=1000):
+        self._manager = manager
+        self._scripts_path = scripts_path
+        self._max_array_size = max_array_size
+        self._groups = dict()
+        self._count = 0
+    # -----------------------------------------------
+
+    def __len__(self):
+        return self._count
+    # -----------------------------------------------
+
+    def add(self, job):
+        """
+        Add a job whose run script has been generated but not submitted
+
+        Parameters:
+            job (Job): a job with a _pending_script
+        """
+        key = (job.job_type, tuple(job.get_resource_args()))
+        self._groups.setdefault(key, list()).append(job)
+        self._count += 1
+    # -----------------------------------------------
+
+    def flush(self):
+        """
+        Submit every collected group as a job array
+
+        Returns:
+            a list of (job, manager_id) tuples, the manager_id is 0 for jobs whose
+            array failed to submit
+        """
+        submitted = list()
+        for (job_type, resource_args), jobs in self._groups.items():
+            for idx in range(0, len(jobs), self._max_array_size):
+                chunk = jobs[idx: idx + self._max_array_size]
+                if len(chunk) == 1:
+                    # no need for an array around a single job
+                    manager_ids = [self._submit_single(chunk[0])]
+                else:
+                    array_id = self._submit_array(job_type, resource_args, chunk)
+                    if array_id:
+                        manager_ids = ['{}_{}'.format(array_id, x) for x in range(len(chunk))]
+                    else:
+                        manager_ids = [0] * len(chunk)
+                for job, manager_id in zip(chunk, manager_ids):
+                    job._pending_script = None
+                    job._defer_submit = False
+                    if manager_id:
+                        job._job_id = manager_id
+                        job._has_been_executed = True
+                    submitted.append((job, manager_id))
+        self._groups = dict()
+        self._count = 0
+        return submitted
+    # -----------------------------------------------
+
+    def _submit_single(self, job):
+        """
+        Submit a jobs run script on its own
+
+        Returns:
+            the slurm job id, or 0 if the submission failed
+        """
+        msg = f'{job.msg_prefix()}: Job ready, submitting to queue'
+        print_line(msg)
+        return self._manager.batch(job._pending_script)
+    # -----------------------------------------------
+
+    def _submit_array(self, job_type, resource_args, jobs):
+        """
+        Write the array script for one group of jobs and submit it
+
+        Returns:
+            the slurm job id of the array, or 0 if the submission failed
+        """
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        array_script = os.path.join(
+            self._scripts_path,
+            f'array_{job_type}_{len(jobs)}_{timestamp}')
+
+        with open(array_script, 'w') as batchfile:
+            batchfile.write('#!/bin/bash\n')
+            for item in resource_args:
+                batchfile.write(f'#SBATCH {item}\n')
+            batchfile.write(f'#SBATCH --array=0-{len(jobs) - 1}\n')
+            # each task writes to its own jobs console output instead
+            batchfile.write('#SBATCH -o /dev/null\n')
+            batchfile.write('scripts=(\n')
+            for job in jobs:
+                batchfile.write(f'    "{job._pending_script}"\n')
+            batchfile.write(')\n')
+            batchfile.write('script=${scripts[$SLURM_ARRAY_TASK_ID]}\n')
+            batchfile.write('bash "$script" > "$script.out" 2>&1\n')
+
+        msg = f'Submitting {len(jobs)} {job_type} jobs as a job array'
+        print_line(msg)
+        logging.info(msg + ': ' + ', '.join(x.msg_prefix() for x in jobs))
+        return self._manager.batch(array_script)
+    # -----------------------------------------------
+
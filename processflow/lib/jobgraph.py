@@ -0,0 +1,184 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+from collections import deque
+
+from processflow.lib.jobstatus import JobStatus
+
+
+class JobGraph(object):
+    """
+    An indexed dependency graph over all the jobs in a run
+
+    Keeps an id to job mapping, the reverse dependency adjacency lists, a count
+    of unfinished dependencies for each job, and the set of jobs whose
+    dependencies have all completed. Completing a job only touches its
+    direct dependents, and failing a job only walks its downstream subgraph.
+
+    Parameters:
+        on_change (function): called with a description whenever a job
+            completes or fails, e.g. to wake the main loop up
+    """
+
+    def __init__(self, on_change=None):
+        self._jobs = dict()
+        self._order = dict()
+        self._dependents = dict()
+        self._waiting_on = dict()
+        self._ready = set()
+        self.on_change = on_change
+    # -----------------------------------------------
+
+    def __len__(self):
+        return len(self._jobs)
+    # -----------------------------------------------
+
+    def __contains__(self, job_id):
+        return job_id in self._jobs
+    # -----------------------------------------------
+
+    def add_job(self, job):
+        """
+        Add a job to the graph, its dependencies are wired up later by build()
+
+        Parameters:
+            job (Job): the job to add
+        """
+        if job.id in self._jobs:
+            return
+        self._order[job.id] = len(self._jobs)
+        self._jobs[job.id] = job
+        self._dependents[job.id] = list()
+        self._waiting_on[job.id] = 0
+    # -----------------------------------------------
+
+    def build(self):
+        """
+        Build the reverse adjacency lists and the unfinished dependency counts
+        from each jobs depends_on list, and fill the ready set
+        """
+        for job_id in self._jobs:
+            self._dependents[job_id] = list()
+            self._waiting_on[job_id] = 0
+        self._ready = set()
+
+        for job_id, job in self._jobs.items():
+            for dep_id in job.depends_on:
+                if dep_id not in self._jobs:
+                    raise Exception(f"no job with id {dep_id} found")
+                self._dependents[dep_id].append(job_id)
+                if self._jobs[dep_id].status != JobStatus.COMPLETED:
+                    self._waiting_on[job_id] += 1
+
+        for job_id, job in self._jobs.items():
+            if self._waiting_on[job_id] == 0 and job.status == JobStatus.VALID:
+                self._ready.add(job_id)
+    # -----------------------------------------------
+
+    def get(self, job_id):
+        """
+        Return the job with the given id
+        """
+        try:
+            return self._jobs[job_id]
+        except KeyError:
+            raise Exception(f"no job with id {job_id} found")
+    # -----------------------------------------------
+
+    def jobs(self):
+        """
+        Return all the jobs in the order they were added
+        """
+        return list(self._jobs.values())
+    # -----------------------------------------------
+
+    def dependents(self, job_id):
+        """
+        Return the jobs that directly depend on the given job
+        """
+        return [self._jobs[x] for x in self._dependents.get(job_id, [])]
+    # -----------------------------------------------
+
+    def downstream(self, job_id):
+        """
+        Return every job that directly or indirectly depends on the given job,
+        in breadth first order
+        """
+        seen = set()
+        found = list()
+        queue = deque(self._dependents.get(job_id, []))
+        while queue:
+            next_id = queue.popleft()
+            if next_id in seen:
+                continue
+            seen.add(next_id)
+            found.append(self._jobs[next_id])
+            queue.extend(self._dependents[next_id])
+        return found
+    # -----------------------------------------------
+
+    def deps_ready(self, job_id):
+        """
+        Returns True if all the dependencies of the job have completed
+        """
+        return self._waiting_on.get(job_id, 0) == 0
+    # -----------------------------------------------
+
+    def ready_jobs(self):
+        """
+        Return the VALID jobs whose dependencies have all completed, in the
+        order the jobs were added to the graph
+        """
+        stale = [x for x in self._ready if self._jobs[x].status != JobStatus.VALID]
+        for job_id in stale:
+            self._ready.discard(job_id)
+        return [self._jobs[x] for x in sorted(self._ready, key=self._order.get)]
+    # -----------------------------------------------
+
+    def requeue(self, job_id):
+        """
+        Put a job that was set back to VALID into the ready set if its
+        dependencies are complete
+        """
+        if self._waiting_on.get(job_id, 0) == 0 and self._jobs[job_id].status == JobStatus.VALID:
+            self._ready.add(job_id)
+    # -----------------------------------------------
+
+    def mark_completed(self, job_id):
+        """
+        Record that a job has completed, moving any dependents that were only
+        waiting on this job into the ready set
+
+        Returns:
+            a list of the jobs that became ready
+        """
+        self._ready.discard(job_id)
+        newly_ready = list()
+        for dep_id in self._dependents.get(job_id, []):
+            if self._waiting_on[dep_id] > 0:
+                self._waiting_on[dep_id] -= 1
+            if self._waiting_on[dep_id] == 0 and self._jobs[dep_id].status == JobStatus.VALID:
+                self._ready.add(dep_id)
+                newly_ready.append(self._jobs[dep_id])
+        if self.on_change:
+            self.on_change(f'{job_id} completed, {len(newly_ready)} jobs ready')
+        return newly_ready
+    # -----------------------------------------------
+
+    def mark_failed(self, job_id):
+        """
+        Record that a job has failed, every job downstream of it is set to FAILED
+
+        Returns:
+            a list of the downstream jobs that were failed
+        """
+        self._ready.discard(job_id)
+        failed = list()
+        for job in self.downstream(job_id):
+            if job.status in [JobStatus.COMPLETED, JobStatus.FAILED]:
+                continue
+            job.status = JobStatus.FAILED
+            self._ready.discard(job.id)
+            failed.append(job)
+        if self.on_change:
+            self.on_change(f'{job_id} failed')
+        return failed
+    # -----------------------------------------------
@@ -15,13 +15,19 @@ class JobInfo(object):
                  state=None,
                  time=None,
                  user=None,
-                 command=None):
+                 command=None,
+                 exit_code=None,
+                 max_rss=None):
         self.jobid = jobid
         self.jobname = jobname
         self.partition = partition
         self.time = time
         self.user = user
         self.command = command
+        # only known once the job has finished and sacct has a record of it,
+        # max_rss is the peak memory of the job in megabytes
+        self.exit_code = exit_code
+        self.max_rss = max_rss
         if state is not None:
             if not isinstance(state, JobStatus):
                 raise Exception(
@@ -39,7 +45,9 @@ class JobInfo(object):
             'STATE': self.state,
             'TIME': self.time,
             'USER': self.user,
-            'COMMAND': self.command
+            'COMMAND': self.command,
+            'EXITCODE': self.exit_code,
+            'MAXRSS': self.max_rss
         })
     # -----------------------------------------------
 
@@ -73,14 +81,18 @@ class JobInfo(object):
 
     @state.setter
     def state(self, state):
-        if state in ['Q', 'W', 'PD', 'PENDING']:
+        if state in ['Q', 'W', 'PD', 'PENDING', 'CF', 'CONFIGURING', 'REQUEUED']:
             self._state = 'PENDING'
         elif state in ['R', 'RUNNING']:
             self._state = 'RUNNING'
         elif state in ['E', 'CD', 'CG', 'COMPLETED', 'COMPLETING']:
             self._state = 'COMPLETED'
-        elif state in ['FAILED', 'F']:
+        elif state in ['FAILED', 'F', 'OUT_OF_MEMORY', 'OOM', 'NODE_FAIL', 'NF', 'BOOT_FAIL', 'BF', 'DEADLINE', 'DL', 'PREEMPTED', 'PR']:
             self._state = 'FAILED'
+        elif state in ['CA', 'CANCELLED']:
+            self._state = 'CANCELLED'
+        elif state in ['TO', 'TIMEOUT']:
+            self._state = 'TIMEOUT'
         else:
             self._state = state
     # -----------------------------------------------
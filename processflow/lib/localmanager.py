@@ -0,0 +1,210 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+import logging
+import os
+import threading
+import time
+
+from collections import deque
+from subprocess import Popen, STDOUT
+
+from processflow.lib.jobinfo import JobInfo
+from processflow.lib.resources import parse_memory
+
+
+def total_memory():
+    """
+    Returns the physical memory of the machine in megabytes, or None if it cant be found
+    """
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+# -----------------------------------------------
+
+
+class LocalManager(object):
+    """
+    Runs job scripts as local processes, up to as many at once as the cores
+    and memory of the machine allow
+
+    batch returns right away with a job id, the scripts are started by a
+    background thread as soon as there are enough free cores and memory for them,
+    and showjob reports their live state. Each job gets the cores and memory
+    passed to batch, and never fewer than cores_per_job cores. The console output of each script goes to <script>.out, the same
+    place the job expects it.
+
+    Parameters:
+        cores (int): the cores to use, defaults to all of them
+        memory (int): the megabytes of memory to use, defaults to all of it
+        max_jobs (int): an optional cap on the number of jobs running at once
+        cores_per_job (int): the fewest cores a job gets
+        on_change (function): called from the background thread whenever a job changes state
+    """
+
+    def __init__(self, cores=None, memory=None, max_jobs=None, cores_per_job=1, on_change=None):
+        self._cores = int(cores) if cores else (os.cpu_count() or 1)
+        self._memory = parse_memory(memory) if memory else total_memory()
+        self._max_jobs = int(max_jobs) if max_jobs else None
+        self._cores_per_job = max(1, min(int(cores_per_job), self._cores))
+        self.on_change = on_change
+
+        self.job_id = 0
+        self.jobs = dict()
+        self._queue = deque()
+        # job id -> (proc, cores, memory)
+        self._running = dict()
+        self._free_cores = self._cores
+        self._free_memory = self._memory
+
+        self._lock = threading.Condition()
+        self._thread = None
+    # -----------------------------------------------
+
+    def batch(self, cmd, cores=None, memory=0):
+        """
+        Queue a script to run
+
+        Parameters:
+            cmd (str): The path to the run script
+            cores (int): the cores the job needs
+            memory (int): the megabytes of memory the job needs, 0 if it didnt ask for any
+        Returns:
+            job id of the new job (int)
+        """
+        cores, memory = self._fit_request(cores, memory)
+        with self._lock:
+            self.job_id += 1
+            job_id = self.job_id
+            info = JobInfo(
+                jobid=job_id,
+                jobname=os.path.basename(cmd),
+                partition='local',
+                command=f'bash {cmd}')
+            info.state = 'PENDING'
+            info.time = '0:00'
+            self.jobs[str(job_id)] = info
+            self._queue.append((job_id, cmd, cores, memory))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._lock.notify()
+        return job_id
+    # -----------------------------------------------
+
+    def showjob(self, jobid):
+        return self.jobs.get(str(jobid))
+    # -----------------------------------------------
+
+    def showjobs(self, jobids):
+        """
+        Returns a dict mapping each of the given job ids (as a str) to its JobInfo
+        """
+        with self._lock:
+            return {str(x): self.jobs[str(x)] for x in jobids if str(x) in self.jobs}
+    # -----------------------------------------------
+
+    def cancel(self, job_id):
+        """
+        Remove a queued job, or stop a running one
+
+        Returns:
+            True if the job was cancelled
+        """
+        with self._lock:
+            for item in self._queue:
+                if str(item[0]) == str(job_id):
+                    self._queue.remove(item)
+                    self.jobs[str(job_id)].state = 'CANCELLED'
+                    return True
+            running = self._running.get(int(job_id))
+            if running is None:
+                return False
+            running[0].terminate()
+            self.jobs[str(job_id)].state = 'CANCELLED'
+            return True
+    # -----------------------------------------------
+
+    def get_node_number(self):
+        """
+        The number of default sized jobs that fit on the machine at once
+        """
+        slots = self._cores // self._cores_per_job
+        if self._max_jobs:
+            slots = min(slots, self._max_jobs)
+        return max(1, slots)
+    # -----------------------------------------------
+
+    def _fit_request(self, cores, memory):
+        cores = max(int(cores or 1), self._cores_per_job)
+        memory = int(memory or 0)
+        # never ask for more than the machine has, or the job could never start
+        cores = max(1, min(cores, self._cores))
+        if self._memory:
+            memory = min(memory, self._memory)
+        return cores, memory
+    # -----------------------------------------------
+
+    def _fits(self, cores, memory):
+        if self._max_jobs and len(self._running) >= self._max_jobs:
+            return False
+        if cores > self._free_cores:
+            return False
+        if memory and self._free_memory is not None and memory > self._free_memory:
+            return False
+        return True
+    # -----------------------------------------------
+
+    def _run(self):
+        """
+        Start queued scripts when there are free slots and reap finished ones,
+        exits once there is nothing left to do
+        """
+        with self._lock:
+            while self._queue or self._running:
+                changed = self._reap() + self._start_queued()
+                if changed and self.on_change:
+                    self.on_change(f'{changed} local jobs changed state')
+                if self._queue or self._running:
+                    self._lock.wait(timeout=0.2)
+    # -----------------------------------------------
+
+    def _start_queued(self):
+        started = 0
+        # jobs are started in order, a big job at the front holds back the ones behind it
+        while self._queue and self._fits(*self._queue[0][2:]):
+            job_id, cmd, cores, memory = self._queue.popleft()
+            info = self.jobs[str(job_id)]
+            try:
+                with open(f'{cmd}.out', 'w') as output:
+                    proc = Popen(['bash', cmd], stdout=output, stderr=STDOUT)
+            except OSError as e:
+                logging.error(f'Unable to start {cmd}: {e}')
+                info.state = 'FAILED'
+                started += 1
+                continue
+            self._running[job_id] = (proc, cores, memory, time.time())
+            self._free_cores -= cores
+            if self._free_memory is not None:
+                self._free_memory -= memory
+            info.state = 'RUNNING'
+            started += 1
+        return started
+    # -----------------------------------------------
+
+    def _reap(self):
+        finished = 0
+        for job_id, (proc, cores, memory, start) in list(self._running.items()):
+            info = self.jobs[str(job_id)]
+            elapsed = int(time.time() - start)
+            info.time = f'{elapsed // 60}:{elapsed % 60:02d}'
+            if proc.poll() is None:
+                continue
+            del self._running[job_id]
+            self._free_cores += cores
+            if self._free_memory is not None:
+                self._free_memory += memory
+            if info.state != 'CANCELLED':
+                info.state = 'COMPLETED' if proc.returncode == 0 else 'FAILED'
+            finished += 1
+        return finished
+    # -----------------------------------------------
@@ -0,0 +1,100 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+import logging
+import threading
+
+from time import sleep
+
+
+class LoopControl(object):
+    """
+    Controls how long the main loop waits between passes
+
+    Instead of sleeping a fixed amount of time after every pass, the loop
+    runs again right away whenever notify() is called or the previous pass
+    made progress (a job changed state, new data was registered or a
+    submission slot opened up). The RunManager calls notify() when jobs are
+    submitted, complete or fail, the local manager when one of its processes
+    exits, and the slurm circuit breaker when it opens or closes.
+
+    Slurm doesnt tell the processflow when a job changes state, so those are
+    still found by polling squeue each pass. When nothing is happening the
+    delay between polls doubles from min_delay up to max_delay, so an idle
+    run falls back to the old fixed interval polling.
+
+    Parameters:
+        min_delay (float): the shortest wait between idle passes, in seconds
+        max_delay (float): the longest wait between passes, in seconds
+        adaptive (bool): if False, always wait max_delay (the legacy fixed polling behavior)
+    """
+
+    def __init__(self, min_delay=0.5, max_delay=10, adaptive=True):
+        self.min_delay = float(min_delay)
+        self.max_delay = float(max_delay)
+        if self.min_delay > self.max_delay:
+            self.min_delay = self.max_delay
+        self.adaptive = adaptive
+        self._delay = self.min_delay
+        self._event = threading.Event()
+        self._reasons = list()
+        self._lock = threading.Lock()
+    # -----------------------------------------------
+
+    def notify(self, reason=None):
+        """
+        Wake the main loop up, safe to call from any thread
+
+        Parameters:
+            reason (str): an optional description of what happened, logged on wakeup
+        """
+        if reason:
+            with self._lock:
+                self._reasons.append(reason)
+        self._event.set()
+    # -----------------------------------------------
+
+    def record_pass(self, activity):
+        """
+        Update the backoff after a main loop pass
+
+        Parameters:
+            activity (int): how many things changed during the pass, 0 if nothing did
+        """
+        if not self.adaptive:
+            self._delay = self.max_delay
+        elif activity:
+            # something changed, dependent jobs may be ready now
+            self._delay = 0
+            self._event.set()
+        elif self._delay <= 0:
+            self._delay = self.min_delay
+        else:
+            self._delay = min(self._delay * 2, self.max_delay)
+    # -----------------------------------------------
+
+    def wait(self):
+        """
+        Block until notify() is called or the current delay runs out
+
+        Returns:
+            True if the loop was woken up by an event, False if it timed out
+        """
+        if not self.adaptive:
+            sleep(self.max_delay)
+            self._event.clear()
+            return False
+
+        woken = self._event.wait(self._delay)
+        self._event.clear()
+        if woken:
+            with self._lock:
+                reasons, self._reasons = self._reasons, list()
+            if reasons:
+                logging.debug('Main loop woken up by: %s', ', '.join(reasons))
+            self._delay = 0
+        return woken
+    # -----------------------------------------------
+
+    @property
+    def delay(self):
+        return self._delay
+    # -----------------------------------------------
@@ -1,7 +1,17 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 from peewee import *
 
-database = SqliteDatabase(None)  # Defer initialization
+# WAL lets the status check and job callbacks write without blocking readers,
+# and synchronous=NORMAL is safe under WAL since the catalog can be rebuilt from disk
+PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -64 * 1024,  # in KiB, so 64MB
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+
+database = SqliteDatabase(None, pragmas=PRAGMAS)  # Defer initialization
 
 
 class DataFile(Model):
@@ -17,3 +27,48 @@ class DataFile(Model):
 
     class Meta:
         database = database
+        indexes = (
+            (('case', 'datatype', 'local_path'), True),
+            # every year range and status lookup filters on these
+            (('case', 'datatype', 'year', 'local_status'), False),
+        )
+
+
+class CatalogState(Model):
+    """
+    Key/value bookkeeping that lets the file catalog be reused between runs
+    """
+    key = CharField(unique=True)
+    value = TextField()
+
+    class Meta:
+        database = database
+
+
+# job runtimes are kept in their own file (output/history.db by default), apart
+# from the file catalog, so they survive the catalog being rebuilt or deleted,
+# and so one history can be shared between projects
+history_database = SqliteDatabase(None, pragmas=PRAGMAS)  # Defer initialization
+
+
+class JobRuntime(Model):
+    """
+    How long a finished job took, used to predict the walltime of later jobs like it
+    """
+    job_type = CharField()
+    run_type = CharField()
+    grid = CharField()
+    case = CharField()
+    years = IntegerField()
+    input_bytes = BigIntegerField()
+    runtime = FloatField()
+    queue_wait = FloatField(null=True)
+    walltime = FloatField(null=True)
+    state = CharField()
+    finished = FloatField()
+
+    class Meta:
+        database = history_database
+        indexes = (
+            (('job_type', 'run_type', 'grid', 'finished'), False),
+        )
@@ -0,0 +1,222 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+import json
+import logging
+import os
+import sys
+
+from processflow.lib.history import parse_elapsed
+from processflow.lib.jobinfo import JobInfo
+from processflow.lib.packworker import read_status
+from processflow.lib.util import print_line
+
+# the job types that are packed into a shared allocation when --pack-jobs is turned on
+DEFAULT_PACK_TYPES = ['timeseries', 'regrid', 'climo']
+
+# prefix for the ids handed out to packed jobs, so they can be told apart from slurm ids
+TASK_PREFIX = 'pack_'
+
+TERMINAL_STATES = ['COMPLETED', 'FAILED', 'CANCELLED', 'TIMEOUT']
+
+
+class JobPacker(object):
+    """
+    Runs small jobs inside one shared slurm allocation instead of giving each its own
+
+    Job run scripts are written into a queue directory, and a single allocation is
+    requested that runs the packworker, which pulls scripts from the queue and runs
+    them as srun steps (or local processes on a single node allocation) sized to the
+    available cores. The worker records each tasks state, and showjobs turns those
+    into JobInfos so each job is still tracked on its own by the RunManager.
+    A new allocation is requested whenever there are queued tasks and the last
+    allocation has ended. The worker stops taking tasks near the end of the
+    walltime, and tasks it had taken that didnt finish before the allocation
+    ended are put back in the queue to be run again, up to max_requeue times.
+
+    Parameters:
+        manager (Slurm): the resource manager used to request the allocation
+        pack_path (str): the directory to keep the queue and status files in
+        nodes (int): the number of nodes in the allocation
+        walltime (str): the time limit of the allocation
+        cpus_per_task (int): the cores given to each packed job
+        idle_timeout (int): seconds the worker waits for new work before releasing the allocation
+        walltime_margin (int): seconds before the end of the walltime the worker stops taking tasks
+        max_requeue (int): how many times a task cut off by the end of an allocation is run again
+        slurm_args (list): any extra #SBATCH arguments for the allocation, e.g. the account
+    """
+
+    def __init__(self, manager, pack_path, nodes=1, walltime='0-02:00', cpus_per_task=1,
+                 idle_timeout=300, walltime_margin=600, max_requeue=2, slurm_args=None):
+        self._manager = manager
+        self._pack_path = pack_path
+        self._queue_path = os.path.join(pack_path, 'queue')
+        self._claimed_path = os.path.join(pack_path, 'claimed')
+        self._status_path = os.path.join(pack_path, 'status')
+        for path in [self._queue_path, self._claimed_path, self._status_path]:
+            if not os.path.exists(path):
+                os.makedirs(path)
+        stop_path = os.path.join(pack_path, 'stop')
+        if os.path.exists(stop_path):
+            os.remove(stop_path)
+
+        self._nodes = int(nodes)
+        self._walltime = walltime
+        self._cpus_per_task = int(cpus_per_task)
+        self._idle_timeout = idle_timeout
+        self._walltime_margin = walltime_margin
+        self._max_requeue = int(max_requeue)
+        self._slurm_args = slurm_args or list()
+        self._allocation_id = None
+        self._allocation_count = 0
+        self._task_count = 0
+    # -----------------------------------------------
+
+    @staticmethod
+    def is_task_id(manager_id):
+        return str(manager_id).startswith(TASK_PREFIX)
+    # -----------------------------------------------
+
+    def submit(self, job):
+        """
+        Add a jobs run script to the pack queue, requesting an allocation if one isnt running
+
+        Parameters:
+            job (Job): a job with a _pending_script
+        Returns:
+            the task id the job should be tracked by
+        """
+        self._task_count += 1
+        task_id = f'{TASK_PREFIX}{self._task_count:06d}_{job.id}'
+        task_path = os.path.join(self._queue_path, task_id)
+        with open(task_path + '.tmp', 'w') as fp:
+            json.dump({
+                'script': job._pending_script,
+                'output': job._console_output_path,
+            }, fp)
+        os.replace(task_path + '.tmp', task_path)
+
+        msg = f'{job.msg_prefix()}: Job ready, adding to the packed allocation queue'
+        print_line(msg)
+
+        job._job_id = task_id
+        job._has_been_executed = True
+        job._pending_script = None
+        job._defer_submit = False
+
+        if self._allocation_id is None:
+            self._request_allocation()
+        return task_id
+    # -----------------------------------------------
+
+    def showjobs(self, task_ids):
+        """
+        Look up the state of packed jobs
+
+        Parameters:
+            task_ids (list): the ids handed out by submit
+        Returns:
+            a dict of task id to JobInfo
+        """
+        infos = dict()
+        unfinished = list()
+        for task_id in task_ids:
+            task_id = str(task_id)
+            state, _ = read_status(self._status_path, task_id)
+            if state is None:
+                state = 'PENDING'
+            if state not in TERMINAL_STATES:
+                unfinished.append(task_id)
+            infos[task_id] = JobInfo(jobid=task_id, jobname=task_id)
+            infos[task_id].state = state
+
+        if unfinished and not self._allocation_alive():
+            # anything the worker was running when the allocation went away is
+            # put back in the queue, and waits for a new allocation along with the rest
+            for task_id in unfinished:
+                if os.path.exists(os.path.join(self._claimed_path, task_id)):
+                    infos[task_id].state = self._requeue(task_id)
+            if any(infos[x].state == 'PENDING' for x in unfinished):
+                self._request_allocation()
+        return infos
+    # -----------------------------------------------
+
+    def _requeue(self, task_id):
+        """
+        Move a task the worker had claimed back into the queue
+
+        Returns:
+            PENDING if the task was requeued, FAILED if it has been requeued too many times
+        """
+        claimed = os.path.join(self._claimed_path, task_id)
+        with open(claimed, 'r') as fp:
+            task = json.load(fp)
+        task['requeued'] = task.get('requeued', 0) + 1
+        if task['requeued'] > self._max_requeue:
+            msg = f'{task_id}: cut off by the end of the packed allocation {self._max_requeue + 1} times, giving up'
+            logging.error(msg)
+            return 'FAILED'
+
+        task_path = os.path.join(self._queue_path, task_id)
+        with open(task_path + '.tmp', 'w') as fp:
+            json.dump(task, fp)
+        os.replace(task_path + '.tmp', task_path)
+        os.remove(claimed)
+        status = os.path.join(self._status_path, task_id)
+        if os.path.exists(status):
+            os.remove(status)
+        msg = f'{task_id}: cut off by the end of the packed allocation, putting it back in the queue'
+        logging.info(msg)
+        return 'PENDING'
+    # -----------------------------------------------
+
+    def close(self):
+        """
+        Tell the worker to exit once its running tasks are done
+        """
+        open(os.path.join(self._pack_path, 'stop'), 'w').close()
+    # -----------------------------------------------
+
+    def _allocation_alive(self):
+        if not self._allocation_id:
+            return False
+        info = self._manager.showjobs([self._allocation_id]).get(str(self._allocation_id))
+        if info is None or info.state in TERMINAL_STATES:
+            msg = f'Packed allocation {self._allocation_id} has ended'
+            logging.info(msg)
+            self._allocation_id = None
+            return False
+        return True
+    # -----------------------------------------------
+
+    def _request_allocation(self):
+        """
+        Write the allocation script and submit it
+        """
+        self._allocation_count += 1
+        script = os.path.join(
+            self._pack_path, f'allocation_{self._allocation_count}')
+        worker_cmd = [sys.executable, '-m', 'processflow.lib.packworker', self._pack_path,
+                      '--cpus-per-task', str(self._cpus_per_task),
+                      '--idle-timeout', str(self._idle_timeout),
+                      '--walltime-margin', str(self._walltime_margin)]
+        walltime = parse_elapsed(self._walltime)
+        if walltime:
+            worker_cmd.extend(['--walltime', str(walltime)])
+        if self._nodes > 1:
+            worker_cmd.append('--srun')
+
+        with open(script, 'w') as batchfile:
+            batchfile.write('#!/bin/bash\n')
+            batchfile.write(f'#SBATCH -N {self._nodes}\n')
+            batchfile.write(f'#SBATCH -t {self._walltime}\n')
+            batchfile.write(f'#SBATCH -o {script}.out\n')
+            for item in self._slurm_args:
+                batchfile.write(f'#SBATCH {item}\n')
+            batchfile.write(' '.join(worker_cmd) + '\n')
+
+        self._allocation_id = self._manager.batch(script) or None
+        if self._allocation_id:
+            msg = f'Requested packed allocation {self._allocation_id} with {self._nodes} nodes for {self._walltime}'
+        else:
+            msg = 'Unable to request a packed allocation, will try again'
+        print_line(msg, status='ok' if self._allocation_id else 'err')
+    # -----------------------------------------------
@@ -0,0 +1,197 @@
+"""
+The worker that runs inside a packed slurm allocation
+
+It pulls job scripts out of the shared queue directory written by the JobPacker,
+runs as many of them at once as there are slots, either as srun job steps spread
+over the allocations nodes or as local processes, and records the state of each
+task in the status directory so the processflow can track them individually.
+The worker stops taking new tasks once the allocation has less than the margin
+left of its walltime, so tasks arent started only to be killed at the time limit.
+It exits once the queue has been empty for the idle timeout, once it has stopped
+taking tasks and the running ones are done, or when the processflow leaves a
+stop file in the pack directory.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+def write_status(status_path, task_id, state, returncode=None):
+    """
+    Atomically write the state of a task, COMPLETED and FAILED are followed by the return code
+    """
+    contents = state if returncode is None else f'{state} {returncode}'
+    path = os.path.join(status_path, task_id)
+    with open(path + '.tmp', 'w') as fp:
+        fp.write(contents)
+    os.replace(path + '.tmp', path)
+# -----------------------------------------------
+
+
+def read_status(status_path, task_id):
+    """
+    Returns the state of a task and its return code, or (None, None) if it hasnt started
+    """
+    try:
+        with open(os.path.join(status_path, task_id), 'r') as fp:
+            parts = fp.read().split()
+    except (IOError, OSError):
+        return None, None
+    if not parts:
+        return None, None
+    return parts[0], int(parts[1]) if len(parts) > 1 else None
+# -----------------------------------------------
+
+
+def claim_next(queue_path, claimed_path):
+    """
+    Move the oldest task out of the queue, the rename makes sure only one
+    worker gets it
+
+    Returns:
+        the task id and task dict, or (None, None) if the queue is empty
+    """
+    for task_id in sorted(os.listdir(queue_path)):
+        if task_id.endswith('.tmp'):
+            continue
+        claimed = os.path.join(claimed_path, task_id)
+        try:
+            os.rename(os.path.join(queue_path, task_id), claimed)
+        except OSError:
+            # another worker got there first
+            continue
+        with open(claimed, 'r') as fp:
+            return task_id, json.load(fp)
+    return None, None
+# -----------------------------------------------
+
+
+def allocation_cores():
+    """
+    The cores the allocation was given on this node, which on a shared node
+    can be far fewer than the node has. Outside of slurm its the cores this
+    process is allowed to run on
+    """
+    try:
+        return max(1, int(os.environ['SLURM_CPUS_ON_NODE']))
+    except (KeyError, ValueError):
+        pass
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return os.cpu_count() or 1
+# -----------------------------------------------
+
+
+def default_slots(use_srun, cpus_per_task):
+    """
+    The number of tasks to run at once, sized to the cores in the allocation
+    """
+    nodes = int(os.environ.get('SLURM_JOB_NUM_NODES', 1)) if use_srun else 1
+    return max(1, nodes * allocation_cores() // cpus_per_task)
+# -----------------------------------------------
+
+
+def launch(task, use_srun, cpus_per_task):
+    """
+    Start a task, with its output going to the jobs console output path
+    """
+    cmd = ['bash', task['script']]
+    if use_srun:
+        cmd = ['srun', '--exclusive', '-N', '1', '-n', '1', '-c', str(cpus_per_task)] + cmd
+    with open(task['output'], 'w') as output:
+        return subprocess.Popen(cmd, stdout=output, stderr=subprocess.STDOUT)
+# -----------------------------------------------
+
+
+def run_worker(pack_path, slots=None, use_srun=False, cpus_per_task=1, idle_timeout=300,
+               poll=1.0, walltime=None, walltime_margin=600):
+    """
+    Run tasks from the pack queue until its been idle for idle_timeout seconds,
+    or until the allocation is too close to its time limit to start more
+
+    Parameters:
+        pack_path (str): the directory shared with the JobPacker
+        slots (int): the number of tasks to run at once, defaults to the cores in the allocation
+        use_srun (bool): launch tasks as srun job steps instead of local processes
+        cpus_per_task (int): the cores to give each task
+        idle_timeout (float): seconds to wait for new tasks before exiting
+        poll (float): seconds between checks of the queue
+        walltime (float): seconds the allocation has to run, None if it has no limit
+        walltime_margin (float): no new tasks are taken once less than this many seconds are left
+    """
+    queue_path = os.path.join(pack_path, 'queue')
+    claimed_path = os.path.join(pack_path, 'claimed')
+    status_path = os.path.join(pack_path, 'status')
+    stop_path = os.path.join(pack_path, 'stop')
+    if not slots:
+        slots = default_slots(use_srun, cpus_per_task)
+
+    running = dict()
+    idle_since = time.time()
+    deadline = None
+    if walltime:
+        deadline = idle_since + walltime
+        # a short allocation still gets to run something
+        walltime_margin = min(walltime_margin, walltime / 2)
+    while True:
+        for task_id, proc in list(running.items()):
+            returncode = proc.poll()
+            if returncode is None:
+                continue
+            state = 'COMPLETED' if returncode == 0 else 'FAILED'
+            write_status(status_path, task_id, state, returncode)
+            del running[task_id]
+
+        # leave the rest of the queue for the next allocation
+        draining = deadline is not None and deadline - time.time() < walltime_margin
+        while len(running) < slots and not draining:
+            task_id, task = claim_next(queue_path, claimed_path)
+            if task_id is None:
+                break
+            try:
+                running[task_id] = launch(task, use_srun, cpus_per_task)
+            except OSError as e:
+                print(f'unable to start {task_id}: {e}', file=sys.stderr)
+                write_status(status_path, task_id, 'FAILED', -1)
+                continue
+            write_status(status_path, task_id, 'RUNNING')
+
+        if running:
+            idle_since = time.time()
+        elif draining or os.path.exists(stop_path) or time.time() - idle_since > idle_timeout:
+            return
+        time.sleep(poll)
+# -----------------------------------------------
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run packed processflow jobs inside an allocation')
+    parser.add_argument('pack_path', help='The pack directory shared with the processflow')
+    parser.add_argument('--slots', type=int, help='Number of tasks to run at once')
+    parser.add_argument('--srun', action='store_true', help='Launch tasks as srun job steps')
+    parser.add_argument('--cpus-per-task', type=int, default=1, help='Cores to give each task')
+    parser.add_argument('--idle-timeout', type=float, default=300, help='Seconds to wait for new tasks before exiting')
+    parser.add_argument('--poll', type=float, default=1.0, help='Seconds between queue checks')
+    parser.add_argument('--walltime', type=float, help='Seconds the allocation has to run')
+    parser.add_argument('--walltime-margin', type=float, default=600, help='Stop taking new tasks once less than this many seconds are left')
+    args = parser.parse_args(argv)
+    run_worker(
+        pack_path=args.pack_path,
+        slots=args.slots,
+        use_srun=args.srun,
+        cpus_per_task=args.cpus_per_task,
+        idle_timeout=args.idle_timeout,
+        poll=args.poll,
+        walltime=args.walltime,
+        walltime_margin=args.walltime_margin)
+    return 0
+# -----------------------------------------------
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+
+from processflow.lib.jobstatus import JobStatus
+
+# bump this when the way jobs or the cache files are laid out changes,
+# caches written with a different version are thrown out
+PLAN_CACHE_VERSION = '1'
+
+# global options that only change how jobs are run and scheduled, not which
+# jobs there are, changing these doesnt throw away the cached plan
+SCHEDULING_KEYS = [
+    'debug', 'max_jobs', 'loop_delay', 'fixed_loop_delay', 'job_arrays',
+    'job_array_types', 'pack_jobs', 'pack_job_types', 'pack_partition',
+    'pack_nodes', 'pack_walltime', 'pack_cpus_per_task', 'pack_idle_timeout',
+    'pack_walltime_margin', 'pack_max_requeue',
+    'concurrent_submit', 'manager_concurrency', 'manager_timeout', 'priority',
+    'fair_share', 'resource_limits', 'predict_walltime', 'walltime_margin',
+    'history_path', 'slurm_rate', 'slurm_burst', 'slurm_failure_threshold',
+    'slurm_reset_timeout', 'cluster_ttl', 'log_path', 'plan_cache',
+    'plan_cache_interval', 'prevalidate_workers', 'prevalidate_limits', 'queue_depth',
+]
+
+
+def config_hash(config, version, exclude_types=None):
+    """
+    Hash the parts of the config that decide what the planned jobs are
+
+    Parameters:
+        config (dict): the global configuration object
+        version (str): the processflow version
+        exclude_types (list): data types to leave out, like the ones jobs
+            add to the config as they finish
+    Returns:
+        the hex digest of the hash
+    """
+    exclude_types = set(exclude_types or [])
+    planned = dict()
+    for section, values in config.items():
+        if section == 'global':
+            values = {x: y for x, y in values.items() if x not in SCHEDULING_KEYS}
+        elif section == 'data_types':
+            values = {x: y for x, y in values.items() if x not in exclude_types}
+        planned[section] = values
+    contents = json.dumps(planned, sort_keys=True, default=str)
+    return hashlib.sha256(
+        '{}:{}:{}'.format(PLAN_CACHE_VERSION, version, contents).encode('utf-8')).hexdigest()
+# -----------------------------------------------
+
+
+class PlanCache(object):
+    """
+    Keeps the planned jobs of a run between launches
+
+    The cases and their jobs, along with their dependencies, are pickled once
+    they have been planned. The ids of the jobs that have completed are kept
+    in a small JSON file next to it, each with a signature of the input files
+    the job reads and of its output directories. Both are keyed by a hash of
+    the config, so if the config or the processflow version changes the cache
+    is ignored and the plan is made again.
+
+    When the plan is loaded, a completed job is only taken as still complete
+    if its signature hasnt changed, any other job goes back to being checked
+    by postvalidate like it would in a new run.
+
+    Parameters:
+        path (str): where to keep the pickled plan, the completed jobs go in
+            a .json file with the same name
+        config (dict): the global configuration object
+        version (str): the processflow version
+        exclude_types (list): data types to leave out of the config hash
+        interval (float): the fewest seconds between writes of the completed jobs
+    """
+
+    def __init__(self, path, config, version, exclude_types=None, interval=300):
+        self._path = path
+        self._status_path = os.path.splitext(path)[0] + '.json'
+        self._config = config
+        self.key = config_hash(config, version, exclude_types)
+        self.interval = float(interval)
+        self._saved = None
+    # -----------------------------------------------
+
+    def load(self):
+        """
+        Load the cached plan
+
+        Returns:
+            the list of case dicts, or None if there is no usable cached plan
+        """
+        if not os.path.exists(self._path):
+            return None
+        try:
+            with open(self._path, 'rb') as fp:
+                key = pickle.load(fp)
+                if key != self.key:
+                    logging.info('The config has changed since the plan cache was written, planning again')
+                    return None
+                return pickle.load(fp)
+        except Exception as e:
+            logging.error(f'Unable to load the plan cache {self._path}: {e}')
+            return None
+    # -----------------------------------------------
+
+    def save(self, cases):
+        """
+        Write the planned cases and jobs out, and forget the jobs that completed under an earlier plan
+        """
+        def write(fp):
+            # the key goes first so a stale cache is found without unpickling the jobs
+            pickle.dump(self.key, fp, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(cases, fp, protocol=pickle.HIGHEST_PROTOCOL)
+
+        try:
+            self._atomic_write(self._path, write, mode='wb')
+            if os.path.exists(self._status_path):
+                os.remove(self._status_path)
+        except Exception as e:
+            logging.error(f'Unable to write the plan cache {self._path}: {e}')
+    # -----------------------------------------------
+
+    def load_completed(self):
+        """
+        Returns a dict of job id to signature for the jobs that had completed
+        the last time the cache was written
+        """
+        try:
+            with open(self._status_path, 'r') as fp:
+                state = json.load(fp)
+        except (OSError, ValueError):
+            return dict()
+        if state.get('key') != self.key:
+            return dict()
+        return state.get('completed', dict())
+    # -----------------------------------------------
+
+    def save_completed(self, jobs, filemanager, force=False):
+        """
+        Write out the ids and signatures of the completed jobs, at most once
+        every interval seconds unless force is set
+
+        Returns:
+            True if the file was written
+        """
+        now = time.monotonic()
+        if not force and self._saved is not None and now - self._saved < self.interval:
+            return False
+        self._saved = now
+        completed = {
+            job.id: self.signature(job, filemanager)
+            for job in jobs if job.status == JobStatus.COMPLETED
+        }
+        try:
+            self._atomic_write(self._status_path, lambda fp: json.dump({
+                'key': self.key,
+                'completed': completed,
+            }, fp))
+        except Exception as e:
+            logging.error(f'Unable to write the plan cache {self._status_path}: {e}')
+            return False
+        return True
+    # -----------------------------------------------
+
+    def signature(self, job, filemanager):
+        """
+        A fingerprint of the input files a job reads and of its output directories
+
+        The input files are the ones the file catalog has for the jobs data
+        types over its years, the same ones setup_data links in. The output
+        directories are fingerprinted by their modification times, which change
+        whenever a file in them is added, removed or renamed.
+        """
+        digest = hashlib.sha1()
+        cases = [job.case]
+        if job.comparison != 'obs':
+            cases.append(job.comparison)
+        if filemanager is not None:
+            for case in cases:
+                for datatype in job.data_required or []:
+                    datainfo = self._config['data_types'].get(datatype) or dict()
+                    monthly = datainfo.get('monthly') in [True, 'True'] or 'ts_' in datatype
+                    if monthly:
+                        paths = filemanager.get_file_paths_by_year(
+                            datatype=datatype,
+                            case=case,
+                            start_year=job.start_year,
+                            end_year=job.end_year)
+                    else:
+                        paths = filemanager.get_file_paths_by_year(
+                            datatype=datatype,
+                            case=case)
+                    digest.update('{}:{}:'.format(case, datatype).encode('utf-8'))
+                    for path in sorted(paths or []):
+                        digest.update(path.encode('utf-8') + b'\0')
+        for path in job._directories:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                mtime = None
+            digest.update('{}:{}\0'.format(path, mtime).encode('utf-8'))
+        return digest.hexdigest()
+    # -----------------------------------------------
+
+    @staticmethod
+    def _atomic_write(path, write, mode='w'):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, mode) as fp:
+            write(fp)
+        os.replace(tmp_path, path)
+    # -----------------------------------------------
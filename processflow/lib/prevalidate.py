@@ -0,0 +1,155 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+import contextlib
+import logging
+import os
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from tqdm import tqdm
+
+from processflow.lib.util import colors
+
+# the job types whose postvalidate opens every one of their output files, by
+# default only a few of these are checked at once so they dont swamp the filesystem
+DEFAULT_TYPE_LIMITS = {
+    'timeseries': 4,
+    'cmor': 2,
+}
+
+# the config of the worker processes, sent once when each worker starts
+_worker_config = None
+
+
+def _init_worker(config):
+    global _worker_config
+    _worker_config = config
+# -----------------------------------------------
+
+
+def _postvalidate(job):
+    """
+    Run the postvalidate of a job in a worker process
+
+    Postvalidate can change the job, like the variables a CMOR job has left
+    to run, so the state of the job is sent back along with the result. The
+    job is asked to check its files in this process, the pool is already
+    using every core
+
+    Returns:
+        whether the job had finished, and the attributes of the job afterwards
+    """
+    try:
+        with open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+            done = job.postvalidate(_worker_config, workers=1)
+    except Exception as e:
+        # the job is checked again the normal way when it comes up to run
+        logging.error(f'{job.msg_prefix()}: unable to check for existing output: {e}')
+        return False, None
+    return bool(done), job.__getstate__()
+# -----------------------------------------------
+
+
+def has_output_dirs(job):
+    """
+    Returns True if every directory of the job exists. They are made when the
+    job is first materialized, a job without them cant have run before
+    """
+    return all(os.path.exists(x) for x in job._directories)
+# -----------------------------------------------
+
+
+class BulkValidator(object):
+    """
+    Checks a large number of jobs for output from an earlier run all at once
+
+    The postvalidate of every job is run on a pool of worker processes, with
+    no more than the limit for each job type running at the same time. The
+    jobs of each type are handed to the pool in the order they are given, and
+    a type at its limit doesnt hold up the others. Jobs whose directories
+    dont exist yet are counted as unfinished without being checked.
+
+    Parameters:
+        config (dict): the global configuration object
+        workers (int): the number of worker processes, defaults to the number of cores
+        type_limits (dict): the most jobs of each type to check at once, types
+            that arent listed are only limited by the number of workers
+        executor (Executor): the pool to run the checks on, for tests
+    """
+
+    def __init__(self, config, workers=None, type_limits=None, executor=None):
+        self._config = config
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.type_limits = dict(DEFAULT_TYPE_LIMITS)
+        if type_limits:
+            self.type_limits.update({x: max(1, int(y)) for x, y in type_limits.items()})
+        self._executor = executor
+    # -----------------------------------------------
+
+    def run(self, jobs, progress=True):
+        """
+        Run postvalidate on all the jobs
+
+        Parameters:
+            jobs (list): the jobs to check
+            progress (bool): show a progress bar with how many have been found finished
+        Returns:
+            a list of the jobs that had already finished, in the order they were given
+        """
+        jobs = list(jobs)
+        to_check = [x for x in jobs if has_output_dirs(x)]
+        if not to_check:
+            return list()
+
+        executor = self._executor
+        if executor is None:
+            executor = ProcessPoolExecutor(
+                max_workers=min(self.workers, len(to_check)),
+                initializer=_init_worker,
+                initargs=(self._config,))
+        else:
+            _init_worker(self._config)
+
+        # a queue for each job type, so a type at its limit doesnt hold up the others
+        queues = dict()
+        for job in to_check:
+            queues.setdefault(job.job_type, deque()).append(job)
+        running = dict()
+        in_flight = dict()
+        done = set()
+        pbar = tqdm(total=len(to_check), disable=not progress,
+                    desc=f'{colors.OKGREEN}[+]{colors.ENDC} Checking for output from earlier runs')
+        try:
+            while queues or running:
+                # keep every worker busy, without going over any type limit
+                for job_type, queue in list(queues.items()):
+                    limit = self.type_limits.get(job_type)
+                    while queue and len(running) < self.workers * 2 \
+                            and (limit is None or in_flight.get(job_type, 0) < limit):
+                        job = queue.popleft()
+                        in_flight[job_type] = in_flight.get(job_type, 0) + 1
+                        running[executor.submit(_postvalidate, job)] = job
+                    if not queue:
+                        del queues[job_type]
+
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    job = running.pop(future)
+                    in_flight[job.job_type] -= 1
+                    try:
+                        complete, state = future.result()
+                    except Exception as e:
+                        logging.error(f'{job.msg_prefix()}: unable to check for existing output: {e}')
+                        complete, state = False, None
+                    if state is not None:
+                        job.__setstate__(state)
+                    if complete:
+                        done.add(job.id)
+                    pbar.update(1)
+                    pbar.set_postfix(finished=len(done))
+        finally:
+            pbar.close()
+            if self._executor is None:
+                executor.shutdown(cancel_futures=True)
+        return [x for x in jobs if x.id in done]
+    # -----------------------------------------------
@@ -0,0 +1,140 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+import heapq
+
+from collections import OrderedDict
+
+# the policies start_ready_jobs can order the ready jobs by
+POLICIES = ['critical_path', 'fifo']
+
+
+def year_span(job):
+    """
+    The default job cost, the number of simulated years the job covers
+    """
+    try:
+        return max(1, int(job.end_year) - int(job.start_year) + 1)
+    except (AttributeError, TypeError, ValueError):
+        return 1
+# -----------------------------------------------
+
+
+class JobPriority(object):
+    """
+    Orders ready jobs so the ones gating the most work are submitted first
+
+    Each job gets a critical path length, its own cost plus the longest chain of
+    costs through the jobs downstream of it, and a fan-out, the number of jobs
+    downstream of it. With the critical_path policy ready jobs are ordered by
+    critical path, then fan-out, then the order they were added; a climo that
+    holds up dozens of diags goes ahead of independent timeseries jobs. The fifo
+    policy keeps the order the jobs were added to the graph.
+
+    With fair_share turned on the ordered jobs are handed out across cases, the
+    next job always comes from the case with the fewest jobs running or already
+    picked, so one case with a long critical path cant take every slot.
+
+    Parameters:
+        graph (JobGraph): the built dependency graph
+        policy (str): one of POLICIES
+        fair_share (bool): spread submissions across cases
+        cost (function): takes a job and returns its estimated cost, defaults to year_span
+    """
+
+    def __init__(self, graph, policy='critical_path', fair_share=True, cost=None):
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown job priority policy {policy}, must be one of {POLICIES}')
+        self._graph = graph
+        self.policy = policy
+        self.fair_share = fair_share
+        self._cost = cost or year_span
+        self._critical_path = dict()
+        self._fan_out = dict()
+    # -----------------------------------------------
+
+    def critical_path(self, job_id):
+        """
+        The cost of the job plus the most costly chain of jobs downstream of it
+        """
+        if job_id not in self._critical_path:
+            self._walk(job_id)
+        return self._critical_path[job_id]
+    # -----------------------------------------------
+
+    def fan_out(self, job_id):
+        """
+        The number of jobs that directly or indirectly depend on the job
+        """
+        if job_id not in self._fan_out:
+            self._fan_out[job_id] = len(self._graph.downstream(job_id))
+        return self._fan_out[job_id]
+    # -----------------------------------------------
+
+    def _walk(self, job_id):
+        """
+        Fill in the critical path of the job and everything downstream of it,
+        children first, without recursing
+        """
+        stack = [(job_id, False)]
+        while stack:
+            current, expanded = stack.pop()
+            if current in self._critical_path:
+                continue
+            dependents = [x.id for x in self._graph.dependents(current)]
+            if not expanded:
+                stack.append((current, True))
+                stack.extend((x, False) for x in dependents if x not in self._critical_path)
+                continue
+            longest = max((self._critical_path[x] for x in dependents), default=0)
+            self._critical_path[current] = self._cost(self._graph.get(current)) + longest
+    # -----------------------------------------------
+
+    def key(self, job):
+        """
+        The sort key for a job, smaller goes first
+        """
+        return (-self.critical_path(job.id), -self.fan_out(job.id))
+    # -----------------------------------------------
+
+    def order(self, jobs, running=None):
+        """
+        Order a list of ready jobs for submission
+
+        Parameters:
+            jobs (list): the ready jobs, in the order they were added to the graph
+            running (list): the jobs currently running, used for the fair share
+        Returns:
+            the jobs in the order they should be submitted
+        """
+        if self.policy == 'critical_path':
+            # sorted is stable, so ties keep the order they were added in
+            jobs = sorted(jobs, key=self.key)
+        if not self.fair_share:
+            return list(jobs)
+
+        by_case = OrderedDict()
+        for job in jobs:
+            by_case.setdefault(job.case, list()).append(job)
+        if len(by_case) < 2:
+            return list(jobs)
+        load = {case: 0 for case in by_case}
+        for job in running or []:
+            if job.case in load:
+                load[job.case] += 1
+
+        # the case with the least load goes next, ties go to the case with the more important job
+        position = {job.id: idx for idx, job in enumerate(jobs)}
+        heap = list()
+        for idx, (case, case_jobs) in enumerate(by_case.items()):
+            heapq.heappush(heap, (load[case], position[case_jobs[0].id], idx, case))
+        ordered = list()
+        next_job = {case: 0 for case in by_case}
+        while heap:
+            case_load, _, idx, case = heapq.heappop(heap)
+            case_jobs = by_case[case]
+            ordered.append(case_jobs[next_job[case]])
+            next_job[case] += 1
+            if next_job[case] < len(case_jobs):
+                head = case_jobs[next_job[case]]
+                heapq.heappush(heap, (case_load + 1, position[head.id], idx, case))
+        return ordered
+    # -----------------------------------------------
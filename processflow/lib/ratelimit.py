@@ -0,0 +1,226 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+import asyncio
+import logging
+import threading
+import time
+
+# slurm errors that mean the controller itself is in trouble, as opposed to
+# a problem with the one request, like an unknown job id
+UNHEALTHY_ERRORS = [
+    'Socket timed out',
+    'Unable to contact slurm controller',
+    'Transport endpoint is not connected',
+    'Connection refused',
+    'Resource temporarily unavailable',
+    'Slurm temporarily unable to accept job',
+    'Zero Bytes were transmitted or received',
+]
+
+
+def is_unhealthy_error(err):
+    """
+    Returns True if the stderr of a slurm command says the controller is unhealthy
+    """
+    return any(x in (err or '') for x in UNHEALTHY_ERRORS)
+# -----------------------------------------------
+
+
+class SlurmUnavailable(Exception):
+    """
+    Raised instead of running a slurm command while the circuit breaker is open
+    """
+    pass
+# -----------------------------------------------
+
+
+class TokenBucket(object):
+    """
+    A token bucket rate limiter, shared by every slurm command
+
+    The bucket holds up to burst tokens and refills at rate tokens per second,
+    each command takes one token and waits for one if the bucket is empty. A
+    burst of commands can go out at once, but over time no more than rate
+    commands a second reach slurmctld. Safe to use from many threads and from
+    asyncio at the same time.
+
+    Parameters:
+        rate (float): tokens added per second, 0 or None turns the limit off
+        burst (int): the most tokens the bucket can hold
+        clock (function): returns the current time in seconds, for tests
+    """
+
+    def __init__(self, rate=10, burst=20, clock=time.monotonic):
+        self.rate = float(rate or 0)
+        self.burst = max(1, int(burst))
+        self._clock = clock
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+    # -----------------------------------------------
+
+    def _reserve(self):
+        """
+        Take a token, returns how many seconds the caller has to wait before using it
+        """
+        if not self.rate:
+            return 0
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # the token is taken right away, so waiters queue up in order
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+    # -----------------------------------------------
+
+    def acquire(self):
+        """
+        Block until a token is available
+
+        Returns:
+            how many seconds were spent waiting
+        """
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+    # -----------------------------------------------
+
+    async def aacquire(self):
+        """
+        The asyncio version of acquire
+        """
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+    # -----------------------------------------------
+
+
+class CircuitBreaker(object):
+    """
+    Stops slurm commands from being run while the controller is unhealthy
+
+    The breaker starts closed, and every command is let through. After
+    failure_threshold failures in a row it opens, and commands are refused
+    with SlurmUnavailable for reset_timeout seconds. After that it is half
+    open, a single command is let through as a probe, if it succeeds the
+    breaker closes again, if it fails the breaker opens for twice as long,
+    up to max_timeout.
+
+    Parameters:
+        failure_threshold (int): failures in a row before the breaker opens
+        reset_timeout (float): seconds to stay open before letting a probe through
+        max_timeout (float): the longest the breaker stays open at a time
+        on_change (function): called with the new state whenever it changes
+        clock (function): returns the current time in seconds, for tests
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, max_timeout=600,
+                 on_change=None, clock=time.monotonic):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.max_timeout = float(max_timeout)
+        self.on_change = on_change
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._timeout = self.reset_timeout
+        self._opened = None
+        self._probing = False
+        self._lock = threading.Lock()
+    # -----------------------------------------------
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened >= self._timeout:
+                return self.HALF_OPEN
+            return self._state
+    # -----------------------------------------------
+
+    @property
+    def is_open(self):
+        """
+        True while commands are being refused
+        """
+        return self.state == self.OPEN
+    # -----------------------------------------------
+
+    @property
+    def retry_in(self):
+        """
+        Seconds until a probe command will be let through, 0 if the breaker isnt open
+        """
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0
+            return max(0, self._timeout - (self._clock() - self._opened))
+    # -----------------------------------------------
+
+    def allow(self):
+        """
+        Returns True if a command can be run now, when half open only the
+        first caller gets to run its command as the probe
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if self._clock() - self._opened < self._timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probing = False
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+    # -----------------------------------------------
+
+    def check(self, name='slurm'):
+        """
+        Raise SlurmUnavailable if a command cant be run now
+        """
+        if not self.allow():
+            raise SlurmUnavailable(
+                f'{name} not run, the slurm controller is unhealthy, retrying in {self.retry_in:.0f} seconds')
+    # -----------------------------------------------
+
+    def record_success(self):
+        with self._lock:
+            changed = self._state != self.CLOSED
+            self._state = self.CLOSED
+            self._failures = 0
+            self._timeout = self.reset_timeout
+            self._probing = False
+        if changed:
+            logging.info('The slurm controller is responding again')
+            self._notify(self.CLOSED)
+    # -----------------------------------------------
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN:
+                # the probe failed, back off for longer
+                self._timeout = min(self._timeout * 2, self.max_timeout)
+            elif self._state == self.OPEN or self._failures < self.failure_threshold:
+                return
+            self._state = self.OPEN
+            self._opened = self._clock()
+            self._probing = False
+            timeout = self._timeout
+        logging.error(f'The slurm controller is unhealthy, pausing slurm commands for {timeout:.0f} seconds')
+        self._notify(self.OPEN)
+    # -----------------------------------------------
+
+    def _notify(self, state):
+        if self.on_change is not None:
+            self.on_change(state)
+    # -----------------------------------------------
@@ -0,0 +1,315 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+import logging
+import shlex
+
+
+def parse_memory(value):
+    """
+    Parse a slurm style memory request (e.g. 4000, 500M, 16G) into megabytes
+    """
+    value = str(value).strip().upper()
+    units = {'K': 1 / 1024, 'M': 1, 'G': 1024, 'T': 1024 * 1024}
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(float(value))
+# -----------------------------------------------
+
+
+def parse_tres(value):
+    """
+    Parse a slurm TRES string like cpu=256,mem=500G,node=8 into a dict with
+    the keys cores, memory (megabytes) and nodes, leaving out anything not set
+    """
+    limits = dict()
+    for item in str(value or '').split(','):
+        if '=' not in item:
+            continue
+        key, amount = item.split('=', 1)
+        try:
+            if key == 'cpu':
+                limits['cores'] = int(amount)
+            elif key == 'node':
+                limits['nodes'] = int(amount)
+            elif key == 'mem':
+                limits['memory'] = parse_memory(amount)
+        except ValueError:
+            continue
+    return limits
+# -----------------------------------------------
+
+
+class ResourceRequest(object):
+    """
+    The nodes, cores and memory a job asks for
+
+    Parameters:
+        nodes (int): the number of nodes
+        cores (int): the total number of cores across all the nodes
+        memory (int): the total megabytes of memory, 0 if the job didnt ask for any
+        partition (str): the partition the job asked for, None for the default
+        exclusive (bool): the job wants its nodes to itself
+    """
+
+    def __init__(self, nodes=1, cores=1, memory=0, partition=None, exclusive=False):
+        self.nodes = nodes
+        self.cores = cores
+        self.memory = memory
+        self.partition = partition
+        self.exclusive = exclusive
+    # -----------------------------------------------
+
+    @classmethod
+    def from_args(cls, sargs):
+        """
+        Build a request from a list of slurm arguments, like a jobs manager args
+
+        Parameters:
+            sargs (list): slurm arguments, e.g. ['-N 1', '-c 4', '--mem=8G']
+        """
+        args = list()
+        for item in sargs or []:
+            args.extend(shlex.split(str(item).replace('=', ' ', 1)))
+        nodes = 1
+        ntasks = 1
+        cpus_per_task = 1
+        mem_per_node = 0
+        mem_per_cpu = 0
+        partition = None
+        exclusive = False
+        for idx, arg in enumerate(args):
+            value = args[idx + 1] if idx + 1 < len(args) else None
+            try:
+                if arg in ['-N', '--nodes'] and value:
+                    # a range like 2-4 gets the smallest size
+                    nodes = int(value.split('-')[0])
+                elif arg in ['-n', '--ntasks'] and value:
+                    ntasks = int(value)
+                elif arg in ['-c', '--cpus-per-task'] and value:
+                    cpus_per_task = int(value)
+                elif arg == '--mem' and value:
+                    mem_per_node = parse_memory(value)
+                elif arg == '--mem-per-cpu' and value:
+                    mem_per_cpu = parse_memory(value)
+                elif arg in ['-p', '--partition'] and value:
+                    partition = value.split(',')[0]
+                elif arg == '--exclusive':
+                    exclusive = True
+            except ValueError:
+                logging.error(f'Unable to parse the slurm argument {arg} {value}')
+        cores = max(ntasks * cpus_per_task, 1)
+        memory = mem_per_node * nodes if mem_per_node else mem_per_cpu * cores
+        return cls(nodes=max(nodes, 1), cores=cores, memory=memory,
+                   partition=partition, exclusive=exclusive)
+    # -----------------------------------------------
+
+    def __repr__(self):
+        return (f'ResourceRequest(nodes={self.nodes}, cores={self.cores}, '
+                f'memory={self.memory}, partition={self.partition})')
+    # -----------------------------------------------
+
+
+class Partition(object):
+    """
+    The size of a slurm partition
+
+    Parameters:
+        name (str): the partition name
+        nodes (int): the number of usable nodes
+        cores_per_node (int): the cores on each node
+        memory_per_node (int): the megabytes of memory on each node
+    """
+
+    def __init__(self, name, nodes, cores_per_node, memory_per_node):
+        self.name = name
+        self.nodes = nodes
+        self.cores_per_node = cores_per_node
+        self.memory_per_node = memory_per_node
+    # -----------------------------------------------
+
+    @property
+    def cores(self):
+        return self.nodes * self.cores_per_node
+    # -----------------------------------------------
+
+    @property
+    def memory(self):
+        return self.nodes * self.memory_per_node
+    # -----------------------------------------------
+
+
+class ResourcePool(object):
+    """
+    Admits jobs against the capacity of each partition and the users limits
+
+    Each pass starts from the requests of the jobs already queued and admits
+    new requests for as long as they fit. A job has to fit in whats left of the
+    cores, memory and nodes of its partition, and in the users job, node, core
+    and memory limits. A job that could never fit, even on an empty partition,
+    is let through so slurm can decide what to do with it instead of it
+    blocking forever.
+
+    When the partitions come with how busy they are (PartitionInfos from
+    sinfo), a job also has to fit in the idle cores, and the idle nodes if it
+    wants whole nodes, that are left once the jobs admitted since that lookup
+    are taken out. Jobs that dont are only admitted while fewer than
+    queue_depth of the users jobs are already waiting on the partition, so
+    theres always something queued for when room opens up, without piling
+    jobs into a full partition. sinfo doesnt say how much memory is free, so
+    memory is only checked against the size of the partition.
+
+    Parameters:
+        partitions (list): the Partitions of the cluster
+        default_partition (str): the partition jobs that dont ask for one go to
+        limits (dict): the users limits, any of max_jobs, nodes, cores and memory
+        queue_depth (int): how many jobs can wait for a partition with no idle room
+    """
+
+    def __init__(self, partitions, default_partition=None, limits=None, queue_depth=1):
+        self.partitions = {x.name: x for x in partitions}
+        self.default_partition = default_partition or (partitions[0].name if partitions else None)
+        self.limits = dict(limits or {})
+        self.queue_depth = queue_depth
+        self._used = dict()
+        self._total = dict()
+        self._jobs = 0
+        # what was admitted since the partitions were last looked up, per partition
+        self._idle_taken = dict()
+        # the jobs waiting for room on each partition
+        self._waiting = dict()
+    # -----------------------------------------------
+
+    def set_partitions(self, partitions, default_partition=None):
+        """
+        Replace the partitions with their latest sizes and idle counts, e.g.
+        after nodes were drained or jobs finished
+        """
+        if not partitions:
+            return
+        self.partitions = {x.name: x for x in partitions}
+        self.default_partition = default_partition or self.default_partition
+        self._idle_taken = dict()
+    # -----------------------------------------------
+
+    @property
+    def max_jobs(self):
+        return self.limits.get('max_jobs')
+    # -----------------------------------------------
+
+    def _cost(self, request):
+        """
+        Returns the partition name and the nodes, cores and memory the request takes up on it
+        """
+        name = request.partition or self.default_partition
+        partition = self.partitions.get(name)
+        cores = request.cores
+        memory = request.memory
+        if partition is not None:
+            if request.exclusive:
+                cores = max(cores, request.nodes * partition.cores_per_node)
+                memory = max(memory, request.nodes * partition.memory_per_node)
+        # only jobs that want whole nodes keep others off them
+        whole_nodes = request.nodes if request.exclusive else 0
+        return name, {'nodes': request.nodes, 'cores': cores, 'memory': memory,
+                      'whole_nodes': whole_nodes}
+    # -----------------------------------------------
+
+    @staticmethod
+    def _empty():
+        return {'nodes': 0, 'cores': 0, 'memory': 0, 'whole_nodes': 0}
+    # -----------------------------------------------
+
+    def reset(self, running=None, waiting=None):
+        """
+        Start a new pass, with the given requests already queued
+
+        Parameters:
+            running (list): the ResourceRequests of the queued jobs, running or not
+            waiting (list): the ResourceRequests of the queued jobs that havent started yet
+        """
+        self._used = dict()
+        self._total = self._empty()
+        self._jobs = 0
+        for request in running or []:
+            self._take(*self._cost(request))
+        self._waiting = dict()
+        for request in waiting or []:
+            name = request.partition or self.default_partition
+            self._waiting[name] = self._waiting.get(name, 0) + 1
+    # -----------------------------------------------
+
+    def _take(self, name, cost):
+        used = self._used.setdefault(name, self._empty())
+        for key, amount in cost.items():
+            used[key] += amount
+            self._total[key] += amount
+        self._jobs += 1
+    # -----------------------------------------------
+
+    def _fits_idle(self, name, cost):
+        """
+        Returns True if the cost fits in the idle part of the partition, or if
+        its not known how busy the partition is
+        """
+        partition = self.partitions.get(name)
+        if partition is None or getattr(partition, 'idle_cores', None) is None:
+            return True
+        taken = self._idle_taken.get(name, self._empty())
+        if taken['cores'] + cost['cores'] > partition.idle_cores:
+            return False
+        if cost['whole_nodes'] or cost['nodes'] > 1:
+            return taken['nodes'] + cost['nodes'] <= partition.idle_nodes
+        return True
+    # -----------------------------------------------
+
+    def fits(self, request):
+        """
+        Returns True if the request fits in whats left of its partition and the users limits
+        """
+        name, cost = self._cost(request)
+        if self.max_jobs and self._jobs >= self.max_jobs:
+            return False
+
+        for key in ['nodes', 'cores', 'memory']:
+            limit = self.limits.get(key)
+            if limit and cost[key] <= limit and self._total.get(key, 0) + cost[key] > limit:
+                return False
+
+        partition = self.partitions.get(name)
+        if partition is None:
+            return True
+        if cost['nodes'] > partition.nodes or cost['cores'] > partition.cores \
+                or (partition.memory and cost['memory'] > partition.memory):
+            # it would never fit
+            return True
+        used = self._used.get(name, self._empty())
+        if used['cores'] + cost['cores'] > partition.cores:
+            return False
+        if cost['memory'] and partition.memory \
+                and used['memory'] + cost['memory'] > partition.memory:
+            return False
+        if cost['whole_nodes'] and used['whole_nodes'] + cost['whole_nodes'] > partition.nodes:
+            return False
+        if not self._fits_idle(name, cost) and self._waiting.get(name, 0) >= self.queue_depth:
+            return False
+        return True
+    # -----------------------------------------------
+
+    def admit(self, request):
+        """
+        Take the resources for a request if it fits
+
+        Returns:
+            True if the request was admitted
+        """
+        if not self.fits(request):
+            return False
+        name, cost = self._cost(request)
+        if self._fits_idle(name, cost):
+            taken = self._idle_taken.setdefault(name, self._empty())
+            for key, amount in cost.items():
+                taken[key] += amount
+        else:
+            self._waiting[name] = self._waiting.get(name, 0) + 1
+        self._take(name, cost)
+        return True
+    # -----------------------------------------------
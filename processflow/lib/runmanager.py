@@ -1,5 +1,8 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
-from time import sleep
+import logging
+import os
+
+from time import time
 
 from processflow.jobs.aprime import Aprime
 from processflow.jobs.timeseries import Timeseries
@@ -12,10 +15,23 @@ from processflow.jobs.mpasanalysis import MPASAnalysis
 from processflow.jobs.regrid import Regrid
 from processflow.jobs.ilamb import ILAMB
 
+from processflow.lib.aioslurm import AsyncSlurm
+from processflow.lib.history import RuntimeHistory, parse_elapsed
+from processflow.lib.jobarray import JobArrayBatcher, DEFAULT_ARRAY_TYPES
+from processflow.lib.jobgraph import JobGraph
 from processflow.lib.jobstatus import JobStatus, StatusMap, ReverseMap
-from processflow.lib.serial import Serial
+from processflow.lib.loopcontrol import LoopControl
+from processflow.lib.packing import JobPacker, DEFAULT_PACK_TYPES
+from processflow.lib.plancache import PlanCache
+from processflow.lib.prevalidate import BulkValidator
+from processflow.lib.priority import JobPriority
+from processflow.lib.ratelimit import SlurmUnavailable
+from processflow.lib.resources import ResourcePool
+from processflow.lib.localmanager import LocalManager
 from processflow.lib.slurm import Slurm
+from processflow.lib.statewriter import JobStateWriter
 from processflow.lib.util import print_line, print_debug
+from processflow.version import __version__
 
 
 job_map = {
@@ -49,93 +65,288 @@ class RunManager(object):
         """
         self.cases = list()
 
+        # every job in every case, indexed by id along with its dependency edges
+        self.graph = JobGraph()
+        # (case, job type, start, end, run type, comparison) of every job, to leave out duplicates
+        self._job_keys = set()
+        # orders the ready jobs for submission, set up once the graph is built
+        self._priority = None
+        self._state_writers = dict()
+
         self.running_jobs = list()
+        # job id -> [submit time, start time] of the running jobs
+        self._timing = dict()
+        # job states looked up while submitting, used by the next monitor_running_jobs
+        self._polled_infos = None
         self._job_total = 0
         self._job_complete = 0
+        # ids of the jobs prevalidate_jobs found hadnt finished, so they arent checked again
+        self._unfinished = set()
+
+        # controls the wait between main loop passes, any thread can call
+        # self.loop_control.notify() to wake the main loop up early, jobs
+        # being submitted, completing or failing do
+        self.loop_control = LoopControl(
+            max_delay=config['global'].get('loop_delay') or 10,
+            adaptive=not config['global'].get('fixed_loop_delay'))
+        self.graph.on_change = self.loop_control.notify
 
         if config['global'].get('serial'):
-            msg = '\n\n=== Running in Serial Mode ===\n'
+            # jobs run as local processes, as many at once as the machine has room for
+            self.manager = LocalManager(
+                cores=config['global'].get('local_cores'),
+                memory=config['global'].get('local_memory'),
+                max_jobs=config['global'].get('max_jobs'),
+                cores_per_job=config['global'].get('local_cores_per_job', 1),
+                on_change=self.loop_control.notify)
+            msg = '\n\n=== Running in Local Mode with {} job slots ===\n'.format(
+                self.manager.get_node_number())
             print_line(msg)
-            self.manager = Serial()
         else:
-            self.manager = Slurm()
+            # every slurm command shares one rate limit, and a circuit breaker
+            # that stops them while the controller is unhealthy
+            slurm_args = {
+                'rate': config['global'].get('slurm_rate', 10),
+                'burst': config['global'].get('slurm_burst', 20),
+                'failure_threshold': config['global'].get('slurm_failure_threshold', 5),
+                'reset_timeout': config['global'].get('slurm_reset_timeout', 30),
+                'cluster_ttl': config['global'].get('cluster_ttl', 60),
+            }
+            if config['global'].get('concurrent_submit'):
+                self.manager = AsyncSlurm(
+                    max_concurrency=config['global'].get('manager_concurrency', 8),
+                    timeout=config['global'].get('manager_timeout', 60),
+                    **slurm_args)
+            else:
+                self.manager = Slurm(**slurm_args)
+            self.manager.breaker.on_change = lambda state: self.loop_control.notify(
+                f'slurm circuit breaker {state}')
+
+        # jobs of these types are collected each pass and submitted as slurm job arrays
+        self._array_batcher = None
+        self._array_types = list()
+        if config['global'].get('job_arrays') and isinstance(self.manager, Slurm):
+            self._array_types = config['global'].get('job_array_types', DEFAULT_ARRAY_TYPES)
+            if not isinstance(self._array_types, list):
+                self._array_types = [self._array_types]
+            self._array_batcher = JobArrayBatcher(
+                manager=self.manager,
+                scripts_path=os.path.join(
+                    config['global']['project_path'], 'output', 'scripts'))
+
+        # jobs of these types are run inside a shared allocation instead of their own
+        self._packer = None
+        self._pack_types = list()
+        if config['global'].get('pack_jobs') and isinstance(self.manager, Slurm):
+            self._pack_types = config['global'].get('pack_job_types', DEFAULT_PACK_TYPES)
+            if not isinstance(self._pack_types, list):
+                self._pack_types = [self._pack_types]
+            slurm_args = list()
+            if self.account:
+                slurm_args.append(f'-A {self.account}')
+            if config['global'].get('pack_partition'):
+                slurm_args.append(f"-p {config['global']['pack_partition']}")
+            self._packer = JobPacker(
+                manager=self.manager,
+                pack_path=os.path.join(
+                    config['global']['project_path'], 'output', 'packing'),
+                nodes=config['global'].get('pack_nodes', 1),
+                walltime=config['global'].get('pack_walltime', '0-02:00'),
+                cpus_per_task=config['global'].get('pack_cpus_per_task', 1),
+                idle_timeout=int(config['global'].get('pack_idle_timeout', 300)),
+                walltime_margin=int(config['global'].get('pack_walltime_margin', 600)),
+                max_requeue=int(config['global'].get('pack_max_requeue', 2)),
+                slurm_args=slurm_args)
+
+        # admits jobs against the free and idle cores, memory and nodes of their
+        # partition and the users limits, instead of only counting them
+        self._resource_pool = None
+        if isinstance(self.manager, Slurm) and config['global'].get('resource_limits', True):
+            partitions, default_partition = self.manager.get_partitions()
+            if partitions:
+                self._resource_pool = ResourcePool(
+                    partitions=partitions,
+                    default_partition=default_partition,
+                    limits=self.manager.get_user_limits(),
+                    queue_depth=int(config['global'].get('queue_depth', 1)))
+                msg = 'Scheduling against {} partitions with {} cores, user limits {}'.format(
+                    len(partitions),
+                    sum(x.cores for x in partitions),
+                    self._resource_pool.limits or 'none')
+                print_line(msg)
+
+        # how long finished jobs took, used to ask for tighter walltimes
+        self._history = RuntimeHistory(
+            database=config['global'].get('history_path') or os.path.join(
+                config['global']['project_path'], 'output', 'history.db'),
+            config=config,
+            margin=config['global'].get('walltime_margin', 1.5))
+        self._predict_walltime = config['global'].get('predict_walltime', True)
+
+        # the planned jobs are kept between launches, and reused while the config stays the same
+        self._plan_cache = None
+        if config['global'].get('plan_cache', True):
+            self._plan_cache = PlanCache(
+                path=os.path.join(
+                    config['global']['project_path'], 'output', 'plan_cache.pickle'),
+                config=config,
+                version=__version__,
+                exclude_types=filemanager.derived_types if filemanager else None,
+                interval=config['global'].get('plan_cache_interval', 300))
 
         max_jobs = config['global'].get('max_jobs', 1)
-        self.max_running_jobs = max_jobs if max_jobs else self.manager.get_node_number()
-        while self.max_running_jobs == 0:
-            sleep(1)
-            msg = 'Unable to communication with scontrol, checking again'
-            print_line(msg)
-            self.max_running_jobs = self.manager.get_node_number()
-    # -----------------------------------------------
-
-    def _duplicate_check(self, job):
-        """
-        iterate over all the jobs and check if the input job is already in the list
-
-        Parameters
-        ----------
-            job (Job): The job to check for duplicates
-        Returns
-        -------
-            True if there is a duplicate
-            False if there is NO duplicate
-        """
-        case = [x for x in self.cases if x['case'] == job.case].pop()
-        if case:
-            for other_job in case['jobs']:
-                if job.job_type == other_job.job_type \
-                        and job.start_year == other_job.start_year \
-                        and job.end_year == other_job.end_year:
-                    if job.run_type:
-                        if job.run_type == other_job.run_type:
-                            return True
-                    else:
-                        if job.comparison and job.comparison == other_job.comparison:
-                            return True
-            return False
+        # when True the number of jobs follows the number of usable nodes
+        self._node_limited = False
+        if max_jobs:
+            self.max_running_jobs = max_jobs
+        elif self._resource_pool:
+            # the pool decides how many jobs fit
+            self.max_running_jobs = self._resource_pool.max_jobs or float('inf')
+        else:
+            self._node_limited = True
+            cluster = getattr(self.manager, 'cluster', None)
+            if cluster is not None and cluster.nodes:
+                self.max_running_jobs = self._node_capacity(cluster)
+            else:
+                self.max_running_jobs = self.manager.get_node_number()
+            if not self.max_running_jobs:
+                msg = 'Unable to look up the size of the cluster, running one job at a time until it is known'
+                print_line(msg, status='err')
+                self.max_running_jobs = 1
     # -----------------------------------------------
 
-    def add_pp_type_to_cases(self, freqs, job_type, start, end, case, run_type=None):
+    def _update_capacity(self):
+        """
+        Pick up changes in the size of the cluster, like drained or returned
+        nodes. The cluster info is cached, so sinfo only runs once its ttl is up
+        """
+        cluster = getattr(self.manager, 'cluster', None)
+        if cluster is None or not cluster.refresh():
+            return
+        if self._resource_pool:
+            self._resource_pool.set_partitions(cluster.partitions, cluster.default_partition)
+        elif self._node_limited and cluster.nodes:
+            capacity = self._node_capacity(cluster)
+            if capacity != self.max_running_jobs:
+                logging.info(f'The cluster has {cluster.idle_nodes} of {cluster.nodes} usable nodes idle, running up to {capacity} jobs')
+            self.max_running_jobs = capacity
+    # -----------------------------------------------
+
+    def _node_capacity(self, cluster):
+        """
+        How many jobs to keep queued when each one gets a node: the ones already
+        running, one for each idle node, and at least one waiting for the next
+        node to free up, never more than the cluster has nodes
+        """
+        on_nodes = sum(1 for x in self.running_jobs
+                       if self.graph.get(x['job_id']).status == JobStatus.RUNNING)
+        return min(cluster.nodes, on_nodes + max(cluster.idle_nodes, 1))
+    # -----------------------------------------------
+
+    @property
+    def submission_paused(self):
+        """
+        True while the slurm circuit breaker is open, no jobs are submitted or
+        looked up until it closes but everything else carries on
+        """
+        breaker = getattr(self.manager, 'breaker', None)
+        return breaker is not None and breaker.is_open
+    # -----------------------------------------------
+
+    @staticmethod
+    def _job_key(spec):
         """
-        Add post processing jobs to the case.jobs list
+        The fields that make two planned jobs the same job
+        """
+        return (spec['case'], spec['job_type'], spec['start'], spec['end'],
+                spec.get('run_type'), spec.get('comparison'))
+    # -----------------------------------------------
+
+    @staticmethod
+    def job_windows(freqs, start, end):
+        """
+        The first and last year of every job window, a job of each frequency
+        starts every freq years from the first year and the last one is cut
+        short at the end of the simulation
+
+        Parameters:
+            freqs (list): the year lengths of the windows
+            start (int): the first year of simulated data
+            end (int): the last year of simulated data
+        Returns:
+            a list of (start, end) tuples, ordered by start year then by frequency
+        """
+        windows = list()
+        for idx, freq in enumerate(freqs):
+            freq = int(freq)
+            for year in range(start, end + 1, freq):
+                windows.append((year, idx, min(year + freq - 1, end)))
+        windows.sort()
+        return [(year, job_end) for year, _, job_end in windows]
+    # -----------------------------------------------
+
+    def _add_job(self, case, job):
+        """
+        Add a job to its case and to the dependency graph
+        """
+        case['jobs'].append(job)
+        self.graph.add_job(job)
+    # -----------------------------------------------
+
+    def _add_planned(self, case, spec):
+        """
+        Create the job for a planned job spec and add it to its case, unless
+        the same job is already there
+
+        Returns:
+            the new job, or None if it was a duplicate
+        """
+        key = self._job_key(spec)
+        if key in self._job_keys:
+            return None
+        self._job_keys.add(key)
+        kwargs = {x: y for x, y in spec.items() if x != 'job_type' and y is not None}
+        job = job_map[spec['job_type']](
+            dryrun=self.config['global'].get('dryrun'),
+            config=self.config,
+            manager=self.manager,
+            **kwargs)
+        self._add_job(case, job)
+        return job
+    # -----------------------------------------------
+
+    def plan_pp_type(self, freqs, job_type, start, end, case, run_type=None):
+        """
+        Plan the post processing jobs of one type for a case
 
         Parameters:
             freqs (list, int, None): the year length frequency to add this job
             job_type (str): what type of job to add
             start (int): the first year of simulated data
             end (int): the last year of simulated data
-            data_type (str): what type of data to run this job on (regrid atm or lnd only)
             case (dict): the case to add this job to
-            """
+            run_type (str): what type of data to run this job on
+        Returns:
+            a list of job specs, the keyword arguments for the job class along with its job_type
+        """
         if not freqs:
             freqs = end - start + 1
         if not isinstance(freqs, list):
             freqs = [freqs]
-
-        for year in range(start, end + 1):
-            for freq in freqs:
-                freq = int(freq)
-                if (year - start) % freq == 0:
-                    job_end = year + freq - 1
-                    if job_end > end:
-                        job_end = end
-                    new_job = job_map[job_type](
-                        short_name=case['short_name'],
-                        case=case['case'],
-                        start=year,
-                        end=job_end,
-                        dryrun=self.config['global'].get('dryrun'),
-                        run_type=run_type,
-                        config=self.config,
-                        manager=self.manager)
-                    if not self._duplicate_check(new_job):
-                        case['jobs'].append(new_job)
+        return [{
+            'job_type': job_type,
+            'short_name': case['short_name'],
+            'case': case['case'],
+            'start': year,
+            'end': job_end,
+            'run_type': run_type,
+        } for year, job_end in self.job_windows(freqs, start, end)]
     # -----------------------------------------------
 
-    def add_diag_type_to_cases(self, freqs, job_type, start, end, case):
+    def plan_diag_type(self, freqs, job_type, start, end, case):
         """
-        Add diagnostic jobs to the case.jobs list
+        Plan the diagnostic jobs of one type for a case, one for each of its
+        comparisons in every window
 
         Parameters:
             freqs (list): a list of year lengths to add this job for
@@ -143,145 +354,152 @@ class RunManager(object):
             start (int): the first year of simulated data
             end (int): the last year of simulated data
             case (dict): the case to add this job to
+        Returns:
+            a list of job specs, the keyword arguments for the job class along with its job_type
         """
         if not isinstance(freqs, list):
             freqs = [freqs]
 
         case_name = case['case']
+        # get the comparisons from the config
+        comparisons = self.config['simulations'][case_name].get('comparisons')
+        if not comparisons:
+            return list()
+        if not isinstance(comparisons, list):
+            comparisons = [comparisons]
+        if job_type in ['aprime', 'mpas_analysis']:
+            comparisons = ['obs']
 
-        for year in range(start, end + 1):
-            for freq in freqs:
-                freq = int(freq)
-                if (year - start) % freq == 0:
-
-                    # get the comparisons from the config
-                    comparisons = self.config['simulations'][case_name].get(
-                        'comparisons')
-                    if not comparisons:
-                        continue
-                    if not isinstance(comparisons, list):
-                        comparisons = [comparisons]
-
-                    if job_type in ['aprime', 'mpas_analysis']:
-                        comparisons = ['obs']
-                    job_end = year + freq - 1
-                    if job_end > end:
-                        job_end = end
-                    # for each comparison, add a job to this case
-                    for item in comparisons:
-                        if item == 'all':
-                            for other_case in self.config['simulations']:
-
-                                if other_case in ['start_year', 'end_year', case_name]:
-                                    continue
-
-                                new_diag = job_map[job_type](
-                                    short_name=case['short_name'],
-                                    case=case_name,
-                                    start=year,
-                                    end=job_end,
-                                    comparison=other_case,
-                                    config=self.config,
-                                    dryrun=self.config['global'].get('dryrun'),
-                                    manager=self.manager)
-                                if not self._duplicate_check(new_diag):
-                                    case['jobs'].append(new_diag)
-                            new_diag = job_map[job_type](
-                                short_name=case['short_name'],
-                                case=case_name,
-                                start=year,
-                                end=job_end,
-                                comparison='obs',
-                                config=self.config,
-                                dryrun=self.config['global'].get('dryrun'),
-                                manager=self.manager)
-                            if not self._duplicate_check(new_diag):
-                                case['jobs'].append(new_diag)
-                        else:
-                            new_diag = job_map[job_type](
-                                short_name=case['short_name'],
-                                case=case_name,
-                                start=year,
-                                end=job_end,
-                                dryrun=self.config['global'].get('dryrun'),
-                                comparison=item,
-                                config=self.config,
-                                manager=self.manager)
-                            if not self._duplicate_check(new_diag):
-                                case['jobs'].append(new_diag)
+        expanded = list()
+        for item in comparisons:
+            if item == 'all':
+                expanded.extend(
+                    x for x in self.config['simulations']
+                    if x not in ['start_year', 'end_year', case_name])
+                expanded.append('obs')
+            else:
+                expanded.append(item)
+
+        return [{
+            'job_type': job_type,
+            'short_name': case['short_name'],
+            'case': case_name,
+            'start': year,
+            'end': job_end,
+            'comparison': comparison,
+        } for year, job_end in self.job_windows(freqs, start, end) for comparison in expanded]
     # -----------------------------------------------
 
-    def setup_cases(self):
+    def add_pp_type_to_cases(self, freqs, job_type, start, end, case, run_type=None):
         """
-        Setup each case with all the jobs it will need
+        Add post processing jobs to the case.jobs list, see plan_pp_type
+        """
+        for spec in self.plan_pp_type(freqs, job_type, start, end, case, run_type=run_type):
+            self._add_planned(case, spec)
+    # -----------------------------------------------
+
+    def add_diag_type_to_cases(self, freqs, job_type, start, end, case):
+        """
+        Add diagnostic jobs to the case.jobs list, see plan_diag_type
+        """
+        for spec in self.plan_diag_type(freqs, job_type, start, end, case):
+            self._add_planned(case, spec)
+    # -----------------------------------------------
+
+    def plan_cases(self):
+        """
+        Work out every job each case needs, without creating any of them
+
+        Returns:
+            a list of (case, job spec) tuples in the order the jobs are added,
+            with duplicates left out
         """
         start = self.config['simulations']['start_year']
         end = self.config['simulations']['end_year']
-        for case in self.config['simulations']:
-            if case in ['start_year', 'end_year']:
-                continue
-            self.cases.append({
-                'case': case,
-                'short_name': self.config['simulations'][case]['short_name'],
-                'jobs': list()
-            })
+        cases = self.cases or [{
+            'case': case,
+            'short_name': self.config['simulations'][case]['short_name'],
+            'jobs': list()
+        } for case in self.config['simulations'] if case not in ['start_year', 'end_year']]
 
+        def wanted(case, key, field):
+            job_types = self.config['simulations'][case['case']].get(field)
+            return job_types and ('all' in job_types or key in job_types)
+
+        plan = list()
         pp = self.config.get('post-processing')
         if pp:
             for key, val in list(pp.items()):
-                cases_to_add = list()
-                for case in self.cases:
-                    if not self.config['simulations'][case['case']].get('job_types'):
-                        continue
-                    if 'all' in self.config['simulations'][case['case']]['job_types'] or key in self.config['simulations'][case['case']]['job_types']:
-                        cases_to_add.append(case)
+                cases_to_add = [x for x in cases if wanted(x, key, 'job_types')]
                 if key in ['regrid', 'timeseries']:
                     for dtype in val:
                         if dtype not in self.config['data_types']:
                             continue
                         for case in cases_to_add:
-                            if 'all' in self.config['simulations'][case['case']]['data_types'] or dtype in self.config['simulations'][case['case']]['data_types']:
-                                self.add_pp_type_to_cases(
+                            if wanted(case, dtype, 'data_types'):
+                                plan.extend((case, x) for x in self.plan_pp_type(
                                     freqs=val.get('run_frequency'),
                                     job_type=key,
                                     start=start,
                                     end=end,
                                     run_type=dtype,
-                                    case=case)
+                                    case=case))
                 elif key == 'cmor':
                     for case in cases_to_add:
                         for table in ['Amon', 'Lmon', 'SImon', 'Omon']:
                             if self.config['post-processing']['cmor'].get(table):
-                                self.add_pp_type_to_cases(
+                                plan.extend((case, x) for x in self.plan_pp_type(
                                     freqs=val.get('run_frequency'),
                                     job_type=key,
                                     start=start,
                                     end=end,
                                     run_type=table,
-                                    case=case)
+                                    case=case))
                 else:
                     for case in cases_to_add:
-                        self.add_pp_type_to_cases(
+                        plan.extend((case, x) for x in self.plan_pp_type(
                             freqs=val.get('run_frequency'),
                             job_type=key,
                             start=start,
                             end=end,
-                            case=case)
+                            case=case))
         diags = self.config.get('diags')
         if diags:
             for key, val in list(diags.items()):
-                # cases_to_add = list()
-                for case in self.cases:
-                    if not self.config['simulations'][case['case']].get('job_types'):
-                        continue
-
-                    if 'all' in self.config['simulations'][case['case']]['job_types'] or key in self.config['simulations'][case['case']]['job_types']:
-                        self.add_diag_type_to_cases(
-                            freqs=diags[key]['run_frequency'],
+                for case in cases:
+                    if wanted(case, key, 'job_types'):
+                        plan.extend((case, x) for x in self.plan_diag_type(
+                            freqs=val['run_frequency'],
                             job_type=key,
                             start=start,
                             end=end,
-                            case=case)
+                            case=case))
+
+        seen = set(self._job_keys)
+        unique = list()
+        for case, spec in plan:
+            key = self._job_key(spec)
+            if key not in seen:
+                seen.add(key)
+                unique.append((case, spec))
+        return unique
+    # -----------------------------------------------
+
+    def setup_cases(self):
+        """
+        Setup each case with all the jobs it will need
+        """
+        for case in self.config['simulations']:
+            if case in ['start_year', 'end_year']:
+                continue
+            self.cases.append({
+                'case': case,
+                'short_name': self.config['simulations'][case]['short_name'],
+                'jobs': list()
+            })
+
+        for case, spec in self.plan_cases():
+            self._add_planned(case, spec)
 
         self._job_total = 0
         for case in self.cases:
@@ -303,123 +521,412 @@ class RunManager(object):
                 else:
                     job.setup_dependencies(
                         jobs=case['jobs'])
+        self._build_graph()
+    # -----------------------------------------------
+
+    def setup_plan(self):
+        """
+        Setup the cases and their jobs, reusing the cached plan from an earlier
+        launch if the config hasnt changed since, otherwise planning them with
+        setup_cases and setup_jobs and caching the result
+
+        Returns:
+            True if the plan came from the cache
+        """
+        if self._plan_cache:
+            cases = self._plan_cache.load()
+            if cases is not None:
+                self._restore_plan(cases)
+                return True
+        self.setup_cases()
+        self.setup_jobs()
+        if self._plan_cache:
+            self._plan_cache.save(self.cases)
+        return False
+    # -----------------------------------------------
+
+    def _restore_plan(self, cases):
+        """
+        Put the cases and jobs from the plan cache in place. The jobs that
+        had completed are marked complete again, unless their input files or
+        output directories have changed since, in which case they are left
+        for postvalidate to check like in a new run. The completion handlers
+        of the restored jobs are run again, since the derived data types and
+        files they add to the catalog arent part of the cache
+        """
+        completed = self._plan_cache.load_completed()
+        self.cases = cases
+        restored = list()
+        for case in self.cases:
+            for job in case['jobs']:
+                job._manager = self.manager
+                self._job_keys.add(self._job_key({
+                    'case': job.case,
+                    'job_type': job.job_type,
+                    'start': job.start_year,
+                    'end': job.end_year,
+                    'run_type': job.run_type,
+                    'comparison': job.comparison if isinstance(job, Diag) else None,
+                }))
+                self.graph.add_job(job)
+                signature = completed.get(job.id)
+                if signature is not None \
+                        and signature == self._plan_cache.signature(job, self.filemanager):
+                    job.status = JobStatus.COMPLETED
+                    restored.append(job)
+                else:
+                    job.status = JobStatus.VALID
+        for job in restored:
+            job.materialize(self.config)
+            job.handle_completion(
+                filemanager=self.filemanager,
+                config=self.config)
+            if job.status != JobStatus.COMPLETED:
+                # the handler didnt find its outputs, check it again like in a new run
+                job.status = JobStatus.VALID
+        restored = len([x for x in restored if x.status == JobStatus.COMPLETED])
+        self._build_graph()
+        self._job_total = sum(len(case['jobs']) for case in self.cases)
+        self._job_complete = restored
+        msg = 'Loaded {} jobs from the plan cache, {} are still complete'.format(
+            self._job_total, restored)
+        print_line(msg)
+        logging.info(msg)
+    # -----------------------------------------------
+
+    def _build_graph(self):
+        """
+        Wire up the dependency graph once every job and its dependencies are known
+        """
+        self.graph.build()
+        self._priority = JobPriority(
+            graph=self.graph,
+            policy=self.config['global'].get('priority') or 'critical_path',
+            fair_share=self.config['global'].get('fair_share', True))
     # -----------------------------------------------
 
     def check_data_ready(self):
         """
         Loop over all jobs, checking if their data is ready, and setting
         the internal job.data_ready variable
+
+        Returns:
+            the number of jobs whose data became ready during this check
         """
+        newly_ready = 0
         for case in self.cases:
             for job in case['jobs']:
+                if job.data_ready:
+                    continue
                 job.check_data_ready(self.filemanager)
+                if job.data_ready:
+                    newly_ready += 1
+        return newly_ready
+    # -----------------------------------------------
+
+    def prevalidate_jobs(self):
+        """
+        Before scheduling starts, check every job whose data is ready for
+        output left by an earlier run, all at once on a pool of worker processes
+        instead of one at a time as each job comes up to run. The jobs that had
+        already finished are marked complete, the rest arent checked again.
+
+        Returns:
+            the number of jobs found to have finished
+        """
+        workers = self.config['global'].get('prevalidate_workers')
+        if workers is not None and int(workers) == 0:
+            return 0
+        self.check_data_ready()
+        candidates = [x for x in self.graph.jobs()
+                      if x.status == JobStatus.VALID and x.data_ready]
+        if not candidates:
+            return 0
+
+        validator = BulkValidator(
+            config=self.config,
+            workers=workers,
+            type_limits=self.config['global'].get('prevalidate_limits'))
+        msg = 'Checking {} jobs for output from earlier runs with {} workers'.format(
+            len(candidates), min(validator.workers, len(candidates)))
+        print_line(msg)
+        finished = validator.run(candidates)
+
+        for job in finished:
+            job.materialize(self.config)
+            job.status = JobStatus.COMPLETED
+            self._job_complete += 1
+            job.handle_completion(
+                filemanager=self.filemanager,
+                config=self.config)
+            self.graph.mark_completed(job.id)
+        finished_ids = set(x.id for x in finished)
+        self._unfinished.update(x.id for x in candidates if x.id not in finished_ids)
+        if finished:
+            self.report_completed_job()
+        return len(finished)
     # -----------------------------------------------
 
     def start_ready_jobs(self):
         """
         Loop over the list of jobs for each case, first setting up the data for, and then
         submitting each job to the queue
+
+        Returns:
+            the number of jobs that were submitted or found to be already complete
         """
-        for case in self.cases:
-            for job in case['jobs']:
-                if job.status != JobStatus.VALID:
-                    continue
-                if len(self.running_jobs) >= self.max_running_jobs:
-                    msg = 'running {} of {} jobs, waiting for queue to shrink'.format(
-                        len(self.running_jobs), self.max_running_jobs)
-                    if self.debug:
-                        print_line(msg)
-                    return
-                deps_ready = True
-                for depjobid in job.depends_on:
-                    depjob = self.get_job_by_id(depjobid)
-                    if depjob.status != JobStatus.COMPLETED:
-                        deps_ready = False
-                        break
-
-                # if 'ilamb' in job.msg_prefix():
-                #     import ipdb; ipdb.set_trace()
-                job.check_data_ready(self.filemanager)
-                if deps_ready and job.data_ready:
+        started = 0
+        concurrent = isinstance(self.manager, AsyncSlurm)
+        # jobs finished by an earlier run are still picked up while slurm is unavailable
+        paused = self.submission_paused
+        if paused:
+            msg = 'Slurm is unavailable, pausing job submission for {:.0f} seconds'.format(
+                self.manager.breaker.retry_in)
+            print_line(msg, status='err')
+        # jobs whose scripts are submitted all at once after the loop
+        to_submit = list()
+        if not paused:
+            self._update_capacity()
+        ready = self.graph.ready_jobs()
+        if self._priority:
+            running = [self.graph.get(x['job_id']) for x in self.running_jobs]
+            ready = self._priority.order(ready, running=running)
+        if self._resource_pool:
+            # packed jobs run inside the packed allocation, not on their own
+            queued = [
+                self.graph.get(x['job_id']) for x in self.running_jobs
+                if x['manager_id'] != 0 and not JobPacker.is_task_id(x['manager_id'])]
+            self._resource_pool.reset(
+                running=[x.get_resources() for x in queued],
+                waiting=[x.get_resources() for x in queued if x.status == JobStatus.PENDING])
+        for job in ready:
+            if job.status != JobStatus.VALID:
+                continue
+            num_running = len(self.running_jobs) + len(to_submit)
+            if self._array_batcher:
+                num_running += len(self._array_batcher)
+            if num_running >= self.max_running_jobs:
+                msg = 'running {} of {} jobs, waiting for queue to shrink'.format(
+                    num_running, self.max_running_jobs)
+                if self.debug:
+                    print_line(msg)
+                break
 
-                    # if the job was finished by a previous run of the processflow
+            job.check_data_ready(self.filemanager)
+            if not job.data_ready:
+                continue
+            # jobs only create their directories and resolve their args once
+            # they are about to be looked at, not when the plan is made
+            job.materialize(self.config)
 
-                    if job.postvalidate(self.config):
-                        job.status = JobStatus.COMPLETED
-                        self._job_complete += 1
-                        job.handle_completion(
-                            filemanager=self.filemanager,
-                            config=self.config)
-                        self.report_completed_job()
-                        continue
+            # if the job was finished by a previous run of the processflow
+            if job.id not in self._unfinished and job.postvalidate(self.config):
+                job.status = JobStatus.COMPLETED
+                self._job_complete += 1
+                job.handle_completion(
+                    filemanager=self.filemanager,
+                    config=self.config)
+                self.graph.mark_completed(job.id)
+                self.report_completed_job()
+                started += 1
+                continue
+            if paused:
+                continue
+
+            packed = self._packer is not None and job.job_type in self._pack_types
+            arrayed = self._array_batcher is not None and job.job_type in self._array_types
+            if self._resource_pool and not packed \
+                    and not self._resource_pool.admit(job.get_resources()):
+                # leave it for a later pass, smaller jobs behind it may still fit
+                continue
 
-                    # set to pending before data setup so we dont double submit
-                    job.status = JobStatus.PENDING
+            # set to pending before data setup so we dont double submit
+            job.status = JobStatus.PENDING
 
-                    # setup the data needed for the job
+            # setup the data needed for the job
+            job.setup_data(
+                config=self.config,
+                filemanager=self.filemanager,
+                case=job.case)
+            # if this job needs data from another case, set that up too
+            if isinstance(job, Diag):
+                if job.comparison != 'obs':
                     job.setup_data(
                         config=self.config,
                         filemanager=self.filemanager,
-                        case=job.case)
-                    # if this job needs data from another case, set that up too
-                    if isinstance(job, Diag):
-                        if job.comparison != 'obs':
-                            job.setup_data(
-                                config=self.config,
-                                filemanager=self.filemanager,
-                                case=job.comparison)
-
-                    # get the instances of jobs this job is dependent on
-                    dep_jobs = [self.get_job_by_id(
-                        job_id) for job_id in job._depends_on]
-                    run_id = job.execute(
-                        config=self.config,
-                        dryrun=self.dryrun,
-                        depends_jobs=dep_jobs)
-                    self.running_jobs.append({
-                        'manager_id': run_id,
-                        'job_id': job.id
-                    })
-                    if run_id == 0:
-                        job.status = JobStatus.COMPLETED
-                        self.monitor_running_jobs()
-                        
+                        case=job.comparison)
+
+            if self._predict_walltime:
+                minutes = self._history.predict_walltime(job)
+                if minutes and job.set_walltime(minutes):
+                    logging.info(f'{job.msg_prefix()}: walltime set to {minutes:.0f} minutes from the runtime history')
+
+            # get the instances of jobs this job is dependent on
+            dep_jobs = [self.get_job_by_id(
+                job_id) for job_id in job._depends_on]
+            if packed or arrayed or concurrent:
+                job._defer_submit = True
+            try:
+                run_id = job.execute(
+                    config=self.config,
+                    dryrun=self.dryrun,
+                    depends_jobs=dep_jobs)
+                if packed and run_id is None and job._pending_script:
+                    run_id = self._packer.submit(job)
+            except SlurmUnavailable as e:
+                # the breaker opened during this pass, put the job back for later
+                logging.error(str(e))
+                job._defer_submit = False
+                job.status = JobStatus.VALID
+                self.graph.requeue(job.id)
+                paused = True
+                continue
+            if arrayed and run_id is None and job._pending_script:
+                # the job will be submitted as part of an array below
+                self._array_batcher.add(job)
+                continue
+            elif run_id is None and job._pending_script:
+                # the job will be submitted along with the rest below
+                to_submit.append(job)
+                continue
+            job._defer_submit = False
+            if run_id == 0 and job._has_been_executed:
+                # sbatch failed, put the job back so its picked up again next pass
+                msg = f'{job.msg_prefix()}: job submission failed, will try again'
+                print_line(msg, status='err')
+                job.status = JobStatus.VALID
+                self.graph.requeue(job.id)
+                continue
+            self._add_running(job, run_id)
+            started += 1
+            if run_id == 0:
+                job.status = JobStatus.COMPLETED
+                self.monitor_running_jobs()
+
+        # only the jobs that made it into the queue count, so failed
+        # submissions back off the same as an idle pass
+        if self._array_batcher and len(self._array_batcher):
+            started += self._submit_arrays()
+        if to_submit:
+            started += self._submit_concurrently(to_submit)
+        return started
+    # -----------------------------------------------
+
+    def _add_running(self, job, manager_id):
+        """
+        Start tracking a submitted job
+        """
+        self.running_jobs.append({
+            'manager_id': manager_id,
+            'job_id': job.id
+        })
+        # submit time and start time, for the runtime history
+        self._timing[job.id] = [time(), None]
+        self.loop_control.notify(f'{job.id} submitted')
+    # -----------------------------------------------
+
+    def _record_runtime(self, job, job_info=None):
+        """
+        Add a finished job to the runtime history, using the elapsed time slurm
+        reports if there is one, otherwise the time since the job was seen to start
+        """
+        submitted, started = self._timing.pop(job.id, (None, None))
+        runtime = parse_elapsed(job_info.time) if job_info is not None else None
+        if runtime is None and started is not None:
+            runtime = time() - started
+        if runtime is None or submitted is None:
+            return
+        state = {
+            JobStatus.COMPLETED: 'COMPLETED',
+            JobStatus.TIMEOUT: 'TIMEOUT',
+            JobStatus.CANCELLED: 'CANCELLED',
+        }.get(job.status, 'FAILED')
+        self._history.record(
+            job=job,
+            runtime=runtime,
+            state=state,
+            queue_wait=started - submitted if started is not None else None,
+            walltime=job.get_walltime())
+    # -----------------------------------------------
+
+    def _submit_concurrently(self, jobs):
+        """
+        Submit the run scripts of all the given jobs at once, looking up the
+        state of the running jobs at the same time
+
+        Returns:
+            the number of jobs that were submitted
+        """
+        manager_ids = [x['manager_id'] for x in self.running_jobs
+                       if x['manager_id'] != 0 and not JobPacker.is_task_id(x['manager_id'])]
+        for job in jobs:
+            msg = f'{job.msg_prefix()}: Job ready, submitting to queue'
+            print_line(msg)
+        new_ids, job_infos = self.manager.submit_and_poll(
+            [job._pending_script for job in jobs], manager_ids)
+        if job_infos is not None:
+            self._polled_infos = (set(str(x) for x in manager_ids), job_infos)
+
+        submitted = 0
+        for job, manager_id in zip(jobs, new_ids):
+            job._pending_script = None
+            job._defer_submit = False
+            if not manager_id:
+                # put the job back so its picked up again next pass
+                msg = f'{job.msg_prefix()}: job submission failed, will try again'
+                print_line(msg, status='err')
+                job.status = JobStatus.VALID
+                self.graph.requeue(job.id)
+                continue
+            job._job_id = manager_id
+            job._has_been_executed = True
+            self._add_running(job, manager_id)
+            submitted += 1
+        return submitted
+    # -----------------------------------------------
+
+    def _submit_arrays(self):
+        """
+        Submit all the jobs collected during this pass as job arrays, and start
+        tracking each array task as its own running job
+
+        Returns:
+            the number of jobs that were submitted
+        """
+        submitted = 0
+        for job, manager_id in self._array_batcher.flush():
+            if not manager_id:
+                # put the job back so its picked up again next pass
+                msg = f'{job.msg_prefix()}: job array submission failed, will try again'
+                print_line(msg, status='err')
+                job.status = JobStatus.VALID
+                self.graph.requeue(job.id)
+                continue
+            self._add_running(job, manager_id)
+            submitted += 1
+        return submitted
     # -----------------------------------------------
 
     def get_job_by_id(self, jobid):
-        for case in self.cases:
-            for job in case['jobs']:
-                if job.id == jobid:
-                    return job
-        raise Exception(f"no job with id {jobid} found")
+        return self.graph.get(jobid)
     # -----------------------------------------------
 
     def write_job_sets(self, path):
-        out_str = ''
-        with open(path, 'w') as fp:
-            for case in self.cases:
-                out_str += '\n==' + '='*len(case['case']) + '==\n'
-                out_str += '# {} #\n'.format(case['case'])
-                out_str += '==' + '='*len(case['case']) + '==\n'
-                for job in case['jobs']:
-                    out_str += '\n\tname: ' + job.job_type
-                    out_str += '\n\tperiod: {:04d}-{:04d}'.format(
-                        job.start_year, job.end_year)
-                    if job._run_type:
-                        out_str += '\n\trun_type: ' + job._run_type
-                    out_str += '\n\tstatus: ' + job.status.name
-                    deps_jobs = [self.get_job_by_id(x) for x in job.depends_on]
-                    if deps_jobs:
-                        out_str += '\n\tdependent_on: ' + str(
-                            ['{}'.format(x.msg_prefix()) for x in deps_jobs])
-                    out_str += '\n\tdata_ready: ' + str(job.data_ready)
-                    out_str += '\n\tprocessflow_id: ' + job.id
-                    out_str += '\n\tmanager_id: ' + str(job.job_id)
-                    if case['jobs'].index(job) != len(case['jobs']) - 1:
-                        out_str += '\n------------------------------------'
-                    else:
-                        out_str += '\n'
-            fp.write(out_str)
+        """
+        Write the state of all the jobs out to the given path, along with a
+        JSON-lines log of job state changes next to it. Nothing is written if
+        no jobs have changed since the last call
+        """
+        writer = self._state_writers.get(path)
+        if writer is None:
+            writer = JobStateWriter(
+                path=path,
+                jsonl_path=os.path.splitext(path)[0] + '.jsonl')
+            self._state_writers[path] = writer
+        written = writer.write(self.cases, self.graph.get)
+        if self._plan_cache and written:
+            self._plan_cache.save_completed(self.graph.jobs(), self.filemanager)
+        return written
     # -----------------------------------------------
 
     def _precheck(self, year_set, jobtype, data_type=None):
@@ -456,8 +963,39 @@ class RunManager(object):
         run post-completion handlers for any jobs that have failed or completed.
 
         Any new jobs that are started are added to the self.running_jobs list
+
+        Returns:
+            the number of jobs that changed state
         """
+        changed = 0
         for_removal = list()
+
+        # look up every tracked job with one batched call to the resource manager
+        manager_ids = [x['manager_id'] for x in self.running_jobs if x['manager_id'] != 0]
+        task_ids = list()
+        if self._packer:
+            task_ids = [x for x in manager_ids if JobPacker.is_task_id(x)]
+            manager_ids = [x for x in manager_ids if not JobPacker.is_task_id(x)]
+        try:
+            job_infos = dict()
+            if self._polled_infos is not None:
+                # these were looked up while new jobs were being submitted
+                polled_ids, job_infos = self._polled_infos
+                self._polled_infos = None
+                manager_ids = [x for x in manager_ids if str(x) not in polled_ids]
+            if manager_ids:
+                job_infos.update(self.manager.showjobs(manager_ids))
+            if task_ids:
+                job_infos.update(self._packer.showjobs(task_ids))
+        except SlurmUnavailable as e:
+            logging.error(str(e))
+            return changed
+        except Exception as e:
+            msg = 'Unable to get job status from the resource manager, checking again later'
+            print_line(msg, status='err')
+            print_debug(e)
+            return changed
+
         for item in self.running_jobs:
             # each item is a mapping of job UUIDs to the id given by the resource manager
             job = self.get_job_by_id(item['job_id'])
@@ -465,22 +1003,22 @@ class RunManager(object):
             # if the job ID is 0 it means it was previously run
             if item['manager_id'] == 0:
                 self._job_complete += 1
+                changed += 1
                 for_removal.append(item)
                 job.handle_completion(
                     filemanager=self.filemanager,
                     config=self.config)
+                self.graph.mark_completed(job.id)
                 self.report_completed_job()
                 continue
-            try:
-                job_info = self.manager.showjob(item['manager_id'])
-                if job_info.state is None:
-                    continue
-            except Exception as e:
-                
-                print_debug(e)
-                # if the job is old enough it wont be in the slurm list anymore
-                # which will throw an exception
+            job_info = job_infos.get(str(item['manager_id']))
+            if job_info is not None and job_info.state is None:
+                continue
+            if job_info is None:
+                # neither the queue nor the accounting database know the job, e.g. accounting
+                # is turned off, so the only way to tell how it went is to look at its output
                 self._job_complete += 1
+                changed += 1
                 for_removal.append(item)
 
                 if job.postvalidate(self.config):
@@ -488,11 +1026,14 @@ class RunManager(object):
                     job.handle_completion(
                         filemanager=self.filemanager,
                         config=self.config)
+                    self.graph.mark_completed(job.id)
                     self.report_completed_job()
                 else:
                     job.status = JobStatus.FAILED
                     line = f"{job.msg_prefix()}: resource manager lookup error for jobid {item['manager_id']}. The job may have failed, check the error output"
                     print_line(line)
+                    self.graph.mark_failed(job.id)
+                self._record_runtime(job)
                 continue
 
             status = StatusMap[job_info.state]
@@ -505,15 +1046,22 @@ class RunManager(object):
                     s2=ReverseMap[status])
                 print_line(msg)
                 job.status = status
+                changed += 1
+                if status == JobStatus.RUNNING and job.id in self._timing:
+                    self._timing[job.id][1] = self._timing[job.id][1] or time()
 
                 if job.status == JobStatus.FAILED:
                     msg = f'Job has failed, check the job output here: {job.get_output_path()}\n'
                     print_line(msg, status='error')
 
-                if status in [JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED]:
+                if status in [JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED, JobStatus.TIMEOUT]:
                     self._job_complete += 1
 
-                    if not job.postvalidate(self.config):
+                    # the final state is exact, so only a job slurm says succeeded
+                    # needs its output checked
+                    if status != JobStatus.COMPLETED:
+                        logging.info(f'{job.msg_prefix()}: finished as {job_info.state} with exit code {job_info.exit_code}')
+                    elif not job.postvalidate(self.config):
                         job.status = JobStatus.FAILED
                         status = JobStatus.FAILED
                         msg = f'Job has failed, check the job output here: {job.get_output_path()}\n'
@@ -522,28 +1070,36 @@ class RunManager(object):
                         job.handle_completion(
                             filemanager=self.filemanager,
                             config=self.config)
+                    if job_info.max_rss is not None:
+                        logging.info(f'{job.msg_prefix()}: peak memory {job_info.max_rss}MB')
                     self.report_completed_job()
+                    self._record_runtime(job, job_info)
                     for_removal.append(item)
-                    if status in [JobStatus.FAILED, JobStatus.CANCELLED]:
-                        for depjob in self.get_jobs_that_depend(job.id):
-                            depjob.status = JobStatus.FAILED
+                    if status in [JobStatus.FAILED, JobStatus.CANCELLED, JobStatus.TIMEOUT]:
+                        self.graph.mark_failed(job.id)
+                    elif job.status == JobStatus.COMPLETED:
+                        self.graph.mark_completed(job.id)
         if for_removal:
             self.running_jobs = [
                 x for x in self.running_jobs if x not in for_removal]
-        return
+        return changed
+    # -----------------------------------------------
+
+    def shutdown(self):
+        """
+        Release any resources held for the run, like the packed job allocation
+        """
+        if self._packer:
+            self._packer.close()
+        if self._plan_cache and len(self.graph):
+            self._plan_cache.save_completed(self.graph.jobs(), self.filemanager, force=True)
     # -----------------------------------------------
 
     def get_jobs_that_depend(self, job_id):
         """
         returns a list of all jobs that depend on the give job
         """
-        jobs = list()
-        for case in self.cases:
-            for job in case['jobs']:
-                for depid in job.depends_on:
-                    if depid == job_id:
-                        jobs.append(job)
-        return jobs
+        return self.graph.dependents(job_id)
     # -----------------------------------------------
 
     def is_all_done(self):
@@ -562,7 +1118,7 @@ class RunManager(object):
             for job in case['jobs']:
                 if job.status in [JobStatus.VALID, JobStatus.PENDING, JobStatus.RUNNING]:
                     return -1
-                if job.status in [JobStatus.FAILED, JobStatus.CANCELLED]:
+                if job.status in [JobStatus.FAILED, JobStatus.CANCELLED, JobStatus.TIMEOUT]:
                     failed = True
         if failed:
             return 0
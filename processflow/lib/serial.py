@@ -52,14 +52,23 @@ class Serial(object):
         out, err = proc.communicate()
         if err:
             print(err)
+        self.jobs[-1].state = 'COMPLETED' if proc.returncode == 0 else 'FAILED'
         return self.job_id
     # -----------------------------------------------
 
     def showjob(self, jobid):
-        jobs = [job for job in self.jobs if job.job_id == jobid]
+        jobs = [job for job in self.jobs if str(job.jobid) == str(jobid)]
         return jobs[0] if jobs else None
     # -----------------------------------------------
 
+    def showjobs(self, jobids):
+        """
+        Returns a dict mapping each of the given job ids (as a str) to its JobInfo
+        """
+        jobids = [str(x) for x in jobids]
+        return {str(job.jobid): job for job in self.jobs if str(job.jobid) in jobids}
+    # -----------------------------------------------
+
     def get_node_number(self, queue='acme'):
         return 1
     # -----------------------------------------------
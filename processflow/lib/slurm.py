@@ -1,26 +1,98 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
+import getpass
 import logging
 import os
+import re
 
 from subprocess import Popen, PIPE
 from time import sleep
 
+from processflow.lib.clusterinfo import ClusterInfo
 from processflow.lib.jobinfo import JobInfo
+from processflow.lib.ratelimit import CircuitBreaker, SlurmUnavailable, TokenBucket, is_unhealthy_error
+from processflow.lib.resources import parse_memory, parse_tres
 from processflow.lib.util import print_debug, print_line
 
 
+# what sbatch prints to stdout once a job has been queued, whatever it writes to stderr
+SUBMITTED_PATTERN = re.compile(r'Submitted batch job (\d+)')
+
+
+def parse_exit_code(value):
+    """
+    Parse a sacct ExitCode like 0:0 or 1:0 (exit status:signal) into a single
+    int, the signal number if the job was killed by one, or None if it cant be parsed
+    """
+    try:
+        status, _, signum = str(value).strip().partition(':')
+        status = int(status)
+        signum = int(signum) if signum else 0
+    except ValueError:
+        return None
+    return signum if signum else status
+# -----------------------------------------------
+
+
 class Slurm(object):
     """
     A python interface for slurm using subprocesses
+
+    Every slurm command goes through a shared token bucket, so no more than
+    rate commands a second reach slurmctld, and a circuit breaker, so once the
+    controller stops answering commands are refused with SlurmUnavailable
+    until it has had time to recover.
+
+    Parameters:
+        rate (float): the most slurm commands to run per second, 0 for no limit
+        burst (int): how many commands can run back to back before the rate applies
+        failure_threshold (int): failed commands in a row before the breaker opens
+        reset_timeout (float): seconds the breaker stays open before trying again
+        cluster_ttl (float): seconds the partition sizes from sinfo are cached for
     """
 
-    def __init__(self):
+    # the most job ids to put into a single squeue or sacct call
+    QUERY_CHUNK_SIZE = 500
+    # how many times a submission that hit a controller error is tried
+    SUBMIT_TRIES = 3
+
+    def __init__(self, rate=10, burst=20, failure_threshold=5, reset_timeout=30, cluster_ttl=60):
         """
         Check if the system has Slurm installed
         """
         if not any(os.access(os.path.join(path, 'sinfo'), os.X_OK) for path in os.environ["PATH"].split(os.pathsep)):
             raise Exception(
                 'Unable to find slurm, is it installed on this system?')
+        self.limiter = TokenBucket(rate=rate, burst=burst)
+        self.breaker = CircuitBreaker(
+            failure_threshold=failure_threshold,
+            reset_timeout=reset_timeout)
+        self.cluster = ClusterInfo(self._run, ttl=cluster_ttl)
+    # -----------------------------------------------
+
+    def _call(self, cmd):
+        """
+        Run a slurm command through the rate limiter and circuit breaker
+
+        Returns:
+            the return code, stdout and stderr of the command
+        Raises:
+            SlurmUnavailable if the breaker is open, OSError if the command cant be run
+        """
+        self.breaker.check(cmd[0])
+        self.limiter.acquire()
+        try:
+            proc = Popen(cmd, shell=False, stderr=PIPE, stdout=PIPE)
+            out, err = proc.communicate()
+        except OSError:
+            self.breaker.record_failure()
+            raise
+        out = out.decode('utf-8')
+        err = err.decode('utf-8')
+        if is_unhealthy_error(err):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return proc.returncode, out, err
     # -----------------------------------------------
 
     def batch(self, cmd, sargs=None):
@@ -31,12 +103,14 @@ class Slurm(object):
             cmd (str): The path to the run script that should be submitted
             sargs (str): The additional arguments to pass to slurm
         Returns:
-            job id of the new job (int)
+            job id of the new job (int), or 0 if the submission failed
         """
         try:
             out, err = self._submit('sbatch', cmd, sargs)
+        except SlurmUnavailable as e:
+            logging.error(str(e))
+            return 0
         except Exception as e:
-            import ipdb; ipdb.set_trace()
             print('Batch job submission failed')
             print_debug(e)
             return 0
@@ -57,30 +131,51 @@ class Slurm(object):
     # -----------------------------------------------
 
     def _submit(self, subtype, cmd, sargs=None):
+        """
+        Run the submission, trying again while slurm reports controller errors
 
+        Once stdout says the job was submitted anything on stderr is only a
+        warning. Otherwise the submission may still have gone through, so the
+        queue is checked for the script before each retry and before giving up
+        """
+        script = cmd
         cmd = [subtype, cmd, sargs] if sargs is not None else [subtype, cmd]
-        tries = 0
-        while tries != 10:
-            proc = Popen(cmd, shell=False, stderr=PIPE, stdout=PIPE)
-            out, err = proc.communicate()
-            out = out.decode('utf-8')
-            if err:
-                err = err.decode('utf-8')
-                print_line(err, status='err')
-                logging.error(err)
-                tries += 1
+        for tries in range(1, self.SUBMIT_TRIES + 1):
+            _, out, err = self._call(cmd)
+            submitted = SUBMITTED_PATTERN.search(out)
+            if submitted:
+                if err:
+                    logging.warning(f'{subtype} {script}: {err.strip()}')
+                return 'Submitted batch job {}'.format(submitted.group(1)), None
+            if not err:
+                return out, None
+            print_line(err, status='err')
+            logging.error(err)
+            retry = is_unhealthy_error(err) and tries < self.SUBMIT_TRIES
+            if retry:
                 sleep(tries * 2)
-
-                qinfo = self.queue()
-                for job in qinfo:
-                    if job.get('COMMAND') == cmd[1]:
-                        return 'Submitted batch job {}'.format(job['JOBID']), None
-                print('Unable to submit job, trying again')
-            else:
+            job_id = self._find_queued(script)
+            if job_id:
+                return 'Submitted batch job {}'.format(job_id), None
+            if not retry:
                 break
-        if tries >= 10:
-            raise Exception('SLURM ERROR: Transport endpoint is not connected')
-        return out, None
+            print('Unable to submit job, trying again')
+        raise Exception('SLURM ERROR: ' + err.strip())
+    # -----------------------------------------------
+
+    def _find_queued(self, script):
+        """
+        Returns the id of a queued job running the given script, or None
+        """
+        try:
+            _, out, _ = self._call(['squeue', '-h', '-u', getpass.getuser(), '-o', '%i|%o'])
+        except OSError:
+            return None
+        for line in out.split('\n'):
+            items = line.strip().split('|')
+            if len(items) == 2 and items[1] == script:
+                return items[0]
+        return None
     # -----------------------------------------------
 
     def showjob(self, jobid):
@@ -94,25 +189,19 @@ class Slurm(object):
         """
         if not isinstance(jobid, str):
             jobid = str(jobid)
-        success = False
-        while not success:
+        while True:
+            # gives up with SlurmUnavailable once the breaker opens
             try:
-                proc = Popen(['scontrol', 'show', 'job', jobid],
-                             shell=False, stderr=PIPE, stdout=PIPE)
-                out, err = proc.communicate()
-                out = out.decode('utf-8')
-                if err:
-                    err = err.decode('utf-8')
-                    print_line(err, status='err')
-                    if err == 'slurm_load_jobs error: Invalid job id specified':
-                        import ipdb; ipdb.set_trace()
-                        raise ValueError(f"Unable to find slurm job with id {jobid}")
-                    sleep(1)
-                else:
-                    success = True
-            except:
-                success = False
+                _, out, err = self._call(['scontrol', 'show', 'job', jobid])
+            except OSError:
                 sleep(1)
+                continue
+            if not err:
+                break
+            print_line(err, status='err')
+            if 'Invalid job id specified' in err:
+                raise ValueError(f"Unable to find slurm job with id {jobid}")
+            sleep(1)
 
         job_info = JobInfo()
         for item in out.split('\n'):
@@ -129,6 +218,144 @@ class Slurm(object):
         return job_info
     # -----------------------------------------------
 
+    def showjobs(self, jobids):
+        """
+        Get the state of many jobs at once with a single squeue call per chunk of ids,
+        falling back to sacct for jobs that have already left the queue
+
+        Parameters:
+            jobids (list): the job ids to get information about
+        Returns:
+            A dict mapping each job id (as a str) to a JobInfo object, jobs that
+            neither squeue nor sacct know about are left out
+        """
+        jobids = [str(x) for x in jobids if x]
+        job_infos = dict()
+        if not jobids:
+            return job_infos
+
+        for idx in range(0, len(jobids), self.QUERY_CHUNK_SIZE):
+            chunk = jobids[idx: idx + self.QUERY_CHUNK_SIZE]
+            job_infos.update(self._squeue_jobs(chunk))
+
+        missing = [x for x in jobids if x not in job_infos]
+        for idx in range(0, len(missing), self.QUERY_CHUNK_SIZE):
+            chunk = missing[idx: idx + self.QUERY_CHUNK_SIZE]
+            job_infos.update(self._sacct_jobs(chunk))
+        return job_infos
+    # -----------------------------------------------
+
+    def _squeue_jobs(self, jobids):
+        """
+        Run one squeue call for the given list of job ids
+
+        Returns:
+            A dict mapping job ids to JobInfo objects for the jobs still in the queue
+        """
+        _, out, err = self._call(self._squeue_cmd(jobids))
+        return self._parse_squeue(out, err)
+    # -----------------------------------------------
+
+    @staticmethod
+    def _squeue_cmd(jobids):
+        return ['squeue', '-h', '-r',
+                '--jobs={}'.format(','.join(jobids)),
+                '-o', '%i|%j|%P|%T|%M|%u']
+    # -----------------------------------------------
+
+    @staticmethod
+    def _parse_squeue(out, err):
+        """
+        Turn the output of _squeue_cmd into a dict of job id to JobInfo
+        """
+        if err:
+            # squeue errors out when none of the ids are in the queue anymore
+            if 'Invalid job id' not in err:
+                raise Exception('SLURM ERROR: ' + err)
+            return dict()
+
+        job_infos = dict()
+        for line in out.split('\n'):
+            items = line.strip().split('|')
+            if len(items) < 6:
+                continue
+            job_infos[items[0]] = JobInfo(
+                jobid=items[0],
+                jobname=items[1],
+                partition=items[2],
+                time=items[4],
+                user=items[5])
+            job_infos[items[0]].state = items[3]
+        return job_infos
+    # -----------------------------------------------
+
+    def _sacct_jobs(self, jobids):
+        """
+        Run one sacct call for the given list of job ids
+
+        Returns:
+            A dict mapping job ids to JobInfo objects for the jobs sacct has a record of
+        """
+        try:
+            _, out, err = self._call(self._sacct_cmd(jobids))
+        except OSError as e:
+            # not every site has accounting turned on
+            logging.error('Unable to run sacct: {}'.format(e))
+            return dict()
+        return self._parse_sacct(out, err, jobids)
+    # -----------------------------------------------
+
+    @staticmethod
+    def _sacct_cmd(jobids):
+        # no -X, the peak memory is only recorded on the job steps
+        return ['sacct', '-n', '-P',
+                '-j', ','.join(jobids),
+                '-o', 'JobID,JobName,Partition,State,ExitCode,Elapsed,MaxRSS,User']
+    # -----------------------------------------------
+
+    @staticmethod
+    def _parse_sacct(out, err, jobids):
+        """
+        Turn the output of _sacct_cmd into a dict of job id to JobInfo
+
+        The allocation line of each job gives its final state, exit code and
+        elapsed time, the largest MaxRSS of its steps (like 1234.batch) is
+        used as the peak memory of the job
+        """
+        if err:
+            logging.error(err)
+
+        job_infos = dict()
+        max_rss = dict()
+        for line in out.split('\n'):
+            items = line.strip().split('|')
+            if len(items) < 8:
+                continue
+            jobid, step = items[0], None
+            if '.' in jobid:
+                jobid, step = jobid.split('.', 1)
+            if jobid not in jobids:
+                continue
+            rss = parse_memory(items[6]) if items[6] else None
+            if rss is not None:
+                max_rss[jobid] = max(rss, max_rss.get(jobid, 0))
+            if step is not None:
+                continue
+            job_infos[jobid] = JobInfo(
+                jobid=jobid,
+                jobname=items[1],
+                partition=items[2],
+                time=items[5],
+                user=items[7])
+            # sacct reports states like "CANCELLED by 1234"
+            job_infos[jobid].state = items[3].split(' ')[0]
+            job_infos[jobid].exit_code = parse_exit_code(items[4])
+        for jobid, rss in max_rss.items():
+            if jobid in job_infos:
+                job_infos[jobid].max_rss = rss
+        return job_infos
+    # -----------------------------------------------
+
     def slurm_to_jobinfo(self, attr):
         if attr == 'Partition':
             return 'PARTITION'
@@ -150,20 +377,79 @@ class Slurm(object):
 
     def get_node_number(self):
         """
-        Use sinfo to return the number of nodes in the cluster
+        Returns the number of usable nodes in the default partition, 0 if
+        sinfo hasnt been able to tell yet
+        """
+        return self.cluster.nodes
+    # -----------------------------------------------
+
+    def _run(self, cmd):
+        """
+        Run a command, returning its stdout, or None if it failed
         """
-        cmd = 'sinfo show nodes | grep up | wc -l'
-        p = Popen([cmd], stderr=PIPE, stdout=PIPE, shell=True)
-        out, err = p.communicate()
-        out = out.decode('utf-8')
-        err = err.decode('utf-8')
-        if err:
-            print(err)
         try:
-            num_nodes = int(out)
-        except:
-            num_nodes = 1
-        return num_nodes
+            returncode, out, err = self._call(cmd)
+        except (OSError, SlurmUnavailable) as e:
+            logging.error(f'Unable to run {cmd[0]}: {e}')
+            return None
+        if returncode != 0:
+            logging.error(f'{cmd[0]} error: {err.strip()}')
+            return None
+        return out
+    # -----------------------------------------------
+
+    def get_partitions(self):
+        """
+        Look up the size of each partition that is up, leaving out nodes that
+        are down or drained
+
+        Returns:
+            a list of PartitionInfos, and the name of the default partition (None if
+            sinfo doesnt mark one)
+        """
+        return self.cluster.partitions, self.cluster.default_partition
+    # -----------------------------------------------
+
+    def get_user_limits(self):
+        """
+        Use sacctmgr to look up the users association and qos limits
+
+        Returns:
+            a dict with any of max_jobs, nodes, cores and memory (megabytes),
+            the tightest of the association and qos limits
+        """
+        user = getpass.getuser()
+        limits = dict()
+
+        def tighten(key, value):
+            if value and (key not in limits or value < limits[key]):
+                limits[key] = value
+
+        out = self._run(['sacctmgr', '-n', '-P', 'show', 'assoc', f'where user={user}',
+                         'format=MaxJobs,GrpTRES,QOS'])
+        qos = set()
+        for line in (out or '').split('\n'):
+            items = line.strip().split('|')
+            if len(items) != 3:
+                continue
+            if items[0].isdigit():
+                tighten('max_jobs', int(items[0]))
+            for key, value in parse_tres(items[1]).items():
+                tighten(key, value)
+            qos.update(x for x in items[2].split(',') if x)
+
+        if qos:
+            out = self._run(['sacctmgr', '-n', '-P', 'show', 'qos', f'where name={",".join(sorted(qos))}',
+                             'format=MaxJobsPU,MaxTRESPU'])
+            for line in (out or '').split('\n'):
+                items = line.strip().split('|')
+                if len(items) != 2:
+                    continue
+                if items[0].isdigit():
+                    tighten('max_jobs', int(items[0]))
+                for key, value in parse_tres(items[1]).items():
+                    tighten(key, value)
+        return limits
     # -----------------------------------------------
 
     def queue(self):
@@ -175,27 +461,24 @@ class Slurm(object):
         tries = 0
         while tries != 10:
             try:
-                cmd = ['squeue', '-u', os.environ['USER'], '-o', '%i|%j|%o|%t']
-                proc = Popen(cmd, shell=False, stderr=PIPE, stdout=PIPE)
-                out, err = proc.communicate()
-                out = out.decode('utf-8')
-                err = err.decode('utf-8')
+                cmd = ['squeue', '-u', getpass.getuser(), '-o', '%i|%j|%o|%t']
+                _, out, err = self._call(cmd)
                 if err or not out:
                     tries += 1
                     sleep(tries)
                     print(err)
                 else:
                     break
-            except:
+            except OSError:
                 sleep(1)
         if tries == 10:
             raise Exception('SLURM ERROR: Unable to communicate with squeue')
 
         queueinfo = []
-        for item in out.split(b'\n')[1:]:
+        for item in out.split('\n')[1:]:
             if not item:
                 break
-            line = [x for x in item.split(b'|') if x]
+            line = [x for x in item.split('|') if x]
             queueinfo.append({
                 'JOBID': line[0],
                 'NAME': line[1],
@@ -209,17 +492,16 @@ class Slurm(object):
         tries = 0
         while tries != 10:
             try:
-                cmd = ['scancel', str(job_id)]
-                proc = Popen(cmd, shell=False, stderr=PIPE, stdout=PIPE)
-                out, err = proc.communicate()
-                out = out.decode('utf-8')
-                err = err.decode('utf-8')
+                _, _, err = self._call(['scancel', str(job_id)])
                 if err:
                     print(err)
                     tries += 1
                     sleep(tries)
                 else:
                     return True
+            except SlurmUnavailable as e:
+                logging.error(str(e))
+                return False
             except Exception as e:
                 print_debug(e)
                 sleep(1)
@@ -0,0 +1,122 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+import json
+import os
+
+from datetime import datetime
+
+
+class JobStateWriter(object):
+    """
+    Writes the job state file, only when something has changed since the last write
+
+    Each jobs text block is cached along with the state it was rendered from
+    (status, data_ready and manager id), so a write only re-renders the jobs that
+    changed, and is skipped entirely if none did. The file is written to a temp
+    file and renamed into place so readers never see a partial file.
+
+    If a jsonl_path is given, a JSON object is appended to it for each job every
+    time it changes, so dashboards can tail the file.
+
+    Parameters:
+        path (str): the path to the human readable state file
+        jsonl_path (str): the path to the JSON-lines change log, optional
+    """
+
+    def __init__(self, path, jsonl_path=None):
+        self._path = path
+        self._jsonl_path = jsonl_path
+        # job id -> (fingerprint, text block)
+        self._blocks = dict()
+        self._layout = None
+    # -----------------------------------------------
+
+    @staticmethod
+    def _fingerprint(job):
+        return (job.status, job.data_ready, job.job_id)
+    # -----------------------------------------------
+
+    def write(self, cases, get_job):
+        """
+        Write out the state of every job if anything has changed
+
+        Parameters:
+            cases (list): the runmanagers list of case dicts
+            get_job (function): looks up a job by its processflow id
+        Returns:
+            True if the file was written, False if nothing had changed
+        """
+        layout = tuple((case['case'], len(case['jobs'])) for case in cases)
+        changed = list()
+        for case in cases:
+            for job in case['jobs']:
+                fingerprint = self._fingerprint(job)
+                cached = self._blocks.get(job.id)
+                if cached is None or cached[0] != fingerprint:
+                    self._blocks[job.id] = (fingerprint, self._render(job, get_job))
+                    changed.append((case['case'], job))
+
+        if not changed and layout == self._layout and os.path.exists(self._path):
+            return False
+        self._layout = layout
+
+        parts = list()
+        for case in cases:
+            name = case['case']
+            parts.append('\n==' + '=' * len(name) + '==\n')
+            parts.append('# {} #\n'.format(name))
+            parts.append('==' + '=' * len(name) + '==\n')
+            blocks = [self._blocks[job.id][1] for job in case['jobs']]
+            parts.append('\n------------------------------------'.join(blocks))
+            if blocks:
+                parts.append('\n')
+        self._atomic_write(''.join(parts))
+
+        if self._jsonl_path and changed:
+            self._append_changes(changed)
+        return True
+    # -----------------------------------------------
+
+    def _render(self, job, get_job):
+        """
+        Render the text block for a single job
+        """
+        lines = ['',
+                 '\tname: ' + job.job_type,
+                 '\tperiod: {:04d}-{:04d}'.format(job.start_year, job.end_year)]
+        if job._run_type:
+            lines.append('\trun_type: ' + job._run_type)
+        lines.append('\tstatus: ' + job.status.name)
+        if job.depends_on:
+            lines.append('\tdependent_on: ' + str(
+                [get_job(x).msg_prefix() for x in job.depends_on]))
+        lines.append('\tdata_ready: ' + str(job.data_ready))
+        lines.append('\tprocessflow_id: ' + job.id)
+        lines.append('\tmanager_id: ' + str(job.job_id))
+        return '\n'.join(lines)
+    # -----------------------------------------------
+
+    def _atomic_write(self, contents):
+        tmp_path = self._path + '.tmp'
+        with open(tmp_path, 'w') as fp:
+            fp.write(contents)
+        os.replace(tmp_path, self._path)
+    # -----------------------------------------------
+
+    def _append_changes(self, changed):
+        timestamp = datetime.now().isoformat(timespec='seconds')
+        with open(self._jsonl_path, 'a') as fp:
+            for case, job in changed:
+                fp.write(json.dumps({
+                    'time': timestamp,
+                    'case': case,
+                    'processflow_id': job.id,
+                    'job_type': job.job_type,
+                    'run_type': job._run_type,
+                    'start_year': job.start_year,
+                    'end_year': job.end_year,
+                    'status': job.status.name,
+                    'data_ready': job.data_ready,
+                    'manager_id': str(job.job_id),
+                    'depends_on': list(job.depends_on),
+                }) + '\n')
+    # -----------------------------------------------
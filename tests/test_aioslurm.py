@@ -0,0 +1,76 @@
+import inspect
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from processflow.lib.aioslurm import AsyncSlurm
+from processflow.lib.util import print_line
+from tests.test_slurm_status import write_command, count_calls
+
+
+class TestAsyncSlurm(unittest.TestCase):
+
+    def setUp(self):
+        self.bin_path = tempfile.mkdtemp()
+        self.old_path = os.environ['PATH']
+        os.environ['PATH'] = self.bin_path + os.pathsep + self.old_path
+        write_command(self.bin_path, 'sinfo', 'exit 0\n')
+        write_command(self.bin_path, 'squeue', 'cat << EOF\n'
+                      '101|ts_atm|debug|RUNNING|1:02|user\n'
+                      'EOF\n')
+        write_command(self.bin_path, 'sacct', 'exit 0\n')
+
+    def tearDown(self):
+        os.environ['PATH'] = self.old_path
+        shutil.rmtree(self.bin_path, ignore_errors=True)
+
+    def test_submit_and_poll(self):
+        """
+        submissions should run side by side, along with the status lookup
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        write_command(self.bin_path, 'sbatch',
+                      'sleep 0.5\n'
+                      'echo "Submitted batch job $(basename $1)"\n')
+        slurm = AsyncSlurm(max_concurrency=10)
+        scripts = [f'/scripts/{200 + x}' for x in range(10)]
+
+        start = time.time()
+        new_ids, job_infos = slurm.submit_and_poll(scripts, [101, 102])
+        self.assertLess(time.time() - start, 3)
+        self.assertEqual(new_ids, list(range(200, 210)))
+        self.assertEqual(job_infos['101'].state, 'RUNNING')
+        self.assertNotIn('102', job_infos)
+        self.assertEqual(count_calls(self.bin_path, 'sbatch'), 10)
+
+    def test_timeout_already_submitted(self):
+        """
+        an sbatch that times out but went through shouldnt be submitted twice
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        write_command(self.bin_path, 'sbatch', 'exec sleep 5\n')
+        write_command(self.bin_path, 'squeue', 'echo "555|/scripts/slow"\n')
+        slurm = AsyncSlurm(timeout=0.2, retries=2, backoff=0.01)
+        new_ids, _ = slurm.submit_and_poll(['/scripts/slow'], [])
+        self.assertEqual(new_ids, [555])
+        self.assertEqual(count_calls(self.bin_path, 'sbatch'), 1)
+
+    def test_retries_exhausted(self):
+        """
+        a submission that keeps failing should come back as 0
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        write_command(self.bin_path, 'sbatch', 'echo "Socket timed out" >&2\nexit 1\n')
+        slurm = AsyncSlurm(retries=2, backoff=0.01)
+        new_ids, _ = slurm.submit_and_poll(['/scripts/bad'], [])
+        self.assertEqual(new_ids, [0])
+        self.assertEqual(count_calls(self.bin_path, 'sbatch'), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import inspect
+import unittest
+
+from types import SimpleNamespace
+
+from processflow.lib.clusterinfo import ClusterInfo, SINFO_CMD, parse_sinfo
+from processflow.lib.jobstatus import JobStatus
+from processflow.lib.runmanager import RunManager
+from processflow.lib.util import print_line
+
+SINFO_OUT = (
+    'debug*|up|8|2/5/1/8|64/96/32/192|24|128000\n'
+    'regular|up|100|90/10/0/100|5760/640/0/6400|64|256000\n'
+    'regular|up|4|0/2/2/4|0/256/256/512|128+|512000\n'
+    'maint|down|10|0/10/0/10|0/640/0/640|64|256000\n'
+)
+
+
+class TestClusterInfo(unittest.TestCase):
+
+    def test_parse_sinfo(self):
+        """
+        down partitions and nodes should be left out, node groups added together
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        partitions, default = parse_sinfo(SINFO_OUT)
+        self.assertEqual(default, 'debug')
+        self.assertEqual(sorted(partitions.keys()), ['debug', 'regular'])
+
+        debug = partitions['debug']
+        self.assertEqual(debug.nodes, 7)
+        self.assertEqual(debug.idle_nodes, 5)
+        self.assertEqual(debug.idle_cores, 96)
+        self.assertEqual(debug.cores, 7 * 24)
+
+        regular = partitions['regular']
+        self.assertEqual(regular.nodes, 102)
+        self.assertEqual(regular.idle_nodes, 12)
+        self.assertEqual(regular.idle_cores, 896)
+        self.assertEqual(regular.cores_per_node, 64)
+        self.assertEqual(regular.memory_per_node, 256000)
+
+    def test_cached(self):
+        """
+        sinfo should only run again once the ttl is up, and a failed
+        lookup should keep the last known sizes
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        calls = list()
+        replies = [SINFO_OUT, None]
+        now = [0]
+
+        def run(cmd):
+            calls.append(cmd)
+            return replies.pop(0)
+
+        cluster = ClusterInfo(run, ttl=60, clock=lambda: now[0])
+        self.assertEqual(cluster.nodes, 7)
+        self.assertEqual(cluster.idle_nodes, 5)
+        self.assertEqual(len(cluster.partitions), 2)
+        self.assertEqual(calls, [SINFO_CMD])
+
+        now[0] = 61
+        self.assertFalse(cluster.refresh())
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cluster.nodes, 7)
+        self.assertEqual(cluster.partition('regular').nodes, 102)
+
+    def test_node_capacity(self):
+        """
+        without a job limit, jobs should be queued for the idle nodes on top
+        of the ones running, with one waiting when nothing is idle
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        jobs = {
+            'a': SimpleNamespace(status=JobStatus.RUNNING),
+            'b': SimpleNamespace(status=JobStatus.PENDING),
+        }
+        runmanager = SimpleNamespace(
+            running_jobs=[{'job_id': 'a'}, {'job_id': 'b'}],
+            graph=SimpleNamespace(get=jobs.get))
+        cluster = ClusterInfo(lambda cmd: SINFO_OUT)
+        self.assertEqual(RunManager._node_capacity(runmanager, cluster), 6)
+
+        busy = SINFO_OUT.replace('debug*|up|8|2/5/1/8', 'debug*|up|8|7/0/1/8')
+        cluster = ClusterInfo(lambda cmd: busy)
+        self.assertEqual(RunManager._node_capacity(runmanager, cluster), 2)
+        runmanager.running_jobs = list()
+        self.assertEqual(RunManager._node_capacity(runmanager, cluster), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import inspect
+import unittest
+
+from processflow.lib.coverage import Coverage, CoverageIndex
+from processflow.lib.util import print_line
+
+
+class TestCoverage(unittest.TestCase):
+
+    def setup_coverage(self):
+        coverage = Coverage()
+        for year in range(1, 6):
+            for month in range(1, 13):
+                coverage.add(f'/data/{year:04d}-{month:02d}.nc', year, month, year < 4)
+        return coverage
+
+    def test_ready_range(self):
+        """
+        a range is ready when it has files and all of them are present
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        coverage = self.setup_coverage()
+        self.assertTrue(coverage.ready(1, 3))
+        self.assertFalse(coverage.ready(3, 4))
+        self.assertFalse(coverage.ready(6, 10))
+        self.assertFalse(coverage.ready())
+
+        for month in range(1, 13):
+            coverage.set_present(f'/data/0004-{month:02d}.nc', True)
+        self.assertTrue(coverage.ready(1, 4))
+        self.assertFalse(coverage.ready(1, 5))
+
+        coverage.set_present('/data/0002-06.nc', False)
+        self.assertFalse(coverage.ready(1, 4))
+        self.assertTrue(coverage.ready(3, 4))
+
+    def test_paths(self):
+        """
+        only present files in the range should be returned, in year order
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        coverage = self.setup_coverage()
+        paths = coverage.paths(2, 4)
+        self.assertEqual(len(paths), 24)
+        self.assertEqual(paths[0], '/data/0002-01.nc')
+        self.assertEqual(paths[-1], '/data/0003-12.nc')
+        self.assertEqual(len(coverage.paths()), 36)
+
+        # adding a known path again should not duplicate it
+        coverage.add('/data/0002-01.nc', 2, 1, True)
+        self.assertEqual(len(coverage), 60)
+
+    def test_match_month(self):
+        """
+        derived products are looked up by their start and end year
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        index = CoverageIndex()
+        index.add('case', 'ts_native', '/ts/FLUT_000101_000512.nc', 1, 5, True)
+        index.add('case', 'ts_native', '/ts/FLUT_000101_001012.nc', 1, 10, True)
+        coverage = index.get('case', 'ts_native')
+        self.assertEqual(
+            coverage.paths(1, 5, match_month=True), ['/ts/FLUT_000101_000512.nc'])
+        self.assertIsNone(index.get('case', 'climo_native'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,230 @@
+import inspect
+import os
+import shutil
+import tempfile
+import unittest
+
+from configobj import ConfigObj
+
+from processflow.lib.filemanager import FileManager, _scan_directory
+from processflow.lib.models import DataFile
+from processflow.lib.util import print_line
+
+
+def make_config(project_path, end_year=2):
+    config = ConfigObj()
+    config['global'] = {'project_path': project_path}
+    config['simulations'] = {
+        'start_year': '1',
+        'end_year': str(end_year),
+        'case_a': {
+            'local_path': os.path.join(project_path, 'input', 'case_a'),
+            'data_types': ['atm', 'lnd'],
+        },
+        'case_b': {
+            'local_path': os.path.join(project_path, 'input', 'case_b'),
+            'data_types': 'all',
+        }
+    }
+    config['data_types'] = {
+        'atm': {
+            'file_format': 'CASEID.cam.h0.YEAR-MONTH.nc',
+            'local_path': 'LOCAL_PATH/atm',
+            'monthly': 'True',
+        },
+        'lnd': {
+            'file_format': 'CASEID.clm2.h0.YEAR-MONTH.nc',
+            'local_path': 'LOCAL_PATH/lnd',
+            'monthly': 'True',
+        }
+    }
+    return config
+
+
+class TestFileManagerCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.project_path = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.project_path, 'processflow.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.project_path, ignore_errors=True)
+
+    def count(self, **kwargs):
+        query = DataFile.select()
+        for key, val in kwargs.items():
+            query = query.where(getattr(DataFile, key) == val)
+        return query.count()
+
+    def test_reuse_catalog(self):
+        """
+        a second run with the same config should keep the rows from the first
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        config = make_config(self.project_path)
+        filemanager = FileManager(config=config, database=self.db_path)
+        filemanager.populate_file_list()
+        # 'all' should expand to every data type, two cases * two types * two years
+        self.assertEqual(self.count(), 96)
+
+        DataFile.update(local_size=10).execute()
+        filemanager = FileManager(config=config, database=self.db_path)
+        filemanager.populate_file_list()
+        self.assertEqual(self.count(), 96)
+        self.assertEqual(self.count(local_size=10), 96)
+
+    def test_apply_changes(self):
+        """
+        only the years, cases and data types that changed should be touched
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        config = make_config(self.project_path)
+        filemanager = FileManager(config=config, database=self.db_path)
+        filemanager.populate_file_list()
+        DataFile.update(local_size=10).execute()
+
+        config = make_config(self.project_path, end_year=3)
+        config['simulations']['case_a']['data_types'] = ['atm']
+        config['data_types']['lnd']['local_path'] = 'LOCAL_PATH/land'
+        filemanager = FileManager(config=config, database=self.db_path)
+        filemanager.populate_file_list()
+
+        self.assertEqual(self.count(case='case_a', datatype='lnd'), 0)
+        self.assertEqual(self.count(case='case_a', datatype='atm'), 36)
+        self.assertEqual(self.count(case='case_a', datatype='atm', local_size=10), 24)
+        # the lnd paths changed so those rows were rebuilt
+        self.assertEqual(self.count(case='case_b', datatype='lnd'), 36)
+        self.assertEqual(self.count(case='case_b', datatype='lnd', local_size=10), 0)
+
+    def test_remember_derived_types(self):
+        """
+        derived data types added by jobs should be restored on the next run
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        config = make_config(self.project_path)
+        filemanager = FileManager(config=config, database=self.db_path)
+        filemanager.populate_file_list()
+
+        config['data_types']['ts_atm'] = {'monthly': False}
+        new_files = [{
+            'name': 'FLUT_000101_000212.nc',
+            'local_path': os.path.join(self.project_path, 'FLUT_000101_000212.nc'),
+            'case': 'case_a',
+            'year': 1,
+            'month': 2,
+            'local_status': 0}]
+        filemanager.add_files(data_type='ts_atm', file_list=new_files, super_type='derived')
+        # adding the same files twice should not duplicate them
+        filemanager.add_files(data_type='ts_atm', file_list=new_files, super_type='derived')
+        self.assertEqual(self.count(datatype='ts_atm'), 1)
+        self.assertEqual(
+            filemanager.get_file_paths_by_year('ts_atm', 'case_a'),
+            [new_files[0]['local_path']])
+
+        config = make_config(self.project_path)
+        filemanager = FileManager(config=config, database=self.db_path)
+        filemanager.populate_file_list()
+        self.assertIn('ts_atm', config['data_types'])
+        self.assertEqual(self.count(datatype='ts_atm'), 1)
+
+    def test_file_status_check(self):
+        """
+        files on disk should be marked present with their size, the rest not present
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        config = make_config(self.project_path, end_year=1)
+        config['simulations']['case_b']['data_types'] = ['atm']
+        filemanager = FileManager(config=config, database=self.db_path)
+        filemanager.populate_file_list()
+
+        atm_path = os.path.join(self.project_path, 'input', 'case_a', 'atm')
+        os.makedirs(atm_path)
+        for month in range(1, 13):
+            with open(os.path.join(atm_path, f'case_a.cam.h0.0001-{month:02d}.nc'), 'w') as fp:
+                fp.write('x' * month)
+
+        filemanager.file_status_check(max_workers=2)
+        self.assertEqual(self.count(local_status=0), 12)
+        self.assertEqual(self.count(local_status=1), 24)
+        datafile = DataFile.get(DataFile.name == 'case_a.cam.h0.0001-03.nc')
+        self.assertEqual(datafile.local_size, 3)
+        self.assertFalse(filemanager.all_data_local())
+
+        # files showing up later should be found on the next check
+        lnd_path = os.path.join(self.project_path, 'input', 'case_a', 'lnd')
+        os.makedirs(lnd_path)
+        for month in range(1, 13):
+            open(os.path.join(lnd_path, f'case_a.clm2.h0.0001-{month:02d}.nc'), 'w').close()
+        self.assertTrue(filemanager.file_status_check())
+        self.assertEqual(self.count(local_status=0), 24)
+
+        # the in memory index should follow the status changes
+        self.assertTrue(filemanager.check_data_ready(['atm', 'lnd'], 'case_a', 1, 1))
+        self.assertFalse(filemanager.check_data_ready(['atm'], 'case_b', 1, 1))
+        self.assertEqual(
+            len(filemanager.get_file_paths_by_year('lnd', 'case_a', 1, 1)), 12)
+
+    def test_scan_directory(self):
+        """
+        only the expected files should be listed, and only the ones without
+        a size in the catalog should be stat-ed for one
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        for name in ['known.nc', 'new.nc', 'other.nc']:
+            with open(os.path.join(self.project_path, name), 'w') as fp:
+                fp.write('x' * 3)
+        listing = _scan_directory(
+            self.project_path, {'known.nc': 10, 'new.nc': None, 'gone.nc': 10})
+        self.assertEqual(listing, {'known.nc': 10, 'new.nc': 3})
+        self.assertEqual(_scan_directory(os.path.join(self.project_path, 'nope'), {'new.nc': None}), {})
+
+    def test_missing_derived_output(self):
+        """
+        a job output from an earlier run thats been deleted should be dropped on
+        restart instead of stopping the run from starting
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        config = make_config(self.project_path, end_year=1)
+        filemanager = FileManager(config=config, database=self.db_path)
+        filemanager.populate_file_list()
+        for local_path, in DataFile.select(DataFile.local_path).tuples():
+            if not os.path.exists(os.path.dirname(local_path)):
+                os.makedirs(os.path.dirname(local_path))
+            open(local_path, 'w').close()
+
+        config['data_types']['ts_atm'] = {'monthly': False}
+        new_files = list()
+        for name in ['FLUT_000101_000112.nc', 'FSNT_000101_000112.nc']:
+            local_path = os.path.join(self.project_path, name)
+            open(local_path, 'w').close()
+            new_files.append({
+                'name': name,
+                'local_path': local_path,
+                'case': 'case_a',
+                'year': 1,
+                'month': 1,
+                'local_status': 0})
+        filemanager.add_files(data_type='ts_atm', file_list=new_files, super_type='derived')
+        filemanager.file_status_check()
+        self.assertTrue(filemanager.all_data_local())
+
+        os.remove(new_files[0]['local_path'])
+        config = make_config(self.project_path, end_year=1)
+        filemanager = FileManager(config=config, database=self.db_path)
+        filemanager.populate_file_list()
+        filemanager.file_status_check()
+        self.assertTrue(filemanager.all_data_local())
+        self.assertEqual(self.count(datatype='ts_atm'), 1)
+        self.assertEqual(
+            filemanager.get_file_paths_by_year('ts_atm', 'case_a'),
+            [new_files[1]['local_path']])
+
+
+if __name__ == '__main__':
+    unittest.main()
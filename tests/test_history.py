@@ -0,0 +1,102 @@
+import inspect
+import os
+import shutil
+import tempfile
+import unittest
+
+from processflow.lib.history import RuntimeHistory, format_walltime, parse_elapsed
+from processflow.lib.util import print_line
+
+
+class MockJob(object):
+    """
+    The part of the Job interface the runtime history uses
+    """
+
+    def __init__(self, start_year, end_year, job_type='climo', run_type=None, case='case1'):
+        self.start_year = start_year
+        self.end_year = end_year
+        self.job_type = job_type
+        self.run_type = run_type
+        self.case = case
+        self._input_file_paths = list()
+
+    def msg_prefix(self):
+        return f'{self.job_type}-{self.start_year}-{self.end_year}'
+
+
+class TestRuntimeHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.config = {'simulations': {'case1': {'native_grid_name': 'ne30'}}}
+        self.history = RuntimeHistory(
+            database=os.path.join(self.tmp, 'history.db'), config=self.config)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_parse_elapsed(self):
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        self.assertEqual(parse_elapsed('1-02:03:04'), 93784)
+        self.assertEqual(parse_elapsed('02:03:04'), 7384)
+        self.assertEqual(parse_elapsed('3:04'), 184)
+        self.assertEqual(parse_elapsed('5'), 300)
+        # time limits with days count hours first
+        self.assertEqual(parse_elapsed('0-02:00'), 7200)
+        self.assertEqual(parse_elapsed('1-02'), 93600)
+        self.assertEqual(parse_elapsed(format_walltime(90)), 5400)
+        self.assertIsNone(parse_elapsed(''))
+        self.assertIsNone(parse_elapsed('INVALID'))
+        self.assertEqual(format_walltime(25), '0-00:25')
+        self.assertEqual(format_walltime(1500.5), '1-01:01')
+
+    def test_predict(self):
+        """
+        no prediction until there is enough history, then one scaled by years with a margin
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        job = MockJob(1, 10)
+        self.assertIsNone(self.history.predict_walltime(job))
+        # 60 seconds per simulated year
+        for _ in range(3):
+            self.history.record(MockJob(1, 5), runtime=300, state='COMPLETED', queue_wait=10)
+        # failures dont count
+        self.history.record(MockJob(1, 5), runtime=5, state='FAILED')
+
+        # 10 years * 1 minute * 1.5 + 5 minutes
+        self.assertEqual(self.history.predict_walltime(job), 20)
+        self.assertEqual(self.history.predict_walltime(MockJob(1, 100)), 155)
+        # other kinds of job have their own history
+        self.assertIsNone(self.history.predict_walltime(MockJob(1, 10, job_type='timeseries', run_type='atm')))
+
+        # the history is kept between runs
+        history = RuntimeHistory(database=os.path.join(self.tmp, 'history.db'), config=self.config)
+        self.assertEqual(history.predict_walltime(job), 20)
+
+    def test_timeout_grows_prediction(self):
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        job = MockJob(1, 10)
+        for _ in range(3):
+            self.history.record(MockJob(1, 10), runtime=600, state='COMPLETED')
+        before = self.history.predict_walltime(job)
+        self.history.record(MockJob(1, 10), runtime=1200, state='TIMEOUT', walltime=1200)
+        self.assertGreater(self.history.predict_walltime(job), before)
+
+    def test_limits(self):
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        for _ in range(3):
+            self.history.record(MockJob(1, 1), runtime=1, state='COMPLETED')
+        self.assertEqual(self.history.predict_walltime(MockJob(1, 1)), self.history.min_walltime)
+        for _ in range(3):
+            self.history.record(MockJob(1, 1, job_type='cmor'), runtime=86400, state='COMPLETED')
+        self.assertEqual(
+            self.history.predict_walltime(MockJob(1, 100, job_type='cmor')), self.history.max_walltime)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import inspect
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from processflow.lib.jobarray import JobArrayBatcher
+from processflow.lib.runmanager import RunManager
+from processflow.lib.util import print_line
+
+
+class MockManager(object):
+
+    def __init__(self, fail=False):
+        self.submitted = list()
+        self.fail = fail
+
+    def batch(self, cmd, sargs=None):
+        self.submitted.append(cmd)
+        if self.fail:
+            return 0
+        return 1000 + len(self.submitted)
+
+
+class MockJob(object):
+
+    def __init__(self, job_type, script, margs):
+        self.job_type = job_type
+        self._pending_script = script
+        self._defer_submit = True
+        self._job_id = 0
+        self._has_been_executed = False
+        self._margs = margs
+        self.id = script
+        self.status = None
+
+    def get_resource_args(self):
+        return self._margs
+
+    def msg_prefix(self):
+        return os.path.basename(self._pending_script or '')
+
+
+class TestJobArray(unittest.TestCase):
+
+    def setUp(self):
+        self.scripts_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.scripts_path, ignore_errors=True)
+
+    def test_group_by_type_and_resources(self):
+        """
+        jobs with the same type and resource args should go into one array
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        manager = MockManager()
+        batcher = JobArrayBatcher(manager, self.scripts_path)
+        small = ['-t 0-01:00', '-N 1']
+        jobs = [MockJob('timeseries', f'/scripts/ts_{x}', small) for x in range(3)]
+        jobs.append(MockJob('timeseries', '/scripts/ts_big', ['-t 0-05:00', '-N 1']))
+        for job in jobs:
+            batcher.add(job)
+        self.assertEqual(len(batcher), 4)
+
+        submitted = batcher.flush()
+        self.assertEqual(len(batcher), 0)
+        self.assertEqual(len(manager.submitted), 2)
+        self.assertEqual(
+            [x[1] for x in submitted],
+            ['1001_0', '1001_1', '1001_2', 1002])
+        self.assertEqual(jobs[1]._job_id, '1001_1')
+        self.assertTrue(all(x._has_been_executed for x in jobs))
+        self.assertFalse(any(x._defer_submit for x in jobs))
+
+        with open(manager.submitted[0], 'r') as fp:
+            contents = fp.read()
+        self.assertIn('#SBATCH --array=0-2', contents)
+        self.assertIn('#SBATCH -t 0-01:00', contents)
+        self.assertIn('"/scripts/ts_2"', contents)
+        # the single job should be submitted directly
+        self.assertEqual(manager.submitted[1], '/scripts/ts_big')
+
+    def test_max_array_size(self):
+        """
+        groups larger than the max array size should be split
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        manager = MockManager()
+        batcher = JobArrayBatcher(manager, self.scripts_path, max_array_size=2)
+        for x in range(5):
+            batcher.add(MockJob('regrid', f'/scripts/regrid_{x}', ['-N 1']))
+        submitted = batcher.flush()
+        self.assertEqual(len(manager.submitted), 3)
+        self.assertEqual(
+            [x[1] for x in submitted],
+            ['1001_0', '1001_1', '1002_0', '1002_1', 1003])
+
+    def test_submit_arrays_count(self):
+        """
+        only the array tasks that were queued should count as started,
+        the jobs of a failed array go back to be tried again
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        running = list()
+        requeued = list()
+        runmanager = SimpleNamespace(
+            graph=SimpleNamespace(requeue=requeued.append),
+            _add_running=lambda job, manager_id: running.append(manager_id))
+
+        runmanager._array_batcher = JobArrayBatcher(MockManager(), self.scripts_path)
+        for x in range(3):
+            runmanager._array_batcher.add(MockJob('climo', f'/scripts/climo_{x}', ['-N 1']))
+        self.assertEqual(RunManager._submit_arrays(runmanager), 3)
+        self.assertEqual(running, ['1001_0', '1001_1', '1001_2'])
+
+        runmanager._array_batcher = JobArrayBatcher(MockManager(fail=True), self.scripts_path)
+        for x in range(3):
+            runmanager._array_batcher.add(MockJob('climo', f'/scripts/climo_{x}', ['-N 1']))
+        self.assertEqual(RunManager._submit_arrays(runmanager), 0)
+        self.assertEqual(len(running), 3)
+        self.assertEqual(len(requeued), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import inspect
+import unittest
+
+from processflow.lib.jobgraph import JobGraph
+from processflow.lib.jobstatus import JobStatus
+from processflow.lib.util import print_line
+
+
+class MockJob(object):
+    """
+    The minimal part of the Job interface the graph uses
+    """
+
+    def __init__(self, job_id, depends_on=None):
+        self.id = job_id
+        self.depends_on = depends_on or list()
+        self.status = JobStatus.VALID
+
+
+class TestJobGraph(unittest.TestCase):
+
+    def setup_graph(self):
+        """
+        ts -> climo -> diag1
+                    -> diag2 -> final
+        """
+        jobs = [
+            MockJob('ts'),
+            MockJob('climo', ['ts']),
+            MockJob('diag1', ['climo']),
+            MockJob('diag2', ['climo']),
+            MockJob('final', ['diag2']),
+            MockJob('other')]
+        graph = JobGraph()
+        for job in jobs:
+            graph.add_job(job)
+        graph.build()
+        return graph
+
+    def test_ready_jobs(self):
+        """
+        only jobs with no unfinished dependencies should be ready
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        graph = self.setup_graph()
+        self.assertEqual([x.id for x in graph.ready_jobs()], ['ts', 'other'])
+
+    def test_mark_completed(self):
+        """
+        completing a job should release its dependents
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        graph = self.setup_graph()
+        graph.get('ts').status = JobStatus.COMPLETED
+        released = graph.mark_completed('ts')
+        self.assertEqual([x.id for x in released], ['climo'])
+        self.assertEqual([x.id for x in graph.ready_jobs()], ['climo', 'other'])
+
+        graph.get('climo').status = JobStatus.COMPLETED
+        graph.mark_completed('climo')
+        self.assertEqual(
+            [x.id for x in graph.ready_jobs()], ['diag1', 'diag2', 'other'])
+        self.assertFalse(graph.deps_ready('final'))
+
+    def test_mark_failed(self):
+        """
+        failing a job should fail everything downstream of it, and nothing else
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        graph = self.setup_graph()
+        graph.get('ts').status = JobStatus.FAILED
+        failed = graph.mark_failed('ts')
+        self.assertEqual(
+            sorted(x.id for x in failed), ['climo', 'diag1', 'diag2', 'final'])
+        self.assertEqual(graph.get('other').status, JobStatus.VALID)
+        self.assertEqual([x.id for x in graph.ready_jobs()], ['other'])
+
+    def test_build_with_completed_dependency(self):
+        """
+        dependencies that are already complete should not block their dependents
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        graph = JobGraph()
+        done = MockJob('done')
+        done.status = JobStatus.COMPLETED
+        graph.add_job(done)
+        graph.add_job(MockJob('next', ['done']))
+        graph.build()
+        self.assertEqual([x.id for x in graph.ready_jobs()], ['next'])
+
+    def test_missing_job(self):
+        """
+        looking up an unknown id should raise
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        graph = self.setup_graph()
+        with self.assertRaises(Exception):
+            graph.get('nope')
+
+    def test_on_change(self):
+        """
+        completing or failing a job should be reported
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        graph = self.setup_graph()
+        changes = list()
+        graph.on_change = changes.append
+        graph.get('ts').status = JobStatus.COMPLETED
+        graph.mark_completed('ts')
+        graph.mark_failed('other')
+        self.assertEqual(changes, ['ts completed, 1 jobs ready', 'other failed'])
+
+
+if __name__ == '__main__':
+    unittest.main()
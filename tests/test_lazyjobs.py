@@ -0,0 +1,69 @@
+import inspect
+import os
+import shutil
+import tempfile
+import unittest
+
+from processflow.jobs.climo import Climo
+from processflow.lib.util import print_line
+
+
+class TestLazyJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.project_path = tempfile.mkdtemp()
+        self.config = {
+            'global': {
+                'project_path': self.project_path,
+            },
+            'simulations': {
+                'case1': {
+                    'short_name': 'case1',
+                    'native_grid_name': 'ne30',
+                },
+            },
+            'post-processing': {
+                'climo': {
+                    'destination_grid_name': 'fv129x256',
+                    'custom_args': {
+                        '-t': '-t 0-02:00',
+                    },
+                    'job_args': {
+                        'a': '--no_amwg_links',
+                    },
+                },
+            },
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.project_path, ignore_errors=True)
+
+    def test_materialize(self):
+        """
+        creating a job shouldnt touch the disk or the config args,
+        materializing it should do both, once
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        climo = Climo(
+            short_name='case1',
+            case='case1',
+            start=1,
+            end=10,
+            config=self.config)
+        self.assertFalse(climo.materialized)
+        self.assertEqual(os.listdir(self.project_path), [])
+        self.assertEqual(list(climo._manager_args['slurm']), ['-t 0-01:00', '-N 1'])
+        self.assertFalse(climo._job_args)
+
+        climo.materialize(self.config)
+        climo.materialize(self.config)
+        self.assertTrue(climo.materialized)
+        self.assertTrue(os.path.isdir(climo._output_path))
+        self.assertTrue(os.path.isdir(climo._regrid_path))
+        self.assertEqual(climo._manager_args['slurm'], ['-t 0-02:00', '-N 1'])
+        self.assertEqual(climo._job_args, ['--no_amwg_links'])
+
+
+if __name__ == '__main__':
+    unittest.main()
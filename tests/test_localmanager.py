@@ -0,0 +1,140 @@
+import inspect
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from processflow.jobs.climo import Climo
+from processflow.lib.localmanager import LocalManager, parse_memory
+from processflow.lib.util import print_line
+
+
+class RecordingManager(LocalManager):
+
+    def __init__(self, *args, **kwargs):
+        super(RecordingManager, self).__init__(*args, **kwargs)
+        self.requests = list()
+
+    def batch(self, cmd, cores=None, memory=0):
+        self.requests.append((cores, memory))
+        return super(RecordingManager, self).batch(cmd, cores=cores, memory=memory)
+
+
+class WideClimo(Climo):
+    """
+    A job that needs more cores than its slurm args ask for, like cmor
+    """
+    __slots__ = ()
+
+    def get_resources(self):
+        resources = super(WideClimo, self).get_resources()
+        resources.cores = 3
+        return resources
+
+
+class TestLocalManager(unittest.TestCase):
+
+    def setUp(self):
+        self.scripts_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.scripts_path, ignore_errors=True)
+
+    def make_script(self, name, body):
+        path = os.path.join(self.scripts_path, name)
+        with open(path, 'w') as fp:
+            fp.write('#!/bin/bash\n' + body + '\n')
+        return path
+
+    def wait_for(self, manager, job_ids, timeout=10):
+        start = time.time()
+        while time.time() - start < timeout:
+            states = [manager.showjob(x).state for x in job_ids]
+            if all(x in ['COMPLETED', 'FAILED', 'CANCELLED'] for x in states):
+                return states
+            time.sleep(0.05)
+        self.fail('jobs did not finish in time')
+
+    def test_concurrent(self):
+        """
+        batch should return right away and jobs should run side by side
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        changes = list()
+        manager = LocalManager(cores=4, on_change=changes.append)
+        self.assertEqual(manager.get_node_number(), 4)
+
+        start = time.time()
+        job_ids = [manager.batch(self.make_script(f'sleep_{x}', 'sleep 0.5')) for x in range(4)]
+        self.assertLess(time.time() - start, 0.5)
+        states = self.wait_for(manager, job_ids)
+        self.assertEqual(states, ['COMPLETED'] * 4)
+        # all four at once should take about as long as one
+        self.assertLess(time.time() - start, 1.8)
+        self.assertTrue(changes)
+
+    def test_slots(self):
+        """
+        jobs should wait for enough free cores
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        manager = LocalManager(cores=2)
+        big = manager.batch(self.make_script('big', 'sleep 0.5'), cores=2)
+        small = manager.batch(self.make_script('small', 'echo done'), cores=1)
+        time.sleep(0.2)
+        self.assertEqual(manager.showjob(big).state, 'RUNNING')
+        self.assertEqual(manager.showjob(small).state, 'PENDING')
+        self.assertEqual(self.wait_for(manager, [big, small]), ['COMPLETED', 'COMPLETED'])
+        with open(os.path.join(self.scripts_path, 'small.out'), 'r') as fp:
+            self.assertEqual(fp.read().strip(), 'done')
+
+    def test_fail_and_cancel(self):
+        """
+        failing scripts should be FAILED, cancelled ones CANCELLED
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        manager = LocalManager(cores=1)
+        failing = manager.batch(self.make_script('fail', 'exit 1'))
+        waiting = manager.batch(self.make_script('wait', 'sleep 5'))
+        self.assertTrue(manager.cancel(waiting))
+        self.assertEqual(self.wait_for(manager, [failing, waiting]), ['FAILED', 'CANCELLED'])
+        infos = manager.showjobs([failing, waiting, 99])
+        self.assertEqual(sorted(infos.keys()), [str(failing), str(waiting)])
+
+    def test_job_resources(self):
+        """
+        jobs should be sized from their resource request, not only their slurm args
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        manager = RecordingManager(cores=4, cores_per_job=2)
+        job = WideClimo(
+            short_name='case1',
+            case='case1',
+            start=1,
+            end=5,
+            config={'global': {'project_path': self.scripts_path},
+                    'simulations': {'case1': {'native_grid_name': 'ne30'}},
+                    'post-processing': {'climo': {'destination_grid_name': 'fv129x256'}}},
+            manager=manager)
+        job_id = job._dispatch_script(self.make_script('climo', 'echo done'))
+        self.assertEqual(manager.requests, [(3, 0)])
+        self.assertEqual(self.wait_for(manager, [job_id]), ['COMPLETED'])
+        # the fewest cores a job gets is cores_per_job, and never more than the machine has
+        self.assertEqual(manager._fit_request(None, 0), (2, 0))
+        self.assertEqual(manager._fit_request(8, 0), (4, 0))
+
+    def test_parse_memory(self):
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        self.assertEqual(parse_memory('16G'), 16384)
+        self.assertEqual(parse_memory('500M'), 500)
+        self.assertEqual(parse_memory(4000), 4000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import inspect
+import threading
+import time
+import unittest
+
+from processflow.lib.loopcontrol import LoopControl
+from processflow.lib.util import print_line
+
+
+class TestLoopControl(unittest.TestCase):
+
+    def test_activity_skips_wait(self):
+        """
+        a pass that made progress should be followed by another pass right away
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        loop = LoopControl(min_delay=5, max_delay=10)
+        loop.record_pass(1)
+        start = time.time()
+        self.assertTrue(loop.wait())
+        self.assertLess(time.time() - start, 1)
+
+    def test_idle_backoff(self):
+        """
+        idle passes should double the delay up to the max
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        loop = LoopControl(min_delay=1, max_delay=5)
+        delays = list()
+        for _ in range(5):
+            loop.record_pass(0)
+            delays.append(loop.delay)
+        self.assertEqual(delays, [2, 4, 5, 5, 5])
+
+    def test_notify_from_thread(self):
+        """
+        notify() from another thread should cut the wait short
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        loop = LoopControl(min_delay=10, max_delay=10)
+        loop.record_pass(0)
+        timer = threading.Timer(0.1, loop.notify, args=('test',))
+        timer.start()
+        start = time.time()
+        self.assertTrue(loop.wait())
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(loop.delay, 0)
+
+    def test_fixed_delay(self):
+        """
+        with adaptive turned off the delay should always be the max
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        loop = LoopControl(max_delay=0.2, adaptive=False)
+        loop.record_pass(3)
+        self.assertEqual(loop.delay, 0.2)
+        start = time.time()
+        self.assertFalse(loop.wait())
+        self.assertGreaterEqual(time.time() - start, 0.2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import inspect
+import os
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+from processflow.lib.jobinfo import JobInfo
+from processflow.lib.packing import JobPacker
+from processflow.lib.packworker import default_slots, read_status, run_worker, write_status
+from processflow.lib.util import print_line
+
+
+class MockManager(object):
+    """
+    Stands in for Slurm, the allocation is running until ended is set
+    """
+
+    def __init__(self):
+        self.submitted = list()
+        self.ended = False
+
+    def batch(self, cmd, sargs=None):
+        self.submitted.append(cmd)
+        self.ended = False
+        return 1000 + len(self.submitted)
+
+    def showjobs(self, jobids):
+        info = JobInfo(jobid=str(jobids[0]))
+        info.state = 'COMPLETED' if self.ended else 'RUNNING'
+        return {str(jobids[0]): info}
+
+
+class MockJob(object):
+
+    def __init__(self, job_id, script):
+        self.id = job_id
+        self._pending_script = script
+        self._console_output_path = script + '.out'
+        self._defer_submit = True
+        self._job_id = 0
+        self._has_been_executed = False
+
+    def msg_prefix(self):
+        return self.id
+
+
+class TestJobPacker(unittest.TestCase):
+
+    def setUp(self):
+        self.project_path = tempfile.mkdtemp()
+        self.pack_path = os.path.join(self.project_path, 'packing')
+
+    def tearDown(self):
+        shutil.rmtree(self.project_path, ignore_errors=True)
+
+    def make_job(self, name, body):
+        script = os.path.join(self.project_path, name)
+        with open(script, 'w') as fp:
+            fp.write('#!/bin/bash\n#SBATCH -N 1\n' + body + '\n')
+        return MockJob(name, script)
+
+    def test_pack_and_run(self):
+        """
+        queued jobs should share one allocation and report their own state
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        manager = MockManager()
+        packer = JobPacker(manager, self.pack_path, nodes=1, walltime='0-00:30')
+        good = self.make_job('good', 'echo packed output')
+        bad = self.make_job('bad', 'exit 3')
+        good_id = packer.submit(good)
+        bad_id = packer.submit(bad)
+        self.assertEqual(len(manager.submitted), 1)
+        self.assertEqual(good._job_id, good_id)
+        self.assertTrue(JobPacker.is_task_id(good_id))
+
+        with open(manager.submitted[0], 'r') as fp:
+            contents = fp.read()
+        self.assertIn('#SBATCH -t 0-00:30', contents)
+        self.assertIn('processflow.lib.packworker', contents)
+        self.assertNotIn('--srun', contents)
+
+        infos = packer.showjobs([good_id, bad_id])
+        self.assertEqual(infos[good_id].state, 'PENDING')
+
+        run_worker(self.pack_path, slots=2, idle_timeout=0, poll=0.05)
+        infos = packer.showjobs([good_id, bad_id])
+        self.assertEqual(infos[good_id].state, 'COMPLETED')
+        self.assertEqual(infos[bad_id].state, 'FAILED')
+        with open(good._console_output_path, 'r') as fp:
+            self.assertEqual(fp.read().strip(), 'packed output')
+
+    def test_allocation_ended(self):
+        """
+        queued jobs should get a new allocation if the last one ended, jobs
+        that were running in it should go back in the queue until theyve been
+        cut off too many times
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        manager = MockManager()
+        packer = JobPacker(manager, self.pack_path, max_requeue=1)
+        first = packer.submit(self.make_job('first', 'exit 0'))
+        second = packer.submit(self.make_job('second', 'exit 0'))
+        status_path = os.path.join(self.pack_path, 'status')
+
+        def cut_off():
+            # pretend the worker claimed the first job and then the allocation hit its time limit
+            os.rename(os.path.join(self.pack_path, 'queue', first),
+                      os.path.join(self.pack_path, 'claimed', first))
+            write_status(status_path, first, 'RUNNING')
+            manager.ended = True
+            return packer.showjobs([first, second])
+
+        infos = cut_off()
+        self.assertEqual(infos[first].state, 'PENDING')
+        self.assertEqual(infos[second].state, 'PENDING')
+        self.assertEqual(len(manager.submitted), 2)
+        self.assertTrue(os.path.exists(os.path.join(self.pack_path, 'queue', first)))
+        self.assertEqual(read_status(status_path, first), (None, None))
+
+        infos = cut_off()
+        self.assertEqual(infos[first].state, 'FAILED')
+        self.assertEqual(infos[second].state, 'PENDING')
+        self.assertEqual(len(manager.submitted), 3)
+
+    def test_walltime_margin(self):
+        """
+        the worker should stop taking tasks when the allocation is about to
+        run out of time, and leave them for the next allocation
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        manager = MockManager()
+        packer = JobPacker(manager, self.pack_path, walltime='0-00:30', walltime_margin=120)
+        first = packer.submit(self.make_job('first', 'sleep 1.2'))
+        second = packer.submit(self.make_job('second', 'exit 0'))
+        with open(manager.submitted[0], 'r') as fp:
+            contents = fp.read()
+        self.assertIn('--walltime 1800', contents)
+        self.assertIn('--walltime-margin 120', contents)
+
+        # two seconds of walltime, the first task leaves less than a second of it
+        run_worker(self.pack_path, slots=1, idle_timeout=30, poll=0.05,
+                   walltime=2, walltime_margin=1)
+        infos = packer.showjobs([first, second])
+        self.assertEqual(infos[first].state, 'COMPLETED')
+        self.assertEqual(infos[second].state, 'PENDING')
+        self.assertTrue(os.path.exists(os.path.join(self.pack_path, 'queue', second)))
+
+    def test_default_slots(self):
+        """
+        the worker should size itself to the cores slurm gave the allocation,
+        not to the cores on the node
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        with mock.patch.dict(os.environ, {'SLURM_CPUS_ON_NODE': '8', 'SLURM_JOB_NUM_NODES': '2'}):
+            self.assertEqual(default_slots(use_srun=False, cpus_per_task=2), 4)
+            self.assertEqual(default_slots(use_srun=True, cpus_per_task=2), 8)
+        with mock.patch.dict(os.environ, {'SLURM_CPUS_ON_NODE': '1'}):
+            self.assertEqual(default_slots(use_srun=False, cpus_per_task=4), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import inspect
+import os
+import shutil
+import tempfile
+import unittest
+
+from processflow.jobs.climo import Climo
+from processflow.lib.jobstatus import JobStatus
+from processflow.lib.plancache import PlanCache, config_hash
+from processflow.lib.runmanager import RunManager
+from processflow.lib.util import print_line
+
+
+class MockFileManager(object):
+    """
+    A file catalog that starts out empty and keeps the files added to it
+    """
+
+    def __init__(self):
+        self.derived_types = list()
+        self.added = dict()
+
+    def add_files(self, data_type, file_list, super_type=None):
+        self.added.setdefault(data_type, list()).extend(file_list)
+
+    def get_file_paths_by_year(self, *args, **kwargs):
+        return list()
+
+    def write_database(self):
+        pass
+
+
+class TestPlanCache(unittest.TestCase):
+
+    def setUp(self):
+        self.project_path = tempfile.mkdtemp()
+        self.config = {
+            'global': {
+                'project_path': self.project_path,
+                'max_jobs': 10,
+            },
+            'simulations': {
+                'case1': {
+                    'short_name': 'case1',
+                    'native_grid_name': 'ne30',
+                },
+            },
+            'post-processing': {
+                'climo': {
+                    'destination_grid_name': 'fv129x256',
+                    'run_frequency': [5],
+                },
+            },
+            'data_types': {
+                'atm': {'monthly': True},
+            },
+        }
+        self.path = os.path.join(self.project_path, 'plan_cache.pickle')
+
+    def tearDown(self):
+        shutil.rmtree(self.project_path, ignore_errors=True)
+
+    def make_job(self, start, end):
+        return Climo(
+            short_name='case1',
+            case='case1',
+            start=start,
+            end=end,
+            config=self.config,
+            manager=object())
+
+    def test_config_hash(self):
+        """
+        only the parts of the config that change the plan should change the hash
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        key = config_hash(self.config, '1.0')
+        self.config['global']['max_jobs'] = 20
+        self.config['data_types']['climo_regrid'] = {'monthly': True}
+        self.assertEqual(config_hash(self.config, '1.0', exclude_types=['climo_regrid']), key)
+        self.assertNotEqual(config_hash(self.config, '1.0'), key)
+        self.assertNotEqual(config_hash(self.config, '1.1', exclude_types=['climo_regrid']), key)
+        self.config['post-processing']['climo']['run_frequency'] = [10]
+        self.assertNotEqual(config_hash(self.config, '1.0', exclude_types=['climo_regrid']), key)
+
+    def test_round_trip(self):
+        """
+        the plan should come back with the same jobs, without their manager,
+        and completed jobs should only stay complete if their outputs are untouched
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        jobs = [self.make_job(1, 5), self.make_job(6, 10)]
+        jobs[1]._depends_on.append(jobs[0].id)
+        cases = [{'case': 'case1', 'short_name': 'case1', 'jobs': jobs}]
+
+        cache = PlanCache(self.path, self.config, '1.0')
+        self.assertIsNone(cache.load())
+        cache.save(cases)
+
+        loaded = PlanCache(self.path, self.config, '1.0').load()
+        first, second = loaded[0]['jobs']
+        self.assertEqual(first.id, jobs[0].id)
+        self.assertEqual(second.depends_on, [jobs[0].id])
+        self.assertIsNone(first._manager)
+        self.assertIs(first._manager_args, Climo._default_manager_args)
+        self.assertEqual(first._directories, jobs[0]._directories)
+
+        for job in jobs:
+            job.materialize(self.config)
+            job.status = JobStatus.COMPLETED
+        self.assertTrue(cache.save_completed(jobs, filemanager=None))
+        # its too soon to write again
+        self.assertFalse(cache.save_completed(jobs, filemanager=None))
+
+        completed = cache.load_completed()
+        self.assertEqual(completed[jobs[0].id], cache.signature(first, None))
+        shutil.rmtree(jobs[1]._output_path)
+        self.assertNotEqual(completed[jobs[1].id], cache.signature(second, None))
+
+        # a different config leaves the cache alone
+        self.config['post-processing']['climo']['run_frequency'] = [10]
+        other = PlanCache(self.path, self.config, '1.0')
+        self.assertIsNone(other.load())
+        self.assertEqual(other.load_completed(), {})
+
+    def test_restore_fresh_catalog(self):
+        """
+        jobs restored as complete should run their completion handler again,
+        so a rebuilt catalog gets the derived data types back
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        self.config['global']['serial'] = True
+        os.makedirs(os.path.join(self.project_path, 'output'))
+        jobs = [self.make_job(1, 5), self.make_job(6, 10)]
+        cases = [{'case': 'case1', 'short_name': 'case1', 'jobs': jobs}]
+        filemanager = MockFileManager()
+        runmanager = RunManager(config=self.config, filemanager=filemanager)
+        runmanager._plan_cache.save(cases)
+        for job in jobs:
+            job.materialize(self.config)
+            job.status = JobStatus.COMPLETED
+        self.assertTrue(runmanager._plan_cache.save_completed(jobs, filemanager))
+
+        # the catalog and the derived types it added are gone, the cache isnt
+        filemanager = MockFileManager()
+        runmanager = RunManager(config=self.config, filemanager=filemanager)
+        self.assertNotIn('climo_regrid', self.config['data_types'])
+        self.assertTrue(runmanager.setup_plan())
+        self.assertEqual(runmanager._job_complete, 2)
+        for job in runmanager.graph.jobs():
+            self.assertEqual(job.status, JobStatus.COMPLETED)
+        self.assertIn('climo_regrid', self.config['data_types'])
+        self.assertIn('climo_native', self.config['data_types'])
+        self.assertIn('climo_regrid', filemanager.added)
+
+
+if __name__ == '__main__':
+    unittest.main()
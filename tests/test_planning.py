@@ -0,0 +1,59 @@
+import inspect
+import unittest
+from types import SimpleNamespace
+
+from processflow.lib.jobstatus import JobStatus
+from processflow.lib.runmanager import RunManager
+from processflow.lib.util import print_line
+
+
+class TestPlanning(unittest.TestCase):
+
+    def test_job_windows(self):
+        """
+        windows should come out by start year then frequency, with the
+        last window of each frequency cut short at the end year
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        self.assertEqual(
+            RunManager.job_windows([5, 2], 1, 7),
+            [(1, 5), (1, 2), (3, 4), (5, 6), (6, 7), (7, 7)])
+        self.assertEqual(RunManager.job_windows([10], 1, 10), [(1, 10)])
+
+    def test_job_windows_match_year_scan(self):
+        """
+        the windows should be the same as stepping through every year
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        freqs = [1, 3, 10, 50]
+        start, end = 1850, 2014
+        expected = list()
+        for year in range(start, end + 1):
+            for freq in freqs:
+                if (year - start) % freq == 0:
+                    expected.append((year, min(year + freq - 1, end)))
+        self.assertEqual(RunManager.job_windows(freqs, start, end), expected)
+
+    def test_is_all_done(self):
+        """
+        a job that ran out of walltime should count as a failure, even with nothing downstream of it
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        jobs = [SimpleNamespace(status=JobStatus.COMPLETED), SimpleNamespace(status=JobStatus.RUNNING)]
+        runmanager = SimpleNamespace(
+            running_jobs=list(),
+            cases=[{'jobs': jobs}])
+        self.assertEqual(RunManager.is_all_done(runmanager), -1)
+        jobs[1].status = JobStatus.COMPLETED
+        self.assertEqual(RunManager.is_all_done(runmanager), 1)
+        jobs[1].status = JobStatus.TIMEOUT
+        self.assertEqual(RunManager.is_all_done(runmanager), 0)
+        jobs[1].status = JobStatus.CANCELLED
+        self.assertEqual(RunManager.is_all_done(runmanager), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
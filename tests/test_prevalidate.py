@@ -0,0 +1,146 @@
+import inspect
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import numpy
+import xarray as xr
+
+from concurrent.futures import ThreadPoolExecutor
+
+from processflow.jobs.climo import Climo
+from processflow.jobs.timeseries import Timeseries
+from processflow.lib.prevalidate import BulkValidator, has_output_dirs
+from processflow.lib.util import print_line
+
+
+class MockJob(object):
+    """
+    Stands in for a job, keeps track of how many of each type are checked at once
+    """
+    lock = threading.Lock()
+    running = dict()
+    most = dict()
+
+    def __init__(self, job_type, index, finished):
+        self.job_type = job_type
+        self.id = '{}-{}'.format(job_type, index)
+        self.finished = finished
+        self.checked = False
+        self._directories = ()
+
+    def msg_prefix(self):
+        return self.id
+
+    def postvalidate(self, config, workers=8):
+        with self.lock:
+            count = self.running.get(self.job_type, 0) + 1
+            self.running[self.job_type] = count
+            self.most[self.job_type] = max(count, self.most.get(self.job_type, 0))
+        time.sleep(0.01)
+        with self.lock:
+            self.running[self.job_type] -= 1
+        if self.job_type == 'broken':
+            raise ValueError('unreadable output')
+        self.checked = True
+        return self.finished
+
+    def __getstate__(self):
+        return {'checked': self.checked}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+
+class TestPrevalidate(unittest.TestCase):
+
+    def setUp(self):
+        MockJob.running = dict()
+        MockJob.most = dict()
+
+    def test_bulk_validate(self):
+        """
+        every job should be checked, only the finished ones returned in their
+        given order, and no type should go over its limit
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        jobs = [MockJob('timeseries', x, x % 2 == 0) for x in range(12)]
+        jobs += [MockJob('climo', x, True) for x in range(12)]
+        jobs += [MockJob('broken', 0, True)]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            validator = BulkValidator(
+                config={},
+                workers=8,
+                type_limits={'climo': 3},
+                executor=executor)
+            finished = validator.run(jobs, progress=False)
+
+        expected = [x for x in jobs if x.finished and x.job_type != 'broken']
+        self.assertEqual(finished, expected)
+        self.assertTrue(all(x.checked for x in jobs if x.job_type != 'broken'))
+        self.assertLessEqual(MockJob.most['timeseries'], 4)
+        self.assertLessEqual(MockJob.most['climo'], 3)
+
+    def test_process_pool(self):
+        """
+        real jobs should be checked on worker processes, with the state postvalidate
+        changed sent back, and jobs that were never materialized left alone
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        project_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, project_path, ignore_errors=True)
+        config = {
+            'global': {'project_path': project_path},
+            'simulations': {'case1': {'native_grid_name': 'ne30'}},
+            'post-processing': {
+                'timeseries': {'atm': ['TREFHT', 'PRECT']},
+                'climo': {'destination_grid_name': 'fv129x256'},
+            },
+        }
+
+        def make_timeseries(start, end):
+            return Timeseries(
+                short_name='case1', case='case1', start=start, end=end,
+                run_type='atm', config=config)
+
+        done = make_timeseries(1, 5)
+        done.materialize(config)
+        for var in ['TREFHT', 'PRECT']:
+            xr.Dataset({var: ('time', numpy.zeros(1, dtype='f4'))}).to_netcdf(
+                os.path.join(done._output_path, f'{var}_000101_000512.nc'))
+        partial = make_timeseries(6, 10)
+        partial.materialize(config)
+        xr.Dataset({'PRECT': ('time', numpy.zeros(1, dtype='f4'))}).to_netcdf(
+            os.path.join(partial._output_path, 'PRECT_000601_001012.nc'))
+        new = make_timeseries(11, 20)
+
+        climo = Climo(short_name='case1', case='case1', start=1, end=5, config=config)
+        climo.materialize(config)
+        for path in [climo._output_path, climo._regrid_path]:
+            for month in range(17):
+                open(os.path.join(path, f'case1_{month:02d}_000101_000512_climo.nc'), 'w').close()
+
+        finished = BulkValidator(config, workers=2).run(
+            [done, partial, new, climo], progress=False)
+        self.assertEqual(finished, [done, climo])
+        self.assertEqual(done._var_list, [])
+        self.assertEqual(partial._var_list, ['TREFHT'])
+        self.assertEqual(new._var_list, ['TREFHT', 'PRECT'])
+        # a job that was never materialized cant have output to check
+        self.assertFalse(has_output_dirs(new))
+        self.assertTrue(has_output_dirs(done))
+
+    def test_no_jobs(self):
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        self.assertEqual(BulkValidator(config={}).run([], progress=False), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
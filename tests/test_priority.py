@@ -0,0 +1,97 @@
+import inspect
+import unittest
+
+from processflow.lib.jobgraph import JobGraph
+from processflow.lib.jobstatus import JobStatus
+from processflow.lib.priority import JobPriority
+from processflow.lib.util import print_line
+
+
+class MockJob(object):
+    """
+    The minimal part of the Job interface the priority policy uses
+    """
+
+    def __init__(self, job_id, case='case1', depends_on=None, start_year=1, end_year=10):
+        self.id = job_id
+        self.case = case
+        self.depends_on = depends_on or list()
+        self.status = JobStatus.VALID
+        self.start_year = start_year
+        self.end_year = end_year
+
+
+class TestJobPriority(unittest.TestCase):
+
+    def setup_graph(self, jobs):
+        graph = JobGraph()
+        for job in jobs:
+            graph.add_job(job)
+        graph.build()
+        return graph
+
+    def test_critical_path(self):
+        """
+        a job that gates a long chain should go ahead of independent jobs added before it
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        jobs = [MockJob(f'ts{x}') for x in range(3)]
+        jobs.append(MockJob('climo'))
+        jobs.extend(MockJob(f'diag{x}', depends_on=['climo']) for x in range(5))
+        jobs.append(MockJob('final', depends_on=['diag0']))
+        graph = self.setup_graph(jobs)
+        priority = JobPriority(graph, fair_share=False)
+
+        self.assertEqual(priority.critical_path('climo'), 30)
+        self.assertEqual(priority.fan_out('climo'), 6)
+        ordered = priority.order(graph.ready_jobs())
+        self.assertEqual([x.id for x in ordered], ['climo', 'ts0', 'ts1', 'ts2'])
+
+        fifo = JobPriority(graph, policy='fifo', fair_share=False)
+        self.assertEqual(
+            [x.id for x in fifo.order(graph.ready_jobs())], ['ts0', 'ts1', 'ts2', 'climo'])
+
+    def test_fan_out_breaks_ties(self):
+        """
+        when the critical paths are the same the job with more dependents goes first
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        jobs = [
+            MockJob('a'),
+            MockJob('b'),
+            MockJob('a_diag', depends_on=['a']),
+            MockJob('b_diag1', depends_on=['b']),
+            MockJob('b_diag2', depends_on=['b'])]
+        graph = self.setup_graph(jobs)
+        priority = JobPriority(graph, fair_share=False)
+        self.assertEqual([x.id for x in priority.order(graph.ready_jobs())], ['b', 'a'])
+
+    def test_fair_share(self):
+        """
+        submissions should alternate between cases, starting with the least loaded case
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        jobs = [MockJob(f'big{x}', case='case1', end_year=100) for x in range(4)]
+        jobs.extend(MockJob(f'small{x}', case='case2') for x in range(2))
+        jobs.append(MockJob('running', case='case1'))
+        graph = self.setup_graph(jobs)
+        ready = [x for x in graph.ready_jobs() if x.id != 'running']
+
+        unfair = JobPriority(graph, fair_share=False)
+        self.assertEqual(
+            [x.id for x in unfair.order(ready)][:4], ['big0', 'big1', 'big2', 'big3'])
+
+        fair = JobPriority(graph)
+        self.assertEqual(
+            [x.id for x in fair.order(ready)],
+            ['big0', 'small0', 'big1', 'small1', 'big2', 'big3'])
+        self.assertEqual(
+            [x.id for x in fair.order(ready, running=[graph.get('running')])],
+            ['small0', 'big0', 'small1', 'big1', 'big2', 'big3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
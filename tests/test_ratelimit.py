@@ -0,0 +1,122 @@
+import inspect
+import os
+import shutil
+import tempfile
+import unittest
+
+from processflow.lib.ratelimit import CircuitBreaker, SlurmUnavailable, TokenBucket
+from processflow.lib.slurm import Slurm
+from processflow.lib.util import print_line
+from tests.test_slurm_status import write_command, count_calls
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimit(unittest.TestCase):
+
+    def test_token_bucket(self):
+        """
+        a burst goes out at once, after that commands are spaced out by the rate
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, burst=3, clock=clock)
+        self.assertEqual([bucket._reserve() for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(bucket._reserve(), 0.5)
+        self.assertAlmostEqual(bucket._reserve(), 1.0)
+
+        # the waiters above have used up the next second of tokens
+        clock.now += 1
+        self.assertAlmostEqual(bucket._reserve(), 0.5)
+        clock.now += 10
+        self.assertEqual(bucket._reserve(), 0)
+
+        self.assertEqual(TokenBucket(rate=0).acquire(), 0)
+
+    def test_circuit_breaker(self):
+        """
+        the breaker should open after enough failures in a row, let one probe
+        through after the timeout, and back off for longer if the probe fails
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        clock = FakeClock()
+        states = list()
+        breaker = CircuitBreaker(
+            failure_threshold=3, reset_timeout=10, clock=clock, on_change=states.append)
+
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open)
+        self.assertFalse(breaker.allow())
+        self.assertRaises(SlurmUnavailable, breaker.check)
+        self.assertEqual(breaker.retry_in, 10)
+
+        clock.now += 10
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        # only the one probe
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open)
+        self.assertEqual(breaker.retry_in, 20)
+
+        clock.now += 20
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(states, ['open', 'open', 'closed'])
+
+
+class TestSlurmBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.bin_path = tempfile.mkdtemp()
+        self.old_path = os.environ['PATH']
+        os.environ['PATH'] = self.bin_path + os.pathsep + self.old_path
+        write_command(self.bin_path, 'sinfo', 'exit 0\n')
+        write_command(self.bin_path, 'squeue',
+                      'echo "slurm_load_jobs error: Socket timed out on send/recv operation" >&2\n'
+                      'exit 1\n')
+        write_command(self.bin_path, 'sbatch',
+                      'echo "sbatch: error: Batch job submission failed: Socket timed out on send/recv operation" >&2\n'
+                      'exit 1\n')
+
+    def tearDown(self):
+        os.environ['PATH'] = self.old_path
+        shutil.rmtree(self.bin_path, ignore_errors=True)
+
+    def test_unhealthy_controller(self):
+        """
+        once the controller has timed out enough times in a row, slurm commands
+        should stop being run at all
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        slurm = Slurm(failure_threshold=2, reset_timeout=60)
+        slurm.SUBMIT_TRIES = 1
+        # the failed sbatch and the squeue looking for whether it went through anyway
+        self.assertEqual(slurm.batch('/scripts/job'), 0)
+        self.assertTrue(slurm.breaker.is_open)
+
+        self.assertRaises(SlurmUnavailable, slurm.showjobs, [101])
+        self.assertEqual(slurm.batch('/scripts/job'), 0)
+        self.assertEqual(count_calls(self.bin_path, 'squeue'), 1)
+        self.assertEqual(count_calls(self.bin_path, 'sbatch'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import inspect
+import unittest
+
+from processflow.lib.clusterinfo import PartitionInfo
+from processflow.lib.resources import Partition, ResourcePool, ResourceRequest, parse_tres
+from processflow.lib.util import print_line
+
+
+class TestResources(unittest.TestCase):
+
+    def test_request_from_args(self):
+        """
+        the slurm arguments of a job should turn into its nodes, cores and memory
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        request = ResourceRequest.from_args(['-t 0-01:00', '-N 1'])
+        self.assertEqual((request.nodes, request.cores, request.memory), (1, 1, 0))
+
+        request = ResourceRequest.from_args(['-N 2', '-n 4', '--cpus-per-task=6', '--mem=8G', '-p debug'])
+        self.assertEqual((request.nodes, request.cores, request.memory), (2, 24, 16384))
+        self.assertEqual(request.partition, 'debug')
+
+        request = ResourceRequest.from_args(['-c 4', '--mem-per-cpu 1000'])
+        self.assertEqual((request.cores, request.memory), (4, 4000))
+
+    def test_parse_tres(self):
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        self.assertEqual(
+            parse_tres('cpu=256,mem=1T,node=8,gres/gpu=4'),
+            {'cores': 256, 'memory': 1024 * 1024, 'nodes': 8})
+        self.assertEqual(parse_tres(''), {})
+
+    def test_pool(self):
+        """
+        jobs should be admitted until their partition or the users limits are full,
+        a small job can still fit after a big one is turned away
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        pool = ResourcePool(
+            partitions=[Partition('debug', nodes=1, cores_per_node=32, memory_per_node=64000)],
+            limits={'max_jobs': 10})
+        big = ResourceRequest(cores=24)
+        small = ResourceRequest(cores=1)
+
+        pool.reset(running=[ResourceRequest(cores=4)])
+        self.assertTrue(pool.admit(big))
+        self.assertFalse(pool.admit(big))
+        self.assertTrue(pool.admit(small))
+        self.assertTrue(pool.admit(small))
+        self.assertTrue(pool.admit(small))
+        self.assertTrue(pool.admit(small))
+        self.assertFalse(pool.admit(small))
+
+        # exclusive jobs take the whole node
+        pool.reset()
+        self.assertTrue(pool.admit(ResourceRequest(exclusive=True)))
+        self.assertFalse(pool.admit(small))
+
+        # a job too big for the partition is left for slurm to decide on
+        pool.reset()
+        self.assertTrue(pool.admit(ResourceRequest(cores=64)))
+
+        # the users job limit
+        pool.reset(running=[small] * 10)
+        self.assertFalse(pool.fits(small))
+
+    def test_user_core_limit(self):
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        pool = ResourcePool(
+            partitions=[Partition('debug', nodes=10, cores_per_node=32, memory_per_node=64000)],
+            limits={'cores': 48})
+        pool.reset()
+        self.assertTrue(pool.admit(ResourceRequest(cores=24)))
+        self.assertTrue(pool.admit(ResourceRequest(cores=24)))
+        self.assertFalse(pool.admit(ResourceRequest(cores=1)))
+
+    def test_pool_idle(self):
+        """
+        jobs should be admitted against whats idle, with one left waiting once
+        its full, and jobs that want whole nodes against the nodes
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        pool = ResourcePool(partitions=[PartitionInfo(
+            'debug', nodes=4, cores_per_node=32, memory_per_node=64000,
+            idle_nodes=1, idle_cores=40)])
+        small = ResourceRequest(cores=1)
+
+        pool.reset()
+        self.assertTrue(pool.admit(ResourceRequest(cores=24)))
+        self.assertTrue(pool.admit(ResourceRequest(cores=16)))
+        # the partition has room but nothing is idle, so only one job waits for it
+        self.assertTrue(pool.admit(small))
+        self.assertFalse(pool.admit(small))
+
+        # whats been admitted stays taken out of the idle cores until the next lookup
+        pool.reset(running=[small] * 3, waiting=[small])
+        self.assertFalse(pool.fits(small))
+
+        # the idle cores are spread over busy nodes, only one node is free
+        pool.set_partitions([PartitionInfo(
+            'debug', nodes=4, cores_per_node=32, memory_per_node=64000,
+            idle_nodes=1, idle_cores=64)])
+        pool.reset()
+        self.assertTrue(pool.admit(ResourceRequest(nodes=2, exclusive=True)))
+        self.assertTrue(pool.admit(ResourceRequest(nodes=1, exclusive=True)))
+        self.assertFalse(pool.admit(ResourceRequest(nodes=1, exclusive=True)))
+
+if __name__ == '__main__':
+    unittest.main()
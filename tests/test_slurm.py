@@ -3,16 +3,21 @@ import os
 import sys
 import unittest
 
- 
-
+from benchmarks.slurmsim import SlurmSimulator
 from processflow.lib.util import print_line
 from processflow.lib.slurm import Slurm
 
 
 class TestSlurm(unittest.TestCase):
 
+    def setUp(self):
+        # run against the local slurm simulator, jobs sit in the queue long enough to be cancelled
+        self.simulator = SlurmSimulator(queue_wait='60').start()
+
+    def tearDown(self):
+        self.simulator.stop()
+
     def test_batch_and_cancel(self):
-        print '\n'
         print_line(
             '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
         slurm = Slurm()
@@ -34,6 +39,43 @@ class TestSlurm(unittest.TestCase):
                 break
         self.assertTrue(in_queue)
         self.assertTrue(slurm.cancel(job_id))
+        self.assertEqual(slurm.showjobs([job_id])[str(job_id)].state, 'CANCELLED')
+
+    def test_partitions_and_limits(self):
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        self.simulator.stop()
+        self.simulator = SlurmSimulator(
+            nodes=4, cores_per_node=32, memory_per_node=128000,
+            user_max_jobs=20, user_tres='cpu=64,mem=100G').start()
+        slurm = Slurm()
+        partitions, default = slurm.get_partitions()
+        self.assertEqual(default, 'debug')
+        self.assertEqual(len(partitions), 1)
+        self.assertEqual(partitions[0].nodes, 4)
+        self.assertEqual(partitions[0].cores, 128)
+        self.assertEqual(partitions[0].memory_per_node, 128000)
+        self.assertEqual(partitions[0].idle_nodes, 4)
+        self.assertEqual(slurm.get_node_number(), 4)
+        self.assertEqual(
+            slurm.get_user_limits(), {'max_jobs': 20, 'cores': 64, 'memory': 102400})
+
+    def test_batch_with_warning(self):
+        """
+        a submission that went through should return its id even if sbatch
+        also wrote a warning, and not be submitted again
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        self.simulator.stop()
+        self.simulator = SlurmSimulator(
+            queue_wait='60', sbatch_warning='warning: the scratch filesystem is nearly full').start()
+        slurm = Slurm()
+        job_id = slurm.batch('tests/test_resources/test_slurm_batch.sh')
+        self.assertTrue(isinstance(job_id, int))
+        self.assertNotEqual(job_id, 0)
+        self.assertEqual(self.simulator.stats()['calls']['sbatch'], 1)
+        self.assertEqual(len(slurm.queue()), 1)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,104 @@
+import inspect
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from processflow.lib.slurm import Slurm
+from processflow.lib.util import print_line
+
+
+def write_command(bin_path, name, body):
+    """
+    Write a small shell script standing in for a slurm command
+    """
+    path = os.path.join(bin_path, name)
+    with open(path, 'w') as fp:
+        fp.write('#!/bin/bash\n')
+        fp.write('echo "$@" >> {}\n'.format(os.path.join(bin_path, name + '.calls')))
+        fp.write(body)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+
+def count_calls(bin_path, name):
+    path = os.path.join(bin_path, name + '.calls')
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'r') as fp:
+        return len(fp.readlines())
+
+
+class TestSlurmStatus(unittest.TestCase):
+
+    def setUp(self):
+        self.bin_path = tempfile.mkdtemp()
+        self.old_path = os.environ['PATH']
+        os.environ['PATH'] = self.bin_path + os.pathsep + self.old_path
+        write_command(self.bin_path, 'sinfo', 'exit 0\n')
+        write_command(self.bin_path, 'squeue', 'cat << EOF\n'
+                      '101|ts_atm|debug|RUNNING|1:02|user\n'
+                      '102|climo|debug|PENDING|0:00|user\n'
+                      'EOF\n')
+        write_command(self.bin_path, 'sacct', 'cat << EOF\n'
+                      '103|regrid|debug|COMPLETED|0:0|00:05:00||user\n'
+                      '103.batch|batch||COMPLETED|0:0|00:05:00|2048000K|\n'
+                      '103.0|ncremap||COMPLETED|0:0|00:04:00|3072000K|\n'
+                      '104|amwg|debug|CANCELLED by 1234|0:15|00:00:10||user\n'
+                      '106|climo|debug|FAILED|2:0|00:01:00||user\n'
+                      'EOF\n')
+
+    def tearDown(self):
+        os.environ['PATH'] = self.old_path
+        shutil.rmtree(self.bin_path, ignore_errors=True)
+
+    def test_showjobs_single_call(self):
+        """
+        all the running jobs should be looked up with one squeue call,
+        and the ones that left the queue with one sacct call
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        slurm = Slurm()
+        infos = slurm.showjobs([101, 102, 103, 104, 105])
+        self.assertEqual(count_calls(self.bin_path, 'squeue'), 1)
+        self.assertEqual(count_calls(self.bin_path, 'sacct'), 1)
+
+        self.assertEqual(infos['101'].state, 'RUNNING')
+        self.assertEqual(infos['102'].state, 'PENDING')
+        self.assertEqual(infos['103'].state, 'COMPLETED')
+        self.assertEqual(infos['104'].state, 'CANCELLED')
+        self.assertNotIn('105', infos)
+
+    def test_sacct_final_state(self):
+        """
+        jobs that left the queue should get their exit code and the
+        peak memory of their largest step from sacct
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        slurm = Slurm()
+        infos = slurm.showjobs([103, 104, 106])
+        self.assertEqual(count_calls(self.bin_path, 'sacct'), 1)
+
+        self.assertEqual(infos['103'].exit_code, 0)
+        self.assertEqual(infos['103'].max_rss, 3000)
+        self.assertEqual(infos['103'].time, '00:05:00')
+        self.assertEqual(infos['104'].exit_code, 15)
+        self.assertIsNone(infos['104'].max_rss)
+        self.assertEqual(infos['106'].state, 'FAILED')
+        self.assertEqual(infos['106'].exit_code, 2)
+
+    def test_showjobs_empty(self):
+        """
+        no ids means no calls at all
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        slurm = Slurm()
+        self.assertEqual(slurm.showjobs([]), {})
+        self.assertEqual(count_calls(self.bin_path, 'squeue'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import inspect
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from processflow.lib.jobstatus import JobStatus
+from processflow.lib.statewriter import JobStateWriter
+from processflow.lib.util import print_line
+
+
+class MockJob(object):
+    """
+    The parts of the Job interface the state writer reads
+    """
+
+    def __init__(self, job_id, job_type, depends_on=None):
+        self.id = job_id
+        self.job_type = job_type
+        self.start_year = 1
+        self.end_year = 10
+        self._run_type = None
+        self.status = JobStatus.VALID
+        self.depends_on = depends_on or list()
+        self.data_ready = False
+        self.job_id = 0
+
+    def msg_prefix(self):
+        return f'{self.job_type}-{self.id}'
+
+
+class TestJobStateWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.output_path = tempfile.mkdtemp()
+        self.path = os.path.join(self.output_path, 'job_state.txt')
+        self.jsonl_path = os.path.join(self.output_path, 'job_state.jsonl')
+        self.jobs = {
+            'a': MockJob('a', 'timeseries'),
+            'b': MockJob('b', 'e3sm_diags', ['a'])}
+        self.cases = [{'case': 'case_1', 'jobs': list(self.jobs.values())}]
+
+    def tearDown(self):
+        shutil.rmtree(self.output_path, ignore_errors=True)
+
+    def read_jsonl(self):
+        with open(self.jsonl_path, 'r') as fp:
+            return [json.loads(x) for x in fp.readlines()]
+
+    def test_only_write_changes(self):
+        """
+        the file should only be rewritten when a job changes
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        writer = JobStateWriter(self.path, self.jsonl_path)
+        self.assertTrue(writer.write(self.cases, self.jobs.get))
+        self.assertFalse(writer.write(self.cases, self.jobs.get))
+        self.assertEqual(len(self.read_jsonl()), 2)
+
+        self.jobs['a'].status = JobStatus.RUNNING
+        self.jobs['a'].job_id = '1234'
+        self.assertTrue(writer.write(self.cases, self.jobs.get))
+        with open(self.path, 'r') as fp:
+            contents = fp.read()
+        self.assertIn('status: RUNNING', contents)
+        self.assertIn('manager_id: 1234', contents)
+        self.assertIn("dependent_on: ['timeseries-a']", contents)
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+        changes = self.read_jsonl()
+        self.assertEqual(len(changes), 3)
+        self.assertEqual(changes[-1]['processflow_id'], 'a')
+        self.assertEqual(changes[-1]['status'], 'RUNNING')
+
+    def test_format(self):
+        """
+        the text format should match the original job_state.txt layout
+        """
+        print_line(
+            '---- Starting Test: {} ----'.format(inspect.stack()[0][3]), status='ok')
+        JobStateWriter(self.path).write(self.cases, self.jobs.get)
+        with open(self.path, 'r') as fp:
+            contents = fp.read()
+        self.assertTrue(contents.startswith('\n==========\n# case_1 #\n==========\n\n\tname: timeseries'))
+        self.assertEqual(contents.count('------------------------------------'), 1)
+        self.assertTrue(contents.endswith('manager_id: 0\n'))
+        self.assertFalse(os.path.exists(self.jsonl_path))
+
+
+if __name__ == '__main__':
+    unittest.main()